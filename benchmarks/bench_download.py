@@ -0,0 +1,209 @@
+"""
+Benchmarks whole downloads against a local stand-in for Scribd, so the
+results only depend on the code and the simulated network.
+
+Every case runs in a fresh process, and reports its wall time,
+throughput and peak RSS.
+
+Usage: python -m benchmarks.bench_download [--latency MS] [--bandwidth KBPS]
+                                           [--jobs N] [--engine ENGINE]
+                                           [--json PATH] [CASE ...]
+"""
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+import traceback
+
+from scribdl.content.audiobook import Playlist
+from scribdl.content.book import ScribdBook
+from scribdl.content.document import ScribdImageDocument
+from scribdl.content.document import ScribdTextualDocument
+from scribdl.pdf_converter import ConvertToPDF
+from scribdl.session import ScribdSession
+
+from . import mock_server
+
+
+def image_document(session, jobs):
+    document = ScribdImageDocument(mock_server.DOCUMENT_URL, session=session, jobs=jobs)
+    return lambda: document.download()
+
+
+def textual_document(session, jobs):
+    document = ScribdTextualDocument(mock_server.DOCUMENT_URL, session=session, quiet=True)
+    return lambda: [document.download()]
+
+
+def book(session, jobs):
+    scribd_book = ScribdBook(mock_server.BOOK_URL, session=session, jobs=jobs, quiet=True)
+
+    def download():
+        filename = scribd_book.download()
+        return [filename, scribd_book.sanitized_title]
+    return download
+
+
+def playlist(session, jobs):
+    response = session.post(mock_server.PLAYLIST_URL, data="{}")
+    audiobook = Playlist("Benchmark Audiobook", json.loads(response.text), session=session, jobs=jobs)
+
+    def download():
+        audiobook.download()
+        return audiobook.download_paths
+    return download
+
+
+def images_to_pdf(session, jobs):
+    # Pages are downloaded up front, only the conversion is timed
+    images = ScribdImageDocument(mock_server.DOCUMENT_URL, session=session, jobs=jobs).download()
+
+    def convert():
+        ConvertToPDF(images, "Benchmark_Document.pdf", jobs=jobs).to_pdf()
+        return ["Benchmark_Document.pdf"]
+    return convert
+
+
+def book_to_pdf(session, jobs):
+    # Needs md2pdf's system libraries (cairo, pango)
+    filename = ScribdBook(mock_server.BOOK_URL, session=session, jobs=jobs, quiet=True).download()
+
+    def convert():
+        ConvertToPDF(filename, "Benchmark_Book.pdf", jobs=jobs).to_pdf()
+        return ["Benchmark_Book.pdf"]
+    return convert
+
+
+# name -> (case, what an item is, number of items)
+CASES = {
+    "image-document": (image_document, "pages", lambda mock: mock.pages),
+    "textual-document": (textual_document, "pages", lambda mock: mock.pages),
+    "book": (book, "chapters", lambda mock: mock.chapters),
+    "playlist": (playlist, "tracks", lambda mock: mock.tracks),
+    "images-to-pdf": (images_to_pdf, "pages", lambda mock: mock.pages),
+    "book-to-pdf": (book_to_pdf, "chapters", lambda mock: mock.chapters),
+}
+
+
+def output_size(paths):
+    """
+    Returns the size in bytes of every file in `paths`, following directories.
+    """
+    size = 0
+    for path in paths:
+        if os.path.isdir(path):
+            for directory, _, filenames in os.walk(path):
+                size += sum(os.path.getsize(os.path.join(directory, name)) for name in filenames)
+        elif os.path.exists(path):
+            size += os.path.getsize(path)
+    return size
+
+
+def peak_rss():
+    """
+    Returns the peak resident set size of this process in bytes.
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Reported in kilobytes everywhere but macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def run_case(name, mock, jobs, engine):
+    """
+    Sets up and times a single case in a scratch directory.
+    """
+    case, _, _ = CASES[name]
+    session = ScribdSession(pool_maxsize=max(16, jobs))
+    mock.mount(session, pool_maxsize=max(16, jobs), use_httpx=engine == "httpx")
+    with tempfile.TemporaryDirectory(prefix="scribdl-bench-") as directory:
+        os.chdir(directory)
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            run = case(session, jobs)
+            start_time = time.perf_counter()
+            paths = run()
+            elapsed = time.perf_counter() - start_time
+        return {"wall_time": elapsed, "bytes": output_size(paths), "peak_rss": peak_rss()}
+
+
+def _run_case_in_child(connection, name, mock, jobs, engine):
+    try:
+        connection.send(run_case(name, mock, jobs, engine))
+    except Exception:
+        connection.send({"error": traceback.format_exc().strip().splitlines()[-1]})
+    connection.close()
+
+
+def run_isolated(name, mock, jobs, engine):
+    """
+    Runs a case in a forked process so its peak RSS is its own. Falls
+    back to running in this process where fork isn't available.
+    """
+    if "fork" not in multiprocessing.get_all_start_methods():
+        return run_case(name, mock, jobs, engine)
+    context = multiprocessing.get_context("fork")
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=_run_case_in_child, args=(sender, name, mock, jobs, engine))
+    process.start()
+    sender.close()
+    result = receiver.recv()
+    process.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("cases", metavar="CASE", nargs="*",
+                        help="cases to run (default: all of {})".format(", ".join(sorted(CASES))))
+    parser.add_argument("--latency", type=float, default=20, help="milliseconds per request (default: 20)")
+    parser.add_argument("--bandwidth", type=float, help="kilobytes per second per response (default: unlimited)")
+    parser.add_argument("--jobs", type=int, default=4)
+    parser.add_argument("--engine", choices=("httpx", "threads"), default="httpx",
+                        help="send requests through httpx, as downloads do when it is installed, "
+                             "or through the session on a thread pool (default: httpx)")
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--chapters", type=int, default=20)
+    parser.add_argument("--tracks", type=int, default=4)
+    parser.add_argument("--track-size", type=int, default=4 * 1024 * 1024)
+    parser.add_argument("--json", metavar="PATH", help="also write the results to this file")
+    args = parser.parse_args()
+    unknown = set(args.cases) - set(CASES)
+    if unknown:
+        parser.error("unknown cases: {}".format(", ".join(sorted(unknown))))
+    if args.engine == "httpx" and mock_server.httpx is None:
+        parser.error("--engine httpx needs httpx installed")
+
+    mock = mock_server.MockScribd(pages=args.pages,
+                                  chapters=args.chapters,
+                                  tracks=args.tracks,
+                                  track_size=args.track_size,
+                                  latency=args.latency / 1000,
+                                  bandwidth=args.bandwidth * 1024 if args.bandwidth else None)
+    results = {}
+    with mock:
+        for name in args.cases or list(CASES):
+            result = results[name] = run_isolated(name, mock, args.jobs, args.engine)
+            if "error" in result:
+                print("{:<18} failed: {}".format(name, result["error"]))
+                continue
+            _, unit, count = CASES[name]
+            result[unit] = count(mock)
+            print("{:<18} {:8.1f} ms  {:8.1f} {}/s  {:7.2f} MB/s  {:7.1f} MB peak RSS".format(
+                name,
+                result["wall_time"] * 1000,
+                result[unit] / result["wall_time"],
+                unit,
+                result["bytes"] / 1e6 / result["wall_time"],
+                result["peak_rss"] / 1e6))
+
+    if args.json:
+        with open(args.json, "w") as out_file:
+            json.dump(results, out_file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
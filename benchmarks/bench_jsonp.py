@@ -0,0 +1,68 @@
+"""
+Compares the '.jsonp' page parser with the chained str.replace and
+BeautifulSoup path it replaced.
+
+Usage: python -m benchmarks.bench_jsonp [--pages N] [--spans N]
+"""
+import argparse
+import json
+import timeit
+
+from bs4 import BeautifulSoup
+
+from scribdl import parsers
+
+
+def make_jsonp_page(page_number, spans):
+    """
+    Builds a synthetic '.jsonp' page shaped like the ones Scribd serves.
+    """
+    lines = []
+    for line in range(spans):
+        lines.append('<div class="ff0" style="top:{0}px;">'
+                     '<span class="a" style="left:10px;">Line {0} of page {1} &amp; some more text</span>'
+                     '</div>\n'.format(line, page_number))
+    html = '<div class="newpage" id="page{}">{}</div>'.format(page_number, "".join(lines))
+    return "window.page{}_callback({});".format(page_number, json.dumps([html]))
+
+
+def legacy_extract(response):
+    """
+    The parsing path previously used by ScribdTextualDocument._save_text.
+    """
+    page_no = response[11:12]
+    response_head = (
+        (response)
+        .replace("window.page" + page_no + '_callback(["', "")
+        .replace("\\n", "")
+        .replace("\\", "")
+        .replace('"]);', "")
+    )
+    soup_content = BeautifulSoup(response_head, "html.parser")
+    return [x.get_text() for x in soup_content.find_all("span", {"class": "a"})]
+
+
+def streaming_extract(response):
+    _, page_html = parsers.parse_jsonp_page(response)
+    return parsers.extract_span_text(page_html)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--spans", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    # Pages 1-9 only, as the legacy path can't tell page 10 from page 1
+    pages = [make_jsonp_page(page % 9 + 1, args.spans) for page in range(args.pages)]
+    assert [legacy_extract(page) for page in pages] == [streaming_extract(page) for page in pages]
+
+    total_spans = args.pages * args.spans
+    for name, function in (("legacy", legacy_extract), ("streaming", streaming_extract)):
+        elapsed = min(timeit.repeat(lambda: [function(page) for page in pages], number=1, repeat=args.repeat))
+        print("{:<10} {:8.1f} ms  {:10.0f} spans/s".format(name, elapsed * 1000, total_spans / elapsed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,296 @@
+"""
+A local stand-in for scribd.com and findawayworld serving synthetic
+documents, books and audiobooks over a simulated network, so downloads
+can be benchmarked without touching the real sites.
+"""
+import io
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+from requests.adapters import HTTPAdapter
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+from .bench_jsonp import make_jsonp_page
+
+DOCUMENT_ID = 123456789
+BOOK_ID = 234567891
+AUDIOBOOK_ID = 345678912
+
+DOCUMENT_URL = "https://www.scribd.com/document/{}/Benchmark-Document".format(DOCUMENT_ID)
+BOOK_URL = "https://www.scribd.com/read/{}/Benchmark-Book".format(BOOK_ID)
+PLAYLIST_URL = "https://api.findawayworld.com/v4/audiobooks/{}/playlists".format(AUDIOBOOK_ID)
+
+CHUNK_SIZE = 64 * 1024
+
+
+def make_jpeg(seed, size):
+    """
+    Builds a grayscale noise JPEG, which compresses about as badly as
+    a scanned page. Every seed gives a different image.
+    """
+    from PIL import Image
+
+    noise = random.Random(seed).getrandbits(8 * size[0] * size[1]).to_bytes(size[0] * size[1], "little")
+    image = Image.frombytes("L", size, noise)
+    out_file = io.BytesIO()
+    image.save(out_file, "JPEG", quality=75, dpi=(96, 96))
+    return out_file.getvalue()
+
+
+class LocalAdapter(HTTPAdapter):
+    """
+    Sends every request to the mock server instead of its real host,
+    which is kept as the first component of the path.
+    """
+
+    def __init__(self, address, **kwargs):
+        super().__init__(**kwargs)
+        self.base_url = "http://{}:{}".format(*address)
+
+    def send(self, request, **kwargs):
+        parts = urlsplit(request.url)
+        request.url = "{}/{}{}".format(self.base_url, parts.netloc, parts.path)
+        if parts.query:
+            request.url += "?" + parts.query
+        return super().send(request, **kwargs)
+
+
+if httpx is not None:
+    class LocalAsyncTransport(httpx.AsyncHTTPTransport):
+        """
+        The httpx counterpart of `LocalAdapter`, for `AsyncSession`.
+        """
+
+        def __init__(self, address, **kwargs):
+            super().__init__(**kwargs)
+            self.base_url = "http://{}:{}".format(*address)
+
+        async def handle_async_request(self, request):
+            url = "{}/{}{}".format(self.base_url, request.url.host, request.url.raw_path.decode("ascii"))
+            # A copy, so cookies are still told to come from the real host
+            local_request = httpx.Request(request.method, url, headers=request.headers,
+                                          stream=request.stream, extensions=request.extensions)
+            return await super().handle_async_request(local_request)
+
+
+class MockScribdHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    ROUTES = (
+        ("GET", r"^/www\.scribd\.com/document/(\d+)/", "document_page"),
+        ("GET", r"^/html\.scribdassets\.com/(\d+)/pages/(\d+)\.jsonp$", "jsonp_page"),
+        ("GET", r"^/html\.scribdassets\.com/(\d+)/images/(\d+)(?:/000)?\.jpg$", "page_image"),
+        ("GET", r"^/www\.scribd\.com/read/(\d+)/", "book_page"),
+        ("GET", r"^/scribd\.com/csrf_token$", "csrf_token"),
+        ("POST", r"^/www\.scribd\.com/read2/(\d+)/access_token$", "access_token"),
+        ("GET", r"^/www\.scribd\.com/scepub/(\d+)/chapters/(\d+)/contents\.json$", "chapter"),
+        ("GET", r"^/www\.scribd\.com/scepub/(\d+)/chapters/(\d+)/images/(\d+)\.jpg$", "chapter_image"),
+        ("POST", r"^/api\.findawayworld\.com/v4/audiobooks/(\d+)/playlists$", "playlist"),
+        ("GET", r"^/audio\.findawayworld\.com/(\d+)/(\d+)\.mp3$", "track"),
+    )
+
+    def do_GET(self):
+        self._route("GET")
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        self.rfile.read(length)
+        self._route("POST")
+
+    def log_message(self, *args):
+        pass
+
+    def _route(self, method):
+        path = self.path.split("?")[0]
+        time.sleep(self.server.mock.latency)
+        for route_method, pattern, name in self.ROUTES:
+            match = re.match(pattern, path)
+            if route_method == method and match:
+                getattr(self, "_" + name)(*match.groups())
+                return
+        self._send(404, b"<html>Not Found</html>", "text/html")
+
+    def _document_page(self, document_id):
+        mock = self.server.mock
+        scripts = "".join('<script type="text/javascript">pageParams.contentUrl = '
+                          '"https://html.scribdassets.com/{}/pages/{}.jsonp";</script>'.format(document_id, page)
+                          for page in range(1, mock.pages + 1))
+        html = "<html><body><h1>Benchmark Document</h1>{}</body></html>".format(scripts)
+        self._send(200, html.encode("utf-8"), "text/html")
+
+    def _jsonp_page(self, document_id, page):
+        self._send(200, make_jsonp_page(int(page), self.server.mock.spans).encode("utf-8"), "application/javascript")
+
+    def _page_image(self, document_id, page):
+        mock = self.server.mock
+        if not 1 <= int(page) <= mock.pages:
+            self._send(404, b"", "image/jpeg")
+            return
+        self._send(200, mock.page_images[int(page) - 1], "image/jpeg")
+
+    def _book_page(self, book_id):
+        self._send(200, b"<html><body><h1>Currently Reading: Benchmark Book</h1></body></html>", "text/html")
+
+    def _csrf_token(self):
+        self._send_json({"csrf_token": "benchmark-csrf-token"})
+
+    def _access_token(self, book_id):
+        self._send_json({"response": "benchmark-access-token"})
+
+    def _chapter(self, book_id, chapter):
+        mock = self.server.mock
+        chapter = int(chapter)
+        if chapter > mock.chapters:
+            self._send(404, b"<html>Not Found</html>", "text/html")
+            return
+        blocks = []
+        for paragraph in range(mock.paragraphs):
+            words = [{"text": "Paragraph {} of chapter {} with some words.".format(paragraph, chapter)}]
+            blocks.append({"type": "text", "words": words})
+        blocks.append({"type": "image", "src": "images/{}.jpg".format(chapter)})
+        self._send_json({"blocks": blocks})
+
+    def _chapter_image(self, book_id, chapter, image):
+        mock = self.server.mock
+        self._send(200, mock.page_images[int(chapter) % len(mock.page_images)], "image/jpeg")
+
+    def _playlist(self, audiobook_id):
+        tracks = [{"url": "https://audio.findawayworld.com/{}/{}.mp3".format(audiobook_id, track),
+                   "part_number": track,
+                   "chapter_number": track}
+                  for track in range(1, self.server.mock.tracks + 1)]
+        self._send_json({"playlist": tracks, "expires": None, "playlist_token": "benchmark-playlist-token"})
+
+    def _track(self, audiobook_id, track):
+        body = self.server.mock.track_data
+        match = re.match(r"bytes=(\d+)-(\d*)$", self.headers.get("Range", ""))
+        if not match:
+            self._send(200, body, "audio/mpeg", accept_ranges=True)
+            return
+        start = int(match.group(1))
+        end = int(match.group(2)) if match.group(2) else len(body) - 1
+        if start >= len(body):
+            self._send(416, b"", "audio/mpeg")
+            return
+        content_range = "bytes {}-{}/{}".format(start, end, len(body))
+        self._send(206, body[start:end + 1], "audio/mpeg", content_range=content_range, accept_ranges=True)
+
+    def _send_json(self, body):
+        self._send(200, json.dumps(body).encode("utf-8"), "application/json")
+
+    def _send(self, status, body, content_type, content_range=None, accept_ranges=False):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        if content_range:
+            self.send_header("Content-Range", content_range)
+        if accept_ranges:
+            self.send_header("Accept-Ranges", "bytes")
+        self.end_headers()
+        bandwidth = self.server.mock.bandwidth
+        try:
+            for start in range(0, len(body), CHUNK_SIZE):
+                chunk = body[start:start + CHUNK_SIZE]
+                self.wfile.write(chunk)
+                if bandwidth:
+                    time.sleep(len(chunk) / float(bandwidth))
+        except ConnectionError:
+            # The client dropped a request it no longer needed, such
+            # as a chapter fetched ahead past the end of the book
+            self.close_connection = True
+
+
+class MockScribd:
+    """
+    Serves synthetic Scribd content on a local port.
+
+    Parameters
+    ----------
+    pages : `int`
+        Number of pages of the document, each as a '.jsonp' and an image.
+    spans : `int`
+        Number of lines of text on every '.jsonp' page.
+    chapters : `int`
+        Number of chapters of the book, each holding one image.
+    paragraphs : `int`
+        Number of paragraphs in every chapter.
+    tracks : `int`
+        Number of tracks of the audiobook.
+    track_size : `int`
+        Size of every track in bytes.
+    image_size : `tuple`
+        Width and height of page images in pixels.
+    latency : `float`
+        Seconds every request waits before being answered.
+    bandwidth : `float`
+        Bytes per second every response is sent at. Unlimited if `None`.
+    """
+
+    def __init__(self,
+                 pages=20,
+                 spans=200,
+                 chapters=20,
+                 paragraphs=50,
+                 tracks=4,
+                 track_size=4 * 1024 * 1024,
+                 image_size=(850, 1100),
+                 latency=0.0,
+                 bandwidth=None):
+        self.pages = pages
+        self.spans = spans
+        self.chapters = chapters
+        self.paragraphs = paragraphs
+        self.tracks = tracks
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.page_images = [make_jpeg(page, image_size) for page in range(max(pages, 1))]
+        self.track_data = bytes(range(256)) * (track_size // 256)
+        self._server = None
+        self._thread = None
+
+    @property
+    def address(self):
+        return self._server.server_address
+
+    def start(self):
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), MockScribdHandler)
+        self._server.daemon_threads = True
+        self._server.mock = self
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    def mount(self, session, pool_maxsize=16, use_httpx=True):
+        """
+        Routes every request made through `session` to this server,
+        including those its `AsyncSession` sends through httpx. Without
+        `use_httpx`, or httpx, `AsyncSession` falls back to running the
+        session on its thread pool.
+        """
+        adapter = LocalAdapter(self.address, pool_maxsize=pool_maxsize)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        if use_httpx and httpx is not None:
+            session.async_transport = LocalAsyncTransport(self.address,
+                                                          limits=httpx.Limits(max_connections=pool_maxsize))
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -8,3 +8,6 @@ from .content.book import ScribdBook
 from .content.audiobook import ScribdAudioBook
 
 from .pdf_converter import ConvertToPDF
+
+from .session import ScribdSession
+from .aio import AsyncSession
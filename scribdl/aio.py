@@ -0,0 +1,313 @@
+import asyncio
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from requests.adapters import HTTPAdapter
+
+from . import exceptions
+from . import internals
+from . import metrics
+from . import resume
+from .session import LOGIN_REFRESH_STATUS_CODES
+from .session import PREMIUM_COOKIE_DOMAIN
+from .session import get_session
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+DEFAULT_MAX_CONNECTIONS = 100
+
+
+class AsyncSession:
+    """
+    The asyncio counterpart of `ScribdSession`, shared by every download
+    running on an event loop.
+
+    Requests go through an `httpx.AsyncClient` when httpx is installed,
+    so any number of downloads share one thread. Otherwise they are run
+    on the wrapped `ScribdSession` in a bounded thread pool, as they are
+    when the session has a custom adapter mounted, such as a recording,
+    without an `async_transport` to match. Cacheable requests always go
+    through the session's on-disk cache, if it has one.
+    Either way requests are retried and paced by the session's retry
+    policy and rate limiter, and the session's premium login is kept
+    fresh the way `ScribdSession` keeps it.
+
+    Parameters
+    ----------
+    session : `ScribdSession`
+        Session whose cookies, headers and timeout are used.
+        Defaults to the process-wide shared session.
+    max_connections : `int`
+        Maximum number of requests in flight at once.
+    """
+
+    def __init__(self, session=None, max_connections=DEFAULT_MAX_CONNECTIONS):
+        self.session = get_session(session)
+        self._executor = ThreadPoolExecutor(max_workers=max_connections)
+        self._client = None
+        transport = self.session.async_transport
+        if httpx is not None and (transport is not None or type(self.session.get_adapter("https://")) is HTTPAdapter):
+            timeout = self.session.timeout
+            connect_timeout, read_timeout = timeout if isinstance(timeout, tuple) else (timeout, timeout)
+            self._client = httpx.AsyncClient(
+                cookies=self.session.cookies,
+                headers=dict(self.session.headers),
+                timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+                limits=httpx.Limits(max_connections=max_connections),
+                follow_redirects=True,
+                transport=transport,
+            )
+
+    async def get(self, url, **kwargs):
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url, **kwargs):
+        return await self.request("POST", url, **kwargs)
+
+    async def request(self, method, url, **kwargs):
+        if self._client is None:
+            return await self.run(self.session.request, method, url, **kwargs)
+        if "data" in kwargs and isinstance(kwargs["data"], str):
+            kwargs["content"] = kwargs.pop("data")
+        premium_login = self._premium_login(url)
+        if premium_login is None:
+            return await self._retried_request(method, url, **kwargs)
+
+        sent_cookie = await self._ensure_login(premium_login)
+        response = await self._retried_request(method, url, **kwargs)
+        if (response.status_code in LOGIN_REFRESH_STATUS_CODES
+                and premium_login.refreshes(url)
+                and await self.run(premium_login.refresh, sent_cookie)):
+            metrics.inc("scribdl_retries_total", reason="login")
+            response = await self._retried_request(method, url, **kwargs)
+        return response
+
+    async def _retried_request(self, method, url, **kwargs):
+        endpoint = metrics.endpoint(url)
+        attempt = 0
+        while True:
+            await self._throttle()
+            try:
+                with metrics.timer("scribdl_request_seconds", endpoint=endpoint):
+                    response = await self._client.request(method, url, **kwargs)
+            except httpx.TransportError:
+                metrics.inc("scribdl_requests_total", endpoint=endpoint, method=method, status="error")
+                if not await self._backoff(method, url, attempt):
+                    raise
+            else:
+                metrics.inc("scribdl_requests_total", endpoint=endpoint, method=method, status=response.status_code)
+                if not await self._backoff(method, url, attempt, response):
+                    metrics.inc("scribdl_response_bytes_total", len(response.content), endpoint=endpoint)
+                    return response
+            attempt += 1
+
+    def _premium_login(self, url):
+        """
+        Returns the session's `PremiumLogin` if requests to `url` need it.
+        """
+        premium_login = self.session.premium_login
+        if premium_login is not None and premium_login.covers(url):
+            return premium_login
+        return None
+
+    async def _ensure_login(self, premium_login):
+        """
+        Makes sure the premium cookies are valid, logging in on the
+        thread pool if needed. Returns the session cookie to be sent.
+        """
+        await self.run(premium_login.ensure)
+        # The client shares the session's cookie jar
+        return self.session.cookies.get("_scribd_session", domain=PREMIUM_COOKIE_DOMAIN)
+
+    async def _throttle(self):
+        wait = self.session.rate_limiter.reserve()
+        if wait:
+            await asyncio.sleep(wait)
+
+    async def _backoff(self, method, url, attempt, response=None):
+        """
+        Waits before sending again a request that failed, the way
+        `ScribdSession.request` does. Returns `False` if it isn't retried.
+        """
+        delay = self.session.retry_policy.retry_delay(method, url, attempt, response=response)
+        if delay is None:
+            return False
+        if response is not None and response.status_code == 429:
+            metrics.inc("scribdl_retries_total", reason="throttled")
+            self.session.rate_limiter.pause(delay)
+        else:
+            metrics.inc("scribdl_retries_total", reason="network" if response is None else "status")
+            await asyncio.sleep(delay)
+        return True
+
+    async def cached_get(self, url, resource):
+        """
+        The asyncio counterpart of `ScribdSession.cached_get`.
+        """
+        if self.session.cache is not None:
+            # The SQLite cache is synchronous
+            return await self.run(self.session.cached_get, url, resource)
+        return await self.get(url)
+
+    async def download_stream(self, url, filepath, segments=1):
+        """
+        The asyncio counterpart of `internals.download_stream`. Resumes
+        a ".part" file left behind by an interrupted download the same way.
+
+        Only whole files are streamed through httpx. Parallel byte ranges,
+        and resuming them, are left to `internals.download_stream` on the
+        thread pool, as is everything without httpx.
+        """
+        partial = resume.part_path(filepath)
+        if self._client is None or segments > 1 or os.path.exists(resume.manifest_path(partial)):
+            return await self.run(internals.download_stream, url, filepath,
+                                  session=self.session, segments=segments)
+
+        first_offset = os.path.getsize(partial) if os.path.exists(partial) else 0
+        endpoint = metrics.endpoint(url)
+        with metrics.timer("scribdl_download_seconds", endpoint=endpoint):
+            attempt = 0
+            while not await self._stream_to_part(url, partial, endpoint, attempt):
+                attempt += 1
+            os.replace(partial, filepath)
+        metrics.inc("scribdl_download_bytes_total", os.path.getsize(filepath) - first_offset, endpoint=endpoint)
+
+    async def _stream_to_part(self, url, partial, endpoint, attempt):
+        """
+        Streams the resource into `partial`, continuing after whatever
+        an earlier attempt already wrote there. Returns `False` if the
+        download failed and should be tried again.
+        """
+        offset = os.path.getsize(partial) if os.path.exists(partial) else 0
+        headers = {"Range": "bytes={}-".format(offset)} if offset else {}
+        premium_login = self._premium_login(url)
+        if premium_login is not None:
+            sent_cookie = await self._ensure_login(premium_login)
+        await self._throttle()
+        try:
+            async with self._client.stream("GET", url, headers=headers) as response:
+                metrics.inc("scribdl_requests_total", endpoint=endpoint, method="GET", status=response.status_code)
+                if response.status_code < 400:
+                    mode = "ab" if response.status_code == 206 else "wb"
+                    with open(partial, mode) as out_file:
+                        async for chunk in response.aiter_bytes(internals.CHUNK_SIZE):
+                            out_file.write(chunk)
+                    return True
+        except httpx.TransportError:
+            if not await self._backoff("GET", url, attempt):
+                raise
+            return False
+
+        if offset and response.status_code == 416:
+            # The earlier attempt got everything but the rename
+            return True
+        if (premium_login is not None
+                and response.status_code in LOGIN_REFRESH_STATUS_CODES
+                and premium_login.refreshes(url)
+                and attempt + 1 < self.session.retry_policy.attempts
+                and await self.run(premium_login.refresh, sent_cookie)):
+            metrics.inc("scribdl_retries_total", reason="login")
+            return False
+        if await self._backoff("GET", url, attempt, response):
+            return False
+        raise exceptions.ScribdFetchError(
+            "Download of {} failed with status {}".format(url, response.status_code))
+
+    async def run(self, function, *args, **kwargs):
+        """
+        Runs blocking code in the session's thread pool.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(function, *args, **kwargs))
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+        self._executor.shutdown(wait=False)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+
+class _Engine:
+    """
+    An event loop running on a thread of its own, with one `AsyncSession`
+    on it that every synchronous call on a session shares, so they all
+    reuse its connections and thread pool.
+    """
+
+    def __init__(self, session):
+        self.loop = asyncio.new_event_loop()
+        self.aio_session = AsyncSession(session)
+        self.thread = threading.Thread(target=self.loop.run_forever, name="scribdl-aio", daemon=True)
+        self.thread.start()
+
+    def run(self, function):
+        if threading.current_thread() is self.thread:
+            raise RuntimeError("The synchronous API would block its own event loop, await the async one instead")
+        future = asyncio.run_coroutine_threadsafe(function(self.aio_session), self.loop)
+        try:
+            return future.result()
+        except BaseException:
+            # Such as a KeyboardInterrupt while waiting
+            future.cancel()
+            raise
+
+    def close(self):
+        asyncio.run_coroutine_threadsafe(self.aio_session.aclose(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+
+_engines_lock = threading.Lock()
+
+
+def _get_engine(session):
+    """
+    Returns the engine of a session, starting it on first use.
+    """
+    with _engines_lock:
+        if getattr(session, "aio_engine", None) is None:
+            session.aio_engine = _Engine(session)
+    return session.aio_engine
+
+
+def block_on(function, session=None):
+    """
+    Runs `function`, a coroutine function taking an `AsyncSession`, and
+    returns its result. The synchronous API is built on this. Every call
+    on the same `session` runs on one event loop thread with one
+    `AsyncSession`, which lives until the session is closed. Must not be
+    called from a coroutine running on that loop.
+    """
+    return _get_engine(get_session(session)).run(function)
+
+
+async def imap_limited(function, items, jobs=1):
+    """
+    The asyncio counterpart of `internals.imap_concurrently`: awaits
+    `function` on every item, at most `jobs` at a time, and yields
+    every result as soon as it and all the results before it are in.
+    """
+    semaphore = asyncio.Semaphore(max(jobs, 1))
+
+    async def limited(item):
+        async with semaphore:
+            return await function(item)
+
+    tasks = [asyncio.ensure_future(limited(item)) for item in items]
+    try:
+        for task in tasks:
+            yield await task
+    finally:
+        for task in tasks:
+            task.cancel()
@@ -1,8 +1,12 @@
-import requests
 import json
+import os
+import threading
+import time
+from urllib.parse import urlsplit
 from bs4 import BeautifulSoup
-from . import const
 from . import exceptions
+from . import metrics
+from .session import get_session
 
 SCRIBD_LOGIN_URL = "https://www.scribd.com/login"
 
@@ -14,38 +18,60 @@ SCRIBD_LOGIN_DATA = {
     "signup_location": "https://www.scribd.com/"
 }
 
+PREMIUM_COOKIE_NAMES = ("_scribd_session", "_scribd_expire")
 
-def set_credentials(filepath):
+DEFAULT_CREDENTIALS_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "scribdl", "credentials.json")
+
+# Cookies this close to expiring are refreshed rather than reused
+EXPIRY_MARGIN = 5 * 60
+# A 401/403 only triggers a new login if the last one is older than this,
+# as Scribd also answers 403 for content the account can't access
+MIN_REFRESH_INTERVAL = 5 * 60
+# Endpoints whose 401/403 means the book's access token was rejected or
+# its preview ended, which `TokenManager` and `ScribdBook` deal with
+TOKEN_ENDPOINTS = ("access_token", "chapter", "chapter_image")
+
+
+def read_credentials(filepath):
     """
-    Reads username and password for Scribd premium account
-    from the file passed and overrides the default values
-    for headers and cookies.
+    Reads the username and password for a Scribd premium account
+    from a file containing them separated by whitespace.
     """
-    login_page = requests.get(SCRIBD_LOGIN_URL)
-    login_cookies = login_page.cookies
-
     with open(filepath, "r") as in_file:
         content = in_file.read()
     username, password = content.split()
+    return username, password
+
+
+def login(username, password, session=None):
+    """
+    Logs into a Scribd premium account. Returns the premium cookies.
+    """
+    with metrics.timer("scribdl_login_seconds"):
+        return _login(username, password, get_session(session))
+
 
-    SCRIBD_LOGIN_DATA["login_or_email"] = username
-    SCRIBD_LOGIN_DATA["login_password"] = password
+def _login(username, password, session):
+    login_page = session.get(SCRIBD_LOGIN_URL)
+    login_cookies = login_page.cookies
+
+    login_data = dict(SCRIBD_LOGIN_DATA, login_or_email=username, login_password=password)
+    login_headers = dict(SCRIBD_LOGIN_HEADERS)
 
     # <meta name="csrf-token" content="1k3cOzA9ci6dicSRZce5LjyiH6ird+K/hZ/H7ynnSXiuG/8W1XdozUVSAhUBAIWpIeAlDoTmObzijWW/wDGXUA==" />
     soup = BeautifulSoup(login_page.text, features="html5lib")
     csrf = soup.find("meta", dict(name="csrf-token"))
     if csrf:
-        SCRIBD_LOGIN_HEADERS["X-CSRF-Token"] = csrf.attrs['content']
+        login_headers["X-CSRF-Token"] = csrf.attrs['content']
 
-    response = requests.post(SCRIBD_LOGIN_URL,
-                             headers=SCRIBD_LOGIN_HEADERS,
-                             cookies=login_cookies,
-                             json=SCRIBD_LOGIN_DATA)
+    response = session.post(SCRIBD_LOGIN_URL,
+                            headers=login_headers,
+                            cookies=login_cookies,
+                            json=login_data)
 
     if response.status_code != 200:
         raise exceptions.ScribdFetchError("Login failed with status " + str(response.status_code))
 
-    #print(response.text)
     result = json.loads(response.text)
     # {"login":true,"success":true,"user":{"id":514698173}}
     if not "login" in result or not result["login"]:
@@ -54,7 +80,171 @@ def set_credentials(filepath):
         if errors:
             raise exceptions.ScribdFetchError("Login error: " + errors[0]["msg"])
 
-    const.premium_cookies["_scribd_session"] = response.cookies["_scribd_session"]
-    const.premium_cookies["_scribd_expire"] = response.cookies["_scribd_expire"]
+    return {name: response.cookies[name] for name in PREMIUM_COOKIE_NAMES}
+
+
+def cookies_expired(cookies, margin=EXPIRY_MARGIN):
+    """
+    Checks whether premium cookies are past (or about to pass)
+    their `_scribd_expire` time.
+    """
+    try:
+        return int(cookies["_scribd_expire"]) <= time.time() + margin
+    except (KeyError, ValueError):
+        return True
+
+
+class CredentialsCache:
+    """
+    Premium cookies of every account logged into, saved on disk so
+    later runs can skip the login until the cookies expire.
+
+    Parameters
+    ----------
+    path : `str`
+        Path of the JSON file holding the cookies. Only readable
+        by the current user.
+    """
 
-    return response
+    def __init__(self, path=DEFAULT_CREDENTIALS_CACHE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def load(self, username):
+        """
+        Returns the cached cookies of the account if they are
+        still valid, otherwise `None`.
+        """
+        cookies = self._read().get(username)
+        if cookies is None or cookies_expired(cookies):
+            return None
+        return cookies
+
+    def save(self, username, cookies):
+        with self._lock:
+            accounts = self._read()
+            accounts[username] = cookies
+            directory = os.path.dirname(self.path)
+            if directory and not os.path.isdir(directory):
+                os.makedirs(directory)
+            temporary = self.path + ".tmp"
+            descriptor = os.open(temporary, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(descriptor, "w") as out_file:
+                json.dump(accounts, out_file)
+            os.replace(temporary, self.path)
+
+    def _read(self):
+        try:
+            with open(self.path, "r") as in_file:
+                return json.load(in_file)
+        except (OSError, ValueError):
+            return {}
+
+
+class PremiumLogin:
+    """
+    Keeps a session logged into a Scribd premium account. Cached cookies
+    are reused until they expire, and the login is only redone when they
+    do or when Scribd answers 401/403. Safe to share between threads:
+    concurrent failures lead to a single new login.
+
+    Parameters
+    ----------
+    username : `str`
+        Username or email of the account.
+    password : `str`
+        Password of the account.
+    session : `ScribdSession`
+        Session the premium cookies are set on.
+    cache : `CredentialsCache`
+        Where cookies are kept between runs. Not cached if `None`.
+    """
+
+    def __init__(self, username, password, session=None, cache=None):
+        self.username = username
+        self.session = get_session(session)
+        self.cache = cache
+        self._password = password
+        self._cookies = None
+        self._logged_in_at = 0
+        self._lock = threading.Lock()
+
+    @property
+    def cookies(self):
+        return self._cookies
+
+    def ensure(self):
+        """
+        Makes sure the session carries valid premium cookies, from the
+        cache if possible and by logging in otherwise.
+        """
+        with self._lock:
+            if self._cookies is not None and not cookies_expired(self._cookies):
+                return
+            cookies = self.cache.load(self.username) if self.cache else None
+            if cookies is None:
+                self._login()
+            else:
+                self._use(cookies)
+
+    def refresh(self, rejected_cookie):
+        """
+        Called after Scribd rejected a request sent with the
+        `_scribd_session` cookie `rejected_cookie`. Logs in again unless
+        another thread already has or the last login is too recent.
+        Returns whether the request is worth retrying.
+        """
+        with self._lock:
+            if self._cookies and self._cookies["_scribd_session"] != rejected_cookie:
+                return True
+            if time.time() - self._logged_in_at < MIN_REFRESH_INTERVAL:
+                return False
+            self._login()
+            return True
+
+    def covers(self, url):
+        """
+        Whether requests to `url` carry the premium cookies and
+        may need a new login when rejected.
+        """
+        host = urlsplit(url).hostname or ""
+        return (host == "scribd.com" or host.endswith(".scribd.com")) and not url.startswith(SCRIBD_LOGIN_URL)
+
+    def refreshes(self, url):
+        """
+        Whether a 401/403 answer from `url` means the premium
+        cookies were rejected.
+        """
+        return metrics.endpoint(url) not in TOKEN_ENDPOINTS
+
+    def _login(self):
+        cookies = login(self.username, self._password, session=self.session)
+        if self.cache:
+            self.cache.save(self.username, cookies)
+        self._use(cookies)
+
+    def _use(self, cookies):
+        self._cookies = cookies
+        # Cached cookies count as a login just made, so the first 403
+        # of a run doesn't throw them away
+        self._logged_in_at = time.time()
+        self.session.set_premium_cookies(cookies)
+        # Tokens handed out to the old cookies may not be valid for the new ones
+        token_manager = getattr(self.session, "token_manager", None)
+        if token_manager is not None:
+            token_manager.clear()
+
+
+def set_credentials(filepath, session=None, cache=None):
+    """
+    Reads username and password for Scribd premium account
+    from the file passed and logs the session into it, reusing
+    cookies from `cache` while they are valid. The session keeps
+    the login fresh from then on. Returns the `PremiumLogin`.
+    """
+    session = get_session(session)
+    username, password = read_credentials(filepath)
+    premium_login = PremiumLogin(username, password, session=session, cache=cache)
+    premium_login.ensure()
+    session.premium_login = premium_login
+    return premium_login
@@ -0,0 +1,163 @@
+import collections
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+from .downloader import Downloader
+from .session import get_session
+
+
+def read_urls(in_file):
+    """
+    Reads URLs from an open file, one per line. Blank lines and
+    lines starting with '#' are skipped.
+    """
+    for line in in_file:
+        line = line.strip()
+        if line and not line.startswith("#"):
+            yield line
+
+
+def download_url(url, session=None, images=None, pdf=False, epub=False, jobs=1, segments=1, quiet=True,
+                 dedupe=False, max_dpi=None, jpeg_quality=None):
+    """
+    Downloads a single Scribd URL. Returns a list of output paths.
+    Extracted text isn't echoed by default, as concurrent downloads
+    would interleave it on the console.
+    """
+    scribd_link = Downloader(url,
+                             session=session,
+                             jobs=jobs,
+                             segments=segments,
+                             quiet=quiet,
+                             dedupe=dedupe,
+                             max_dpi=max_dpi,
+                             jpeg_quality=jpeg_quality)
+    downloaded_content = scribd_link.download(is_image_document=images, pdf=pdf, epub=epub)
+    if isinstance(downloaded_content, list):
+        # Audiobooks come back as a list of track paths
+        return downloaded_content
+    if isinstance(downloaded_content, str):
+        # Books written as EPUB come back as its path
+        return [downloaded_content]
+
+    if isinstance(downloaded_content.input_content, list):
+        paths = list(downloaded_content.input_content)
+    else:
+        paths = [downloaded_content.input_content]
+    if pdf:
+        paths.append(downloaded_content.pdf_path)
+    return paths
+
+
+class BatchScheduler:
+    """
+    Runs many downloads in-process, sharing one session, with a global
+    concurrency limit and a per-host concurrency limit.
+
+    Parameters
+    ----------
+    workers : `int`
+        Maximum number of URLs downloaded at the same time.
+    per_host : `int`
+        Maximum number of URLs from the same host downloaded at
+        the same time.
+    session : `ScribdSession`
+        Session shared by every download.
+    job : `callable`
+        Called as `job(url, session=session, **options)` for every URL
+        and returns the output paths. Defaults to `download_url`.
+    options : `dict`
+        Keyword arguments passed on to `job`.
+    """
+
+    def __init__(self, workers=4, per_host=4, session=None, job=download_url, **options):
+        self.workers = workers
+        self.per_host = per_host
+        self.session = get_session(session)
+        self.job = job
+        self.options = options
+
+    def run(self, urls, on_result=None):
+        """
+        Downloads every URL and returns the result records in
+        completion order. `on_result` is called with each record
+        as soon as it is available.
+        """
+        queue = collections.deque(urls)
+        running_per_host = collections.Counter()
+        results = []
+        condition = threading.Condition()
+        state = {"running": 0}
+
+        def finished(future, host):
+            record = future.result()
+            with condition:
+                state["running"] -= 1
+                running_per_host[host] -= 1
+                results.append(record)
+                if on_result:
+                    on_result(record)
+                condition.notify_all()
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            with condition:
+                while queue or state["running"]:
+                    url = self._next_url(queue, running_per_host, state["running"])
+                    if url is None:
+                        condition.wait()
+                        continue
+                    host = urlparse(url).netloc
+                    state["running"] += 1
+                    running_per_host[host] += 1
+                    future = executor.submit(self._run_job, url)
+                    future.add_done_callback(lambda future, host=host: finished(future, host))
+        return results
+
+    def _next_url(self, queue, running_per_host, running):
+        """
+        Takes the first queued URL whose host is below its limit,
+        or returns `None` if no URL may start right now.
+        """
+        if running >= self.workers:
+            return None
+        for url in queue:
+            if running_per_host[urlparse(url).netloc] < self.per_host:
+                queue.remove(url)
+                return url
+        return None
+
+    def _run_job(self, url):
+        return run_job(self.job, url, session=self.session, **self.options)
+
+
+def run_job(job, url, **options):
+    """
+    Runs `job(url, **options)` and builds the result record of the
+    download: its URL, status, output paths, size and duration.
+    """
+    start_time = time.time()
+    record = {"url": url}
+    try:
+        paths = job(url, **options)
+    except Exception as error:
+        record["status"] = "error"
+        record["error"] = "{}: {}".format(type(error).__name__, error)
+        paths = []
+    else:
+        record["status"] = "ok"
+    record["paths"] = paths
+    record["bytes"] = sum(os.path.getsize(path) for path in paths if os.path.isfile(path))
+    record["duration"] = round(time.time() - start_time, 3)
+    return record
+
+
+def write_record(out_file, record):
+    """
+    Appends a result record to an open file as a line of JSON.
+    """
+    out_file.write(json.dumps(record) + "\n")
+    out_file.flush()
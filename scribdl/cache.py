@@ -0,0 +1,188 @@
+import os
+import sqlite3
+import threading
+import time
+from urllib.parse import parse_qsl
+from urllib.parse import urlencode
+from urllib.parse import urlsplit
+from urllib.parse import urlunsplit
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "scribdl", "http.sqlite")
+DEFAULT_MAX_SIZE = 512 * 1024 * 1024
+
+# Seconds a response of each resource class is served without
+# revalidation. Book chapters and document pages never change once
+# published; the HTML pages carry titles and page lists which might.
+DEFAULT_TTLS = {
+    "page": 24 * 60 * 60,
+    "chapter": 30 * 24 * 60 * 60,
+    "jsonp": 30 * 24 * 60 * 60,
+}
+
+# Query parameters holding short-lived credentials. They are left out
+# of cache keys so a new token doesn't bust the cache.
+VOLATILE_PARAMS = ("token",)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    resource TEXT NOT NULL,
+    status INTEGER NOT NULL,
+    body BLOB NOT NULL,
+    encoding TEXT,
+    etag TEXT,
+    last_modified TEXT,
+    stored_at REAL NOT NULL,
+    accessed_at REAL NOT NULL,
+    size INTEGER NOT NULL
+)
+"""
+
+
+def cache_key(url):
+    """
+    Normalizes a URL into a cache key, dropping volatile
+    query parameters such as access tokens.
+    """
+    parts = urlsplit(url)
+    query = [(name, value) for name, value in parse_qsl(parts.query)
+             if name not in VOLATILE_PARAMS]
+    return urlunsplit((parts.scheme, parts.netloc, parts.path, urlencode(query), ""))
+
+
+class CachedResponse:
+    """
+    A response served from the on-disk cache. Mimics the parts of
+    `requests.Response` used by scribdl.
+    """
+
+    def __init__(self, url, status_code, content, encoding):
+        self.url = url
+        self.status_code = status_code
+        self.content = content
+        self.encoding = encoding or "utf-8"
+        self.headers = {}
+        self.from_cache = True
+
+    @property
+    def text(self):
+        return self.content.decode(self.encoding, errors="replace")
+
+
+class ResponseCache:
+    """
+    A persistent SQLite cache for Scribd pages, book chapters and
+    document pages, with ETag/Last-Modified revalidation, a TTL per
+    resource class and least-recently-used eviction.
+
+    Parameters
+    ----------
+    path : `str`
+        Path of the SQLite database.
+    max_size : `int`
+        Maximum total size in bytes of the cached bodies.
+    ttls : `dict`
+        Seconds each resource class is served without revalidation.
+        Overrides `DEFAULT_TTLS`.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_size=DEFAULT_MAX_SIZE, ttls=None):
+        directory = os.path.dirname(path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.path = path
+        self.max_size = max_size
+        self.ttls = dict(DEFAULT_TTLS)
+        self.ttls.update(ttls or {})
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute(SCHEMA)
+
+    def fetch(self, session, url, resource, **kwargs):
+        """
+        Returns the response for `url` from the cache while it's fresh,
+        revalidates it with the server once stale, and fetches and
+        stores it on a miss. Only successful responses are stored.
+        """
+        key = cache_key(url)
+        entry = self._lookup(key)
+        now = time.time()
+
+        if entry is not None:
+            status, body, encoding, etag, last_modified, stored_at = entry
+            if now - stored_at < self.ttls.get(resource, 0):
+                self._touch(key, now)
+                return CachedResponse(url, status, body, encoding)
+
+            headers = dict(kwargs.pop("headers", None) or {})
+            if etag:
+                headers["If-None-Match"] = etag
+            if last_modified:
+                headers["If-Modified-Since"] = last_modified
+            response = session.get(url, headers=headers, **kwargs)
+            if response.status_code == 304:
+                self._revalidated(key, now)
+                return CachedResponse(url, status, body, encoding)
+        else:
+            response = session.get(url, **kwargs)
+
+        if response.status_code == 200:
+            self._store(key, resource, response, now)
+        return response
+
+    def clear(self):
+        """
+        Removes every cached response.
+        """
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM responses")
+
+    def _lookup(self, key):
+        with self._lock:
+            return self._connection.execute(
+                "SELECT status, body, encoding, etag, last_modified, stored_at "
+                "FROM responses WHERE key = ?", (key,)).fetchone()
+
+    def _touch(self, key, now):
+        with self._lock, self._connection:
+            self._connection.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+
+    def _revalidated(self, key, now):
+        with self._lock, self._connection:
+            self._connection.execute("UPDATE responses SET stored_at = ?, accessed_at = ? WHERE key = ?",
+                                     (now, now, key))
+
+    def _store(self, key, resource, response, now):
+        body = response.content
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key,
+                 resource,
+                 response.status_code,
+                 sqlite3.Binary(body),
+                 response.encoding,
+                 response.headers.get("ETag"),
+                 response.headers.get("Last-Modified"),
+                 now,
+                 now,
+                 len(body)))
+            self._evict()
+
+    def _evict(self):
+        """
+        Drops least recently used responses until the cache fits in
+        `max_size`. Must be called with the lock held.
+        """
+        total, = self._connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()
+        if total <= self.max_size:
+            return
+        rows = self._connection.execute("SELECT key, size FROM responses ORDER BY accessed_at").fetchall()
+        evicted = []
+        for key, size in rows:
+            if total <= self.max_size:
+                break
+            evicted.append((key,))
+            total -= size
+        self._connection.executemany("DELETE FROM responses WHERE key = ?", evicted)
@@ -0,0 +1,70 @@
+import re
+
+from .session import get_session
+
+BOOK = "book"
+AUDIOBOOK = "audiobook"
+DOCUMENT = "document"
+
+BOOK_BODY_CLASS = "autogen_class_views_layouts_book_web"
+
+# Path segments which give the content type away without a request
+URL_PATTERNS = [
+    ("/audiobook/", AUDIOBOOK),
+    ("/book/", BOOK),
+    ("/read/", BOOK),
+    ("/document/", DOCUMENT),
+    ("/doc/", DOCUMENT),
+    ("/presentation/", DOCUMENT),
+]
+
+BODY_CLASS_RE = re.compile(r"<body\b[^>]*?\bclass\s*=\s*[\"']([^\"']*)[\"']", re.IGNORECASE)
+# Textual pages are made of <span class="a"> runs of text, which show up
+# backslash-escaped inside the .jsonp payloads
+TEXT_SPAN_RE = re.compile(r"<span class=\\?[\"']a\\?[\"']")
+JSONP_URL_RE = re.compile(r"https://[^\"'\s]+?\.jsonp")
+
+
+def classify_url(url):
+    """
+    Returns the content type the URL points to, or `None` if the
+    URL alone doesn't tell.
+    """
+    for pattern, content_type in URL_PATTERNS:
+        if pattern in url:
+            return content_type
+    return None
+
+
+def classify_page(page):
+    """
+    Returns the content type of a Scribd page from the class of its
+    <body> tag, without parsing the rest of the HTML.
+    """
+    match = BODY_CLASS_RE.search(page)
+    if match and match.group(1).split()[:1] == [BOOK_BODY_CLASS]:
+        return BOOK
+    return DOCUMENT
+
+
+def has_text_spans(page):
+    """
+    Checks whether an HTML page or a .jsonp page payload contains
+    selectable text.
+    """
+    return TEXT_SPAN_RE.search(page) is not None
+
+
+def is_image_document(page, session=None):
+    """
+    Guesses whether a document is made up of scanned page images
+    rather than selectable text. Looks for text on the document page
+    itself and, failing that, on its first '.jsonp' page.
+    """
+    if has_text_spans(page):
+        return False
+    match = JSONP_URL_RE.search(page)
+    if not match:
+        return True
+    session = get_session(session)
+    return not has_text_spans(session.cached_get(match.group(), "jsonp").text)
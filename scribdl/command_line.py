@@ -1,7 +1,19 @@
 import argparse
+import contextlib
+import sys
 
 from .downloader import Downloader
+from . import aio
 from . import authorize
+from . import batch
+from . import cache
+from . import metrics
+from . import profiling
+from . import retry
+from . import server
+from . import transport
+from .session import ScribdSession
+from .session import DEFAULT_POOL_MAXSIZE
 
 
 def get_arguments():
@@ -13,13 +25,138 @@ def get_arguments():
     )
 
     parser.add_argument("url", metavar="URL", type=str, help="scribd url to download")
+    _add_content_arguments(parser)
     parser.add_argument(
-        "-i",
-        "--images",
-        help="download url made up of images",
+        "-q",
+        "--quiet",
+        help="don't echo extracted text to the console",
         action="store_true",
         default=False,
     )
+    _add_concurrency_arguments(parser)
+    _add_session_arguments(parser)
+    _add_metrics_argument(parser)
+    parser.add_argument(
+        "--profile",
+        metavar="PATH",
+        help="write a Chrome trace of every request, parse, write and conversion step to this file",
+    )
+    parser.add_argument(
+        "--profile-stats",
+        metavar="PATH",
+        help="with --profile, also write a cProfile dump to this file",
+    )
+    recording = parser.add_mutually_exclusive_group()
+    recording.add_argument(
+        "--record",
+        metavar="PATH",
+        help="record every response to this archive, with tokens and cookies redacted",
+    )
+    recording.add_argument(
+        "--replay",
+        metavar="PATH",
+        help="answer every request from an archive made with --record, without network access",
+    )
+
+    return parser
+
+
+def get_batch_arguments():
+    """
+    Parses arguments off the command-line for batch downloads.
+    """
+    parser = argparse.ArgumentParser(
+        description="Download many documents and books from scribd.com in one go"
+    )
+
+    parser.add_argument(
+        "input",
+        metavar="FILE",
+        type=str,
+        help="file containing scribd urls, one per line ('-' to read from stdin)",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        help="file to write a JSON result record per url to (default: scribdl_results.jsonl)",
+        default="scribdl_results.jsonl",
+    )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        help="number of urls downloaded at the same time (default: 4)",
+        type=int,
+        default=4,
+    )
+    parser.add_argument(
+        "--per-host",
+        help="number of urls from the same host downloaded at the same time (default: 4)",
+        type=int,
+        default=4,
+    )
+    _add_content_arguments(parser)
+    _add_concurrency_arguments(parser, per="url")
+    _add_session_arguments(parser)
+    _add_metrics_argument(parser)
+
+    return parser
+
+
+def get_server_arguments():
+    """
+    Parses arguments off the command-line for the download server.
+    """
+    parser = argparse.ArgumentParser(
+        description="Serve a local HTTP/JSON API queueing downloads from scribd.com"
+    )
+
+    parser.add_argument(
+        "--host",
+        help="address to listen on (default: {})".format(server.DEFAULT_HOST),
+        default=server.DEFAULT_HOST,
+    )
+    parser.add_argument(
+        "--port",
+        help="port to listen on (default: {})".format(server.DEFAULT_PORT),
+        type=int,
+        default=server.DEFAULT_PORT,
+    )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        help="number of jobs run at the same time (default: 4)",
+        type=int,
+        default=4,
+    )
+    # Jobs may ask for other values
+    _add_concurrency_arguments(parser, per="job")
+    _add_session_arguments(parser)
+
+    return parser
+
+
+def _add_content_arguments(parser):
+    """
+    Adds the options choosing what a download is turned into.
+    """
+    # Neither option leaves it to be detected from the document
+    kind = parser.add_mutually_exclusive_group()
+    kind.add_argument(
+        "-i",
+        "--images",
+        help="treat documents as made up of images (detected automatically if not passed)",
+        action="store_const",
+        const=True,
+        default=None,
+    )
+    kind.add_argument(
+        "-t",
+        "--text",
+        help="treat documents as textual, even if they look made up of images",
+        action="store_const",
+        const=False,
+        dest="images",
+    )
     parser.add_argument(
         "-p",
         "--pdf",
@@ -27,13 +164,193 @@ def get_arguments():
         action="store_true",
         default=False,
     )
+    parser.add_argument(
+        "-e",
+        "--epub",
+        help="write books as epub instead of markdown",
+        action="store_true",
+        default=False,
+    )
+    parser.add_argument(
+        "--dedupe",
+        help="store identical pages of image documents only once",
+        action="store_true",
+        default=False,
+    )
+    parser.add_argument(
+        "--max-dpi",
+        help="downscale pages of image documents to this resolution (implies --dedupe)",
+        type=int,
+    )
+    parser.add_argument(
+        "--jpeg-quality",
+        help="recompress pages of image documents as jpegs of this quality, 1-95 (implies --dedupe)",
+        type=int,
+    )
+
+
+def _add_concurrency_arguments(parser, per=None):
+    """
+    Adds the options setting how many downloads run at once,
+    for every url or job if `per` names one.
+    """
+    per = " per {}".format(per) if per else ""
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        help="number of concurrent downloads{} (default: 1)".format(per),
+        type=int,
+        default=1,
+    )
+    parser.add_argument(
+        "-s",
+        "--segments",
+        help="download large audio files as this many parallel byte ranges{} (default: 1)".format(per),
+        type=int,
+        default=1,
+    )
+
+
+def _add_session_arguments(parser):
+    """
+    Adds the options of the session shared by every download:
+    logging in, caching, retries and rate limiting.
+    """
     parser.add_argument(
         "-c",
         "--credentials-file",
         help="path to file containing your Scribd premium credentials",
     )
+    parser.add_argument(
+        "--no-credentials-cache",
+        help="log in every run instead of reusing the cookies saved in {}".format(
+            authorize.DEFAULT_CREDENTIALS_CACHE_PATH),
+        action="store_true",
+        default=False,
+    )
+    parser.add_argument(
+        "--cache",
+        metavar="PATH",
+        nargs="?",
+        const=cache.DEFAULT_CACHE_PATH,
+        help="cache pages and chapters on disk so re-runs skip the network "
+             "(default path: {})".format(cache.DEFAULT_CACHE_PATH),
+    )
+    parser.add_argument(
+        "--retries",
+        metavar="N",
+        type=int,
+        default=retry.DEFAULT_ATTEMPTS - 1,
+        help="times a failed request is retried, with exponential backoff (default: {})".format(
+            retry.DEFAULT_ATTEMPTS - 1),
+    )
+    parser.add_argument(
+        "--rate-limit",
+        metavar="RPS",
+        type=float,
+        help="send at most this many requests per second on average (default: unlimited)",
+    )
 
-    return parser
+
+def _add_metrics_argument(parser):
+    parser.add_argument(
+        "--metrics",
+        metavar="PATH",
+        help="write request, transfer, parse and conversion metrics to this JSON file when done",
+    )
+
+
+def _make_session(args, pool_size, response_cache):
+    """
+    Creates the session shared by every download, with as many
+    connections as `pool_size` downloads need at once.
+    """
+    return ScribdSession(pool_maxsize=max(DEFAULT_POOL_MAXSIZE, pool_size),
+                         cache=response_cache,
+                         retry_policy=retry.RetryPolicy(attempts=args.retries + 1),
+                         rate_limiter=retry.RateLimiter(args.rate_limit))
+
+
+def _log_in(args, session):
+    """
+    Logs the session into the premium account given on the command-line.
+    """
+    if args.credentials_file:
+        credentials_cache = None if args.no_credentials_cache else authorize.CredentialsCache()
+        authorize.set_credentials(args.credentials_file, session=session, cache=credentials_cache)
+
+
+def _server_command_line():
+    """
+    This function gets executed when running the download server
+    via command-line.
+    """
+    parser = get_server_arguments()
+    args = parser.parse_args()
+
+    pool_size = args.workers * args.jobs * args.segments
+    response_cache = cache.ResponseCache(args.cache) if args.cache else None
+    session = _make_session(args, pool_size, response_cache)
+    _log_in(args, session)
+
+    job_queue = server.JobQueue(workers=args.workers,
+                                session=session,
+                                jobs=args.jobs,
+                                segments=args.segments)
+    job_queue.start()
+    http_server = server.make_server(job_queue, host=args.host, port=args.port)
+    print("Serving on http://{}:{}/jobs".format(args.host, http_server.server_port))
+    try:
+        http_server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nStopping, waiting for running jobs to finish..")
+    finally:
+        http_server.server_close()
+        job_queue.stop()
+
+
+def _batch_command_line():
+    """
+    This function gets executed when batch downloading via command-line.
+    """
+    parser = get_batch_arguments()
+    args = parser.parse_args()
+
+    pool_size = args.workers * args.jobs * args.segments
+    response_cache = cache.ResponseCache(args.cache) if args.cache else None
+    session = _make_session(args, pool_size, response_cache)
+    _log_in(args, session)
+
+    if args.input == "-":
+        urls = list(batch.read_urls(sys.stdin))
+    else:
+        with open(args.input, "r") as in_file:
+            urls = list(batch.read_urls(in_file))
+
+    scheduler = batch.BatchScheduler(workers=args.workers,
+                                     per_host=args.per_host,
+                                     session=session,
+                                     images=args.images,
+                                     pdf=args.pdf,
+                                     epub=args.epub,
+                                     jobs=args.jobs,
+                                     segments=args.segments,
+                                     dedupe=args.dedupe,
+                                     max_dpi=args.max_dpi,
+                                     jpeg_quality=args.jpeg_quality)
+    try:
+        with open(args.output, "a") as out_file:
+            results = scheduler.run(urls, on_result=lambda record: batch.write_record(out_file, record))
+    finally:
+        if args.metrics:
+            metrics.REGISTRY.dump(args.metrics)
+
+    failed = sum(1 for record in results if record["status"] != "ok")
+    print("\nDownloaded {} of {} urls, results written to {}".format(len(results) - failed,
+                                                                   len(results),
+                                                                   args.output))
+    if failed:
+        sys.exit(1)
 
 
 def _command_line():
@@ -42,19 +359,48 @@ def _command_line():
     """
     parser = get_arguments()
     args = parser.parse_args()
+    if args.profile_stats and not args.profile:
+        parser.error("--profile-stats requires --profile")
     url = args.url
     pdf = args.pdf
     images = args.images
 
-    if args.credentials_file:
-        credentials_file = args.credentials_file
-        authorize.set_credentials(credentials_file)
-
-    scribd_link = Downloader(url)
-    downloaded_content = scribd_link.download(is_image_document=images)
-    if pdf:
-        print("\nConverting to {}..".format(downloaded_content.pdf_path))
-        downloaded_content.to_pdf()
+    response_cache = cache.ResponseCache(args.cache) if args.cache else None
+    session = _make_session(args, args.jobs * args.segments, response_cache)
+    recording = None
+    if args.record:
+        recording = transport.record(session, args.record)
+    elif args.replay:
+        transport.replay(session, args.replay)
+
+    if args.profile:
+        profiler = profiling.Profiler(args.profile, args.profile_stats)
+    else:
+        profiler = contextlib.nullcontext()
+
+    async def download(aio_session):
+        # Profiled from logging in on, and on the event loop thread
+        # the download runs on, which is the one cProfile sees
+        with profiler:
+            await aio_session.run(_log_in, args, session)
+            scribd_link = Downloader(url,
+                                     session=session,
+                                     jobs=args.jobs,
+                                     segments=args.segments,
+                                     quiet=args.quiet,
+                                     dedupe=args.dedupe,
+                                     max_dpi=args.max_dpi,
+                                     jpeg_quality=args.jpeg_quality)
+            await scribd_link.download_async(is_image_document=images, pdf=pdf, epub=args.epub,
+                                             aio_session=aio_session)
+
+    try:
+        aio.block_on(download, session=session)
+    finally:
+        if recording is not None:
+            recording.save()
+        if args.metrics:
+            metrics.REGISTRY.dump(args.metrics)
 
 
 if __name__ == "__main__":
@@ -1,12 +1,16 @@
 from bs4 import BeautifulSoup
-import requests
 import json
+import os
 import re
+import time
 
 from .base import ScribdBase
+from .. import aio
 from .. import internals
-from .. import const
+from .. import metrics
+from .. import profiling
 from .. import exceptions
+from ..session import get_session
 
 
 class Track:
@@ -18,9 +22,15 @@ class Track:
     track: `dict`
         A dictionary information about an audiobook chapter
         containing the keys: "url", "part_number" and "chapter_number".
+    session: `ScribdSession`
+        Session used to download the track.
+    segments: `int`
+        Number of parallel byte ranges used for large tracks.
     """
 
-    def __init__(self, track):
+    def __init__(self, track, session=None, segments=1):
+        self.session = get_session(session)
+        self.segments = segments
         self.url = track["url"]
         self.part_number = track["part_number"]
         self.chapter_number = track["chapter_number"]
@@ -30,7 +40,13 @@ class Track:
         """
         Downloads the audiobook chapter to the given path.
         """
-        internals.download_stream(self.url, path)
+        aio.block_on(lambda aio_session: self.download_async(aio_session, path), session=self.session)
+
+    async def download_async(self, aio_session, path):
+        """
+        The asyncio counterpart of `download`.
+        """
+        await aio_session.download_stream(self.url, path, segments=self.segments)
 
 
 class Playlist:
@@ -46,27 +62,100 @@ class Playlist:
         A dictionary information about an audiobook playlist and
         its tracks containing the keys: "playlist", "expires" and
         "playlist_token".
+
+    session: `ScribdSession`
+        Session used to download the tracks.
+
+    jobs: `int`
+        Maximum number of tracks downloaded concurrently.
+
+    segments: `int`
+        Number of parallel byte ranges used for each large track.
     """
 
-    def __init__(self, title, playlist):
+    def __init__(self, title, playlist, session=None, jobs=1, segments=1):
+        self.session = get_session(session)
+        self.jobs = jobs
         self.title = title
         self.sanitized_title = internals.sanitize_title(title)
-        self.tracks = [ Track(track) for track in playlist["playlist"] ]
+        self.tracks = [ Track(track, session=self.session, segments=segments)
+                        for track in playlist["playlist"] ]
         self._playlist = playlist
         self.download_paths = []
 
     def download(self):
         """
-        Downloads all the chapters available in the playlist.
+        Downloads all the chapters available in the playlist, up to
+        `jobs` at a time. `download_paths` is filled in chapter order.
+
+        Runs `download_async` on the session's event loop.
         """
-        for track in self.tracks:
-            path = "{0}_{1}.mp3".format(self.sanitized_title, track.chapter_number)
-            dl_str = 'Downloading chapter-{0} ({1}) to "{2}"'.format(track.chapter_number,
-                                                                   track.url,
-                                                                   path)
-            print(dl_str)
-            track.download(path)
-            self.download_paths.append(path)
+        aio.block_on(self.download_async, session=self.session)
+
+    @profiling.traced("Playlist.download")
+    async def download_async(self, aio_session):
+        """
+        The asyncio counterpart of `download`, fetching tracks
+        through the passed `AsyncSession`.
+        """
+        paths = self._track_paths()
+        start_time = time.time()
+
+        async def download_track(args):
+            return await self._download_track(aio_session, *args)
+
+        sizes = [size async for size in aio.imap_limited(download_track,
+                                                          zip(self.tracks, paths),
+                                                          jobs=self.jobs)]
+        self._report(paths, sizes, start_time)
+
+    def _track_paths(self):
+        return ["{0}_{1}.mp3".format(self.sanitized_title, track.chapter_number)
+                for track in self.tracks]
+
+    def _report(self, paths, sizes, start_time):
+        """
+        Records the downloaded paths and prints the overall transfer rate.
+        """
+        self.download_paths.extend(paths)
+
+        elapsed = time.time() - start_time
+        print("Downloaded {0} chapters ({1:.1f} MB) in {2:.1f}s at {3:.2f} MB/s".format(
+            len(paths),
+            sum(sizes) / 1e6,
+            elapsed,
+            sum(sizes) / 1e6 / max(elapsed, 1e-6)))
+
+    async def _download_track(self, aio_session, track, path):
+        """
+        Downloads a single track, reporting its size and transfer rate.
+        Returns the number of bytes downloaded.
+        """
+        if os.path.exists(path):
+            print('Skipping chapter-{0}, already downloaded to "{1}"'.format(track.chapter_number, path))
+            return 0
+        dl_str = 'Downloading chapter-{0} ({1}) to "{2}"'.format(track.chapter_number,
+                                                               track.url,
+                                                               path)
+        print(dl_str)
+        start_time = time.time()
+        await track.download_async(aio_session, path)
+        return self._report_track(track, path, start_time)
+
+    def _report_track(self, track, path, start_time):
+        """
+        Prints the size and transfer rate of a downloaded track.
+        Returns its size in bytes.
+        """
+        elapsed = time.time() - start_time
+        size = os.path.getsize(path)
+        metrics.inc("scribdl_items_total", kind="track")
+        print("Finished chapter-{0}: {1:.1f} MB in {2:.1f}s ({3:.2f} MB/s)".format(
+            track.chapter_number,
+            size / 1e6,
+            elapsed,
+            size / 1e6 / max(elapsed, 1e-6)))
+        return size
 
 
 class ScribdAudioBook(ScribdBase):
@@ -77,10 +166,21 @@ class ScribdAudioBook(ScribdBase):
     ----------
     url: `str`
         A string containing Scribd audiobook URL.
+    session: `ScribdSession`
+        Session used for every network request. The premium cookies
+        are carried by the session.
+    page: `str`
+        HTML of the audiobook page, if the caller has already fetched it.
+    jobs: `int`
+        Maximum number of tracks downloaded concurrently.
+    segments: `int`
+        Number of parallel byte ranges used for each large track.
     """
 
-    def __init__(self, audiobook_url):
-        super().__init__(audiobook_url)
+    def __init__(self, audiobook_url, session=None, page=None, jobs=1, segments=1):
+        super().__init__(audiobook_url, session=session, page=page)
+        self.jobs = jobs
+        self.segments = segments
         scribd_id_search = re.search("[0-9]{9}", audiobook_url)
         scribd_id = scribd_id_search.group()
 
@@ -93,10 +193,6 @@ class ScribdAudioBook(ScribdBase):
         self.audiobook_url = audiobook_url
         self.scribd_id = scribd_id
 
-        # Replace these cookie values with ones generated when logged into a
-        # Scribd premium-account. This will allow access to full audiobooks.
-        self.cookies = const.premium_cookies
-
     @property
     def audiobook_keys(self):
         """
@@ -213,7 +309,11 @@ class ScribdAudioBook(ScribdBase):
         Returns a `Playlist` object.
         """
         if not self._playlist:
-            self._playlist = Playlist(self.title, self.make_playlist())
+            self._playlist = Playlist(self.title,
+                                      self.make_playlist(),
+                                      session=self.session,
+                                      jobs=self.jobs,
+                                      segments=self.segments)
         return self._playlist
 
     def _get_license_id(self):
@@ -221,8 +321,8 @@ class ScribdAudioBook(ScribdBase):
         Scrapes the License-ID for the audiobook. We need to handle retries
         as Scribd can sometimes fail to deliver the License-ID in the HTML.
         """
-        requests.get(self.authenticate_url, cookies=self.cookies)
-        response = requests.get(self.license_url, headers=self.headers)
+        self.session.get(self.authenticate_url)
+        response = self.session.get(self.license_url, headers=self.headers)
         response_dict = json.loads(response.text)
         try:
             license_id = response_dict["licenses"][0]["id"]
@@ -238,10 +338,9 @@ class ScribdAudioBook(ScribdBase):
     def _scrape_audiobook_page(self):
         """
         Scrapes the provided audiobook URL for information scraps.
+        Reuses the page already fetched for the title.
         """
-        response = requests.get(self.audiobook_url, cookies=self.cookies)
-        # response = requests.get(self.audiobook_url)
-        soup = BeautifulSoup(response.text, "html.parser")
+        soup = self._soup
 
         div_tag = soup.find("div", {"data-track_category": "book_preview"})
         text = json.loads(div_tag["data-push_state"])
@@ -261,7 +360,7 @@ class ScribdAudioBook(ScribdBase):
         Scrapes the authentication/listen page of the audiobook
         for information scraps.
         """
-        response = requests.get(self.authenticate_url, cookies=self.cookies)
+        response = self.session.get(self.authenticate_url)
         soup = BeautifulSoup(response.text, "html.parser")
         js_tag = soup.find_all("script", {"type": "text/javascript"})[-2]
 
@@ -285,7 +384,7 @@ class ScribdAudioBook(ScribdBase):
         """
         if self.premium_cookies:
             data = '{"license_id":"' + self.license_id + '"}'
-            response = requests.post(self.playlist_url, headers=self.headers, data=data)
+            response = self.session.post(self.playlist_url, headers=self.headers, data=data)
             playlist = json.loads(response.text)
         else:
             playlist = {"playlist": [{"url": self.preview_url,
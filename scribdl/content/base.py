@@ -1,9 +1,10 @@
 from bs4 import BeautifulSoup
-import requests
 from abc import ABCMeta, abstractmethod
 import six
 
 from .. import internals
+from .. import metrics
+from ..session import get_session
 
 
 @six.add_metaclass(ABCMeta)
@@ -15,12 +16,20 @@ class ScribdBase:
     ----------
     url : `str`
         A string containing Scribd URL.
+    session : `ScribdSession`
+        Session used for every network request. Defaults to the
+        process-wide shared session.
+    page : `str`
+        HTML of the page at `url`, if the caller has already fetched it.
+        Otherwise the page is fetched when first needed.
     """
 
-    def __init__(self, url):
+    def __init__(self, url, session=None, page=None):
         self.url = url
+        self.session = get_session(session)
         self._title = None
         self._sanitized_title = None
+        self._page = page
         self._hidden_soup = None
 
     @property
@@ -54,12 +63,23 @@ class ScribdBase:
         """
         pass
 
+    async def _load_page_async(self, aio_session):
+        """
+        Fetches the page on the event loop, unless it was passed in
+        or already fetched, so later parsing doesn't block.
+        """
+        if self._page is None:
+            response = await aio_session.cached_get(self.url, "page")
+            self._page = response.text
+
     @property
     def _soup(self):
         """
         Parse HTML.
         """
         if not self._hidden_soup:
-            response = requests.get(self.url)
-            self._hidden_soup = BeautifulSoup(response.text, "html.parser")
+            if self._page is None:
+                self._page = internals.fetch_page(self.url, session=self.session)
+            with metrics.timer("scribdl_parse_seconds", kind="html"):
+                self._hidden_soup = BeautifulSoup(self._page, "html.parser")
         return self._hidden_soup
@@ -1,10 +1,16 @@
-import requests
+import asyncio
 import json
 import os
 
 from .base import ScribdBase
-from .. import internals
-from .. import const
+from .. import aio
+from .. import exceptions
+from .. import metrics
+from .. import profiling
+from .. import resume
+from ..epub import EpubSink
+from ..sink import MarkdownBookSink
+from ..tokens import get_token_manager
 
 
 class ScribdBook(ScribdBase):
@@ -15,14 +21,38 @@ class ScribdBook(ScribdBase):
     ----------
     url : `str`
         A string containing Scribd book URL.
+    session : `ScribdSession`
+        Session used for every network request.
+    page : `str`
+        HTML of the book page, if the caller has already fetched it.
+    jobs : `int`
+        Maximum number of images downloaded concurrently.
+    window : `int`
+        Number of chapters fetched ahead of the one being written.
+        Defaults to `jobs`.
+    quiet : `bool`
+        Don't echo the extracted text to the console.
     """
 
-    def __init__(self, book_url):
-        super().__init__(book_url)
-        self.filename = self.sanitized_title + ".md"
+    def __init__(self, book_url, session=None, page=None, jobs=1, window=None, quiet=False):
+        super().__init__(book_url, session=session, page=page)
         self.url = book_url
+        self.jobs = jobs
+        self.window = window or jobs
+        self.quiet = quiet
         self._book_id = None
-        self._csrf_token = None
+        self._tokens = get_token_manager(self.session)
+        self._schedule_image = None
+        self._image_futures = []
+        self._unconfirmed_chapters = []
+
+    @property
+    def filename(self):
+        """
+        The markdown file the book is written to. Told from the
+        title, so the page is fetched if it hasn't been yet.
+        """
+        return self.sanitized_title + ".md"
 
     @property
     def book_id(self):
@@ -46,92 +76,252 @@ class ScribdBook(ScribdBase):
         in textual books premium content of audiobooks can still
         be downloaded without it though.
         """
-        if not self._csrf_token:
-            csrf_token_url = "https://scribd.com/csrf_token"
-            response = requests.get(csrf_token_url, cookies=const.premium_cookies)
-            json_dict = json.loads(response.text)
-            self._csrf_token = {"X-CSRF-Token": json_dict["csrf_token"]}
-        return self._csrf_token
+        return {"X-CSRF-Token": self._tokens.csrf_token()}
 
     def download(self, filename=None):
         """
         Processing text and image extraction.
+
+        Up to `window` chapters are fetched ahead while earlier ones
+        are written, and inline images are downloaded in the background.
+        Chapters are still written to the file strictly in order.
+
+        Completed chapters are checkpointed in a manifest next to the
+        file, so an interrupted download resumes after the last one.
+
+        Runs `download_async` on the session's event loop.
         """
+        return aio.block_on(lambda aio_session: self.download_async(aio_session, filename),
+                            session=self.session)
+
+    @profiling.traced("ScribdBook.download")
+    async def download_async(self, aio_session, filename=None):
+        """
+        The asyncio counterpart of `download`, fetching chapters and
+        images through the passed `AsyncSession`.
+        """
+        await self._load_page_async(aio_session)
         if not filename:
             filename = self.filename
 
-        token = self._get_token()
-        chapter = 1
+        manifest = resume.Manifest(resume.manifest_path(filename))
+        first_chapter = resume.restore_output(filename, manifest) + 1
+        if first_chapter > 1:
+            print("Resuming from chapter {}".format(first_chapter))
+
+        self._start_image_tasks(aio_session)
+        try:
+            with MarkdownBookSink(filename, quiet=self.quiet) as sink:
+                await self._download_chapters(aio_session, sink, first_chapter, manifest)
+            await self._wait_for_images()
+            manifest.remove()
+        finally:
+            # Image tasks are only left running if the download failed
+            for future in self._image_futures:
+                future.cancel()
+            self._schedule_image = None
+
+        return filename
+
+    def download_epub(self, filename=None):
+        """
+        Writes the book straight to an EPUB, one XHTML file per
+        chapter, without going through markdown. Images are added to
+        the EPUB from where they were downloaded.
+
+        Runs `download_epub_async` on the session's event loop.
+        """
+        return aio.block_on(lambda aio_session: self.download_epub_async(aio_session, filename),
+                            session=self.session)
+
+    async def download_epub_async(self, aio_session, filename=None):
+        """
+        The asyncio counterpart of `download_epub`.
+        """
+        await self._load_page_async(aio_session)
+        if not filename:
+            filename = self.sanitized_title + ".epub"
+
+        self._start_image_tasks(aio_session)
+        sink = EpubSink(filename, self.title, "scribd-{}".format(self.book_id))
+        try:
+            await self._download_chapters(aio_session, sink, 1)
+            await self._wait_for_images()
+            sink.close()
+        except BaseException:
+            for future in self._image_futures:
+                future.cancel()
+            sink.abort()
+            raise
+        finally:
+            self._schedule_image = None
+
+        return filename
+
+    def _start_image_tasks(self, aio_session):
+        """
+        Sets up background image downloads as tasks on the running
+        event loop, at most `jobs` at a time.
+        """
+        semaphore = asyncio.Semaphore(self.jobs)
+
+        async def download(url, path):
+            async with semaphore:
+                await aio_session.download_stream(url, path)
+
+        self._schedule_image = lambda url, path: asyncio.ensure_future(download(url, path))
+        self._image_futures = []
+        self._unconfirmed_chapters = []
+
+    async def _download_chapters(self, aio_session, sink, chapter, manifest=None):
+        """
+        Fetches chapters speculatively, starting from `chapter`, and
+        writes them in order. Pending fetches for chapters past the end
+        of the book are cancelled once the end is reached.
+
+        Written chapters are checkpointed to `manifest` if one is passed.
+        """
+        # Fetched-ahead chapters wait here, keyed by chapter number,
+        # until every chapter before them has been written.
+        pending = {}
+        next_chapter = chapter
 
-        while True:
-            response = self.fetch_response(chapter, token)
+        try:
+            while True:
+                # Cached, and refreshed in the background before it expires
+                token = await self._get_token_async(aio_session)
+                while next_chapter < chapter + self.window:
+                    fetch = self.fetch_response_async(aio_session, next_chapter, token)
+                    pending[next_chapter] = (asyncio.ensure_future(fetch), token)
+                    next_chapter += 1
 
-            if response.status_code == 403:
-                token = self._get_token()
-                response = self.fetch_response(chapter, token)
+                future, token = pending.pop(chapter)
+                response = await future
 
                 if response.status_code == 403:
-                    print("No more content being exposed by Scribd!")
+                    metrics.inc("scribdl_retries_total", reason="token")
+                    self._tokens.invalidate(self.book_id, token)
+                    token = await self._get_token_async(aio_session)
+                    # Chapters fetched ahead used the expired token as well
+                    self._cancel_pending(pending)
+                    next_chapter = chapter + 1
+                    response = await self.fetch_response_async(aio_session, chapter, token)
+
+                    if response.status_code == 403:
+                        print("No more content being exposed by Scribd!")
+                        break
+
+                if not self._write_chapter(response, chapter, token, sink, manifest):
                     break
 
-            try:
+                chapter += 1
+        finally:
+            self._cancel_pending(pending)
+
+    def _write_chapter(self, response, chapter, token, sink, manifest):
+        """
+        Writes a fetched chapter to the sink and checkpoints it.
+        Returns `False` once past the end of the book.
+
+        Scribd errors that outlasted the session's retries fail the
+        download, which resumes from this chapter when run again,
+        rather than being taken for the end of the book.
+        """
+        if response.status_code == 429 or response.status_code >= 500:
+            raise exceptions.ScribdFetchError(
+                "Chapter {} of book {} failed with status {}".format(chapter, self.book_id, response.status_code))
+        try:
+            with metrics.timer("scribdl_parse_seconds", kind="chapter"):
                 json_response = json.loads(response.text)
-            except ValueError:
-                print("Completed downloading book!")
-                break
+        except ValueError:
+            print("Completed downloading book!")
+            return False
 
-            self._extract_text_blocks(json_response, chapter, token, filename)
+        image_count = len(self._image_futures)
+        with metrics.timer("scribdl_write_seconds", kind="chapter"):
+            sink.start_chapter(chapter)
+            self._extract_text_blocks(json_response, chapter, token, sink)
+        metrics.inc("scribdl_items_total", kind="chapter")
+        if manifest is not None:
+            self._unconfirmed_chapters.append((chapter,
+                                               sink.tell(),
+                                               self._image_futures[image_count:]))
+            self._checkpoint(manifest)
+        return True
 
-            chapter += 1
+    def _checkpoint(self, manifest):
+        """
+        Records the last written chapter whose images have all been
+        downloaded, along with the size of the file at that point.
+        """
+        confirmed = None
+        while self._unconfirmed_chapters:
+            chapter, offset, image_futures = self._unconfirmed_chapters[0]
+            if not all(future.done() and not future.exception() for future in image_futures):
+                break
+            confirmed = (chapter, offset)
+            self._unconfirmed_chapters.pop(0)
+        if confirmed:
+            manifest.update(completed=confirmed[0], offset=confirmed[1])
 
-        return filename
+    def _cancel_pending(self, pending):
+        """
+        Cancels chapter fetches still in flight. Their responses
+        would only be dropped.
+        """
+        for future, _ in pending.values():
+            future.cancel()
+        pending.clear()
 
-    def _extract_text(self, content, chapter, token):
+    def _extract_text(self, content, chapter, token, sink):
         """
-        Extracts text given a block of raw html.
+        Extracts text given a block of raw html, escaped and
+        marked up for the passed sink.
         """
         words = []
         for word in content["words"]:
             if word.get("break_map", None):
-                words.append(word["break_map"]["text"])
+                words.append(sink.escape(word["break_map"]["text"]))
             elif word.get("text", None):
-                words.append(word["text"])
+                words.append(sink.escape(word["text"]))
             elif word.get("type", None) == "image":
                 image_url = self._format_image_url(chapter, word["src"], token)
-                string_text = self._process_image_text(word, image_url)
+                string_text = self._process_image_text(word, image_url, sink)
                 words.append(string_text)
             else:
-                words += self._extract_text(word, chapter, token)
+                words += self._extract_text(word, chapter, token, sink)
         return words
 
     def fetch_response(self, chapter, token):
         url = self._format_content_url(chapter, token)
-        response = requests.get(url)
+        response = self.session.cached_get(url, "chapter")
+        return response
+
+    async def fetch_response_async(self, aio_session, chapter, token):
+        url = self._format_content_url(chapter, token)
+        response = await aio_session.cached_get(url, "chapter")
         return response
 
-    def _extract_text_blocks(self, response_dict, chapter, token, filename):
+    def _extract_text_blocks(self, response_dict, chapter, token, sink):
         """
         Extracts small blocks of raw book text and image
-        URLs and writes them to a file.
+        URLs and writes them to the passed sink.
         """
         for block in response_dict["blocks"]:
             if block["type"] == "text":
-                string_text = (
-                    " ".join(self._extract_text(block, chapter, token)) + "\n\n"
-                )
+                string_text = sink.paragraph(self._extract_text(block, chapter, token, sink))
             elif block["type"] == "image":
                 image_url = self._format_image_url(chapter, block["src"], token)
-                string_text = self._process_image_text(block, image_url)
+                string_text = self._process_image_text(block, image_url, sink)
 
             if block["type"] in ("text", "image"):
-                print(string_text)
-                self.save_text(string_text, filename)
+                sink.write(string_text)
 
-    def _process_image_text(self, block, image_url):
+    def _process_image_text(self, block, image_url, sink):
         image_name = block["src"].replace("images/", "")
         image_path = os.path.join(self.sanitized_title, image_name)
         self._download_image(image_url, image_path)
-        string_text = "![{}]({})\n\n".format(image_name, image_path)
+        string_text = sink.image(image_name, image_path)
         return string_text
 
     def _download_image(self, url, path):
@@ -139,7 +329,15 @@ class ScribdBook(ScribdBase):
             os.makedirs(os.path.dirname(path))
         except OSError:
             pass
-        internals.download_stream(url, path)
+        self._image_futures.append(self._schedule_image(url, path))
+
+    async def _wait_for_images(self):
+        """
+        Waits until every background image download has finished,
+        re-raising the first failure.
+        """
+        await asyncio.gather(*self._image_futures)
+        self._image_futures = []
 
     def _extract_image_path_from_url(self, url):
         image_name = url.split("/")[-1].split("?token=")[0]
@@ -164,19 +362,17 @@ class ScribdBook(ScribdBase):
 
     def _get_token(self):
         """
-        Fetches a uniquely generated token for the current
-        session.
+        Returns a token granting the current session access to the
+        book, shared with every other download of it in the session.
         """
-        # data can take take any value but it must take some value
-        # otherwise Scribd will reject the request
-        data = "data"
+        return self._tokens.access_token(self.book_id)
 
-        token_url = "https://www.scribd.com/read2/{}/access_token".format(self.book_id)
-        token = requests.post(token_url,
-                              headers=self.csrf_token_header,
-                              cookies=const.premium_cookies,
-                              data=data)
-        return json.loads(token.text)["response"]
+    async def _get_token_async(self, aio_session):
+        """
+        The asyncio counterpart of `_get_token`. Only waits on the
+        network when there is no valid token cached.
+        """
+        return await aio_session.run(self._get_token)
 
     def save_text(self, string_text, filename):
         """
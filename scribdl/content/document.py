@@ -1,11 +1,14 @@
-from bs4 import BeautifulSoup
-import requests
-
 import os
 
 from abc import abstractmethod
 from .base import ScribdBase
+from .. import aio
 from .. import internals
+from .. import metrics
+from .. import profiling
+from .. import parsers
+from .. import resume
+from ..sink import TextSink
 
 
 class ScribdDocument(ScribdBase):
@@ -16,13 +19,16 @@ class ScribdDocument(ScribdBase):
     ----------
     url : `str`
         A string containing Scribd document URL.
+    session : `ScribdSession`
+        Session used for every network request.
+    page : `str`
+        HTML of the document page, if the caller has already fetched it.
     """
 
-    def __init__(self, document_url):
-        super().__init__(document_url)
+    def __init__(self, document_url, session=None, page=None):
+        super().__init__(document_url, session=session, page=page)
         self.url = document_url
         self._jsonp_urls = None
-        self._hidden_soup = None
 
     @property
     def jsonp_urls(self):
@@ -73,12 +79,27 @@ class ScribdTextualDocument(ScribdDocument):
     ----------
     document_url : `str`
         A string containing Scribd document URL.
+    session : `ScribdSession`
+        Session used for every network request.
+    page : `str`
+        HTML of the document page, if the caller has already fetched it.
+    quiet : `bool`
+        Don't echo the extracted text to the console.
     """
 
-    def __init__(self, document_url):
-        super().__init__(document_url)
-        self.filename = self.sanitized_title + ".md"
+    def __init__(self, document_url, session=None, page=None, quiet=False):
+        super().__init__(document_url, session=session, page=page)
+        self.quiet = quiet
+
+    @property
+    def filename(self):
+        """
+        The markdown file the text is written to. Told from the
+        title, so the page is fetched if it hasn't been yet.
+        """
+        return self.sanitized_title + ".md"
 
+    @profiling.traced("ScribdTextualDocument.download")
     def download(self, filename=None):
         """
         Generates the filename and processes the text extraction
@@ -93,35 +114,34 @@ class ScribdTextualDocument(ScribdDocument):
 
     def _text_extractor(self, filename):
         """
-        Saves text from every '.jsonp' URL.
+        Saves text from every '.jsonp' URL. Completed pages are
+        checkpointed so an interrupted extraction resumes after them.
         """
-        for jsonp_url in self.jsonp_urls:
-            self._save_text(jsonp_url, filename)
-
-    def _save_text(self, jsonp, filename):
+        manifest = resume.Manifest(resume.manifest_path(filename))
+        completed = resume.restore_output(filename, manifest)
+        with TextSink(filename, quiet=self.quiet) as sink:
+            for page, jsonp_url in enumerate(self.jsonp_urls, 1):
+                if page <= completed:
+                    continue
+                self._save_text(jsonp_url, sink)
+                manifest.update(completed=page, offset=sink.tell())
+        manifest.remove()
+
+    def _save_text(self, jsonp, sink):
         """
-        Makes a GET request to the '.jsonp' URL and saves
-        the text to the passed file.
+        Makes a GET request to the '.jsonp' URL and writes
+        the text to the passed `TextSink`.
         """
-        response = requests.get(jsonp).text
-        page_no = response[11:12]
-
-        response_head = (
-            (response)
-            .replace("window.page" + page_no + '_callback(["', "")
-            .replace("\\n", "")
-            .replace("\\", "")
-            .replace('"]);', "")
-        )
-        soup_content = BeautifulSoup(response_head, "html.parser")
+        response = self.session.cached_get(jsonp, "jsonp").text
+        with metrics.timer("scribdl_parse_seconds", kind="jsonp"):
+            _, page_html = parsers.parse_jsonp_page(response)
+            spans = parsers.extract_span_text(page_html)
 
-        for x in soup_content.find_all("span", {"class": "a"}):
-            xtext = internals.fix_encoding(x.get_text())
-            print(xtext)
-
-            extraction = xtext + "\n\n"
-            with open(filename, "a") as feed:
-                feed.write(extraction)
+        with metrics.timer("scribdl_write_seconds", kind="page"):
+            for span_text in spans:
+                xtext = internals.fix_encoding(span_text)
+                sink.write(xtext + "\n\n")
+        metrics.inc("scribdl_items_total", kind="page")
 
 
 class ScribdImageDocument(ScribdDocument):
@@ -132,51 +152,94 @@ class ScribdImageDocument(ScribdDocument):
     ----------
     document_url : `str`
         A string containing Scribd document URL.
+    session : `ScribdSession`
+        Session used for every network request.
+    page : `str`
+        HTML of the document page, if the caller has already fetched it.
+    jobs : `int`
+        Maximum number of pages downloaded concurrently.
+    image_stage : `ImageStage`
+        Optimizes and deduplicates pages as soon as they are downloaded.
     """
 
-    def __init__(self, document_url):
-        super().__init__(document_url)
+    def __init__(self, document_url, session=None, page=None, jobs=1, image_stage=None):
+        super().__init__(document_url, session=session, page=page)
+        self.jobs = jobs
+        self.image_stage = image_stage
         self._image_download_counter = 1
 
-    def download(self, initial_filename=None):
+    def download(self, initial_filename=None, on_page=None):
         """
         Function for downloading images off '.jsonp' URLs to
         filenames.
+
+        `on_page` is called with every image path, in page order, as
+        soon as that page and all pages before it are downloaded. It
+        runs on the session's thread pool, one page at a time.
+
+        Runs `download_async` on the session's event loop.
+        """
+        return aio.block_on(lambda aio_session: self.download_async(aio_session, initial_filename, on_page),
+                            session=self.session)
+
+    @profiling.traced("ScribdImageDocument.download")
+    async def download_async(self, aio_session, initial_filename=None, on_page=None):
         """
+        The asyncio counterpart of `download`, fetching pages through
+        the passed `AsyncSession`, up to `jobs` at a time.
+        """
+        await self._load_page_async(aio_session)
         if not initial_filename:
             initial_filename = self.sanitized_title
 
-        downloaded_html_images = self._html_image_extractor(initial_filename)
-        downloaded_jsonp_images = self._jsonp_image_extractor(initial_filename)
-        return downloaded_html_images + downloaded_jsonp_images
+        images = self._html_images(initial_filename)
+        images += self._jsonp_images(initial_filename)
+
+        async def save(image):
+            url, filename = image
+            if await self._save_image(aio_session, url, filename) and self.image_stage:
+                await aio_session.run(self.image_stage.process, filename)
+            return filename
 
-    def _jsonp_image_extractor(self, initial_filename):
+        async for filename in aio.imap_limited(save, images, jobs=self.jobs):
+            if on_page:
+                # Such as copying the page into a PDF, kept off the loop
+                await aio_session.run(on_page, filename)
+        return [filename for _, filename in images]
+
+    def _jsonp_images(self, initial_filename):
         """
-        Extract images from extracted .jsonp URLs.
+        Lists (url, filename) pairs of the images behind
+        the '.jsonp' URLs.
         """
-        downloaded_images = []
+        images = []
         found = self._image_download_counter > 1
         for jsonp_url in self.jsonp_urls:
-            filename = "{}_{}.jpg".format(initial_filename, self._image_download_counter)
+            filename = self._next_image_filename(initial_filename)
             img_url = self._convert_jsonp_url_to_image_url(jsonp_url, found=found)
-            self._save_image(img_url, filename)
-            downloaded_images.append(filename)
-            self._image_download_counter += 1
-        return downloaded_images
+            images.append((img_url, filename))
+        return images
 
-    def _html_image_extractor(self, initial_filename):
+    def _html_images(self, initial_filename):
         """
-        Extracts images that are directly embedded in the original
-        HTML page.
+        Lists (url, filename) pairs of the images embedded
+        in the HTML page.
         """
-        downloaded_images = []
+        images = []
         absimg = self._soup.find_all("img", {"class": "absimg"}, src=True)
         for img in absimg:
-            filename = "{}_{}.jpg".format(initial_filename, self._image_download_counter)
-            self._save_image(img["src"], filename)
-            downloaded_images.append(filename)
-            self._image_download_counter += 1
-        return downloaded_images
+            filename = self._next_image_filename(initial_filename)
+            images.append((img["src"], filename))
+        return images
+
+    def _next_image_filename(self, initial_filename):
+        """
+        Reserves the next page filename. Filenames are handed out
+        before any download starts so numbering stays in page order.
+        """
+        filename = "{}_{}.jpg".format(initial_filename, self._image_download_counter)
+        self._image_download_counter += 1
+        return filename
 
     def _convert_jsonp_url_to_image_url(self, jsonp_url, found):
         """
@@ -192,13 +255,15 @@ class ScribdImageDocument(ScribdDocument):
             replacement = jsonp_url
         return replacement
 
-    def _save_image(self, url, imagename):
+    async def _save_image(self, aio_session, url, imagename):
         """
         Skips downloading if the image is already downloaded,
-        otherwise downloads it locally.
+        otherwise downloads it locally. Returns whether it was
+        downloaded.
         """
         print("Downloading", imagename)
-        already_present = os.listdir(".")
-        if imagename in already_present:
-            return
-        internals.download_stream(url, imagename)
+        if os.path.exists(imagename):
+            return False
+        await aio_session.download_stream(url, imagename)
+        metrics.inc("scribdl_items_total", kind="page_image")
+        return True
@@ -1,6 +1,8 @@
 from .. import audiobook
 from ... import exceptions
 
+import asyncio
+
 import pytest
 
 
@@ -85,3 +87,36 @@ class TestTrack:
                        'part_number': 'preview',
                        'url': 'https://samples.findawayworld.com/19991/19991_sample.mp3'}
         assert scribd_audiobook.playlist.tracks[0]._track == raw_content
+
+
+def test_concurrent_playlist_download_order(tmpdir, monkeypatch):
+    monkeypatch.chdir(str(tmpdir))
+    tracks = [{"url": "https://example.com/{}.mp3".format(chapter),
+               "part_number": 1,
+               "chapter_number": chapter} for chapter in range(1, 6)]
+    playlist = audiobook.Playlist("Fake Audiobook", {"playlist": tracks}, jobs=3)
+
+    async def fake_download(self, aio_session, path):
+        with open(path, "wb") as f:
+            f.write(b"0" * self.chapter_number)
+
+    monkeypatch.setattr(audiobook.Track, "download_async", fake_download)
+    playlist.download()
+    assert playlist.download_paths == ["Fake_Audiobook_{}.mp3".format(chapter) for chapter in range(1, 6)]
+
+
+def test_async_playlist_download_order(tmpdir, monkeypatch):
+    monkeypatch.chdir(str(tmpdir))
+    tracks = [{"url": "https://example.com/{}.mp3".format(chapter),
+               "part_number": 1,
+               "chapter_number": chapter} for chapter in range(1, 6)]
+    playlist = audiobook.Playlist("Fake Audiobook", {"playlist": tracks}, jobs=3)
+
+    async def fake_download(self, aio_session, path):
+        await asyncio.sleep(0.001 * (6 - self.chapter_number))
+        with open(path, "wb") as f:
+            f.write(b"0" * self.chapter_number)
+
+    monkeypatch.setattr(audiobook.Track, "download_async", fake_download)
+    asyncio.run(playlist.download_async(aio_session=None))
+    assert playlist.download_paths == ["Fake_Audiobook_{}.mp3".format(chapter) for chapter in range(1, 6)]
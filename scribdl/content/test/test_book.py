@@ -1,5 +1,12 @@
 from .. import book
 
+import asyncio
+import json
+import os
+import re
+import zipfile
+from xml.etree import ElementTree
+
 import pytest
 
 
@@ -24,3 +31,190 @@ class TestScribdBook:
 
     def test_url(self, scribd_book):
         assert scribd_book.url == "https://www.scribd.com/read/189087235/Confessions-of-a-Casting-Director-Help-Actors-Land-Any-Role-with-Secrets-from-Inside-the-Audition-Room"
+
+
+class FakeResponse:
+    def __init__(self, status_code, text):
+        self.status_code = status_code
+        self.text = text
+
+
+def test_pipelined_download_keeps_chapter_order(tmpdir, monkeypatch):
+    monkeypatch.chdir(str(tmpdir))
+    monkeypatch.setattr(book.ScribdBook, "title", "Fake Book")
+    monkeypatch.setattr("builtins.print", lambda *args: None)
+    scribd_book = book.ScribdBook("https://www.scribd.com/read/123456789/Fake-Book", page="", jobs=4, window=4)
+    monkeypatch.setattr(scribd_book, "_get_token", lambda: "token")
+    monkeypatch.setattr(scribd_book, "_download_image", lambda url, path: None)
+
+    async def fetch_response(aio_session, chapter, token):
+        # Later chapters come back first to exercise the reorder buffer
+        await asyncio.sleep(0.01 * (5 - min(chapter, 5)))
+        if chapter > 3:
+            return FakeResponse(404, "<html>Not Found</html>")
+        block = {"type": "text", "words": [{"text": "chapter-{}".format(chapter)}]}
+        return FakeResponse(200, json.dumps({"blocks": [block]}))
+
+    monkeypatch.setattr(scribd_book, "fetch_response_async", fetch_response)
+    filename = scribd_book.download()
+    with open(filename) as f:
+        assert f.read() == ("<!-- chapter 1 -->\n\nchapter-1\n\n"
+                            "<!-- chapter 2 -->\n\nchapter-2\n\n"
+                            "<!-- chapter 3 -->\n\nchapter-3\n\n")
+
+
+def test_download_resumes_after_last_checkpoint(tmpdir, monkeypatch):
+    monkeypatch.chdir(str(tmpdir))
+    monkeypatch.setattr(book.ScribdBook, "title", "Fake Book")
+    monkeypatch.setattr("builtins.print", lambda *args: None)
+    with open("Fake_Book.md", "w") as f:
+        f.write("chapter-1\n\nhalf-written chapter-2")
+    with open("Fake_Book.md.manifest.json", "w") as f:
+        json.dump({"completed": 1, "offset": len("chapter-1\n\n")}, f)
+
+    scribd_book = book.ScribdBook("https://www.scribd.com/read/123456789/Fake-Book", page="")
+    monkeypatch.setattr(scribd_book, "_get_token", lambda: "token")
+    fetched = []
+
+    async def fetch_response(aio_session, chapter, token):
+        fetched.append(chapter)
+        if chapter > 2:
+            return FakeResponse(404, "<html>Not Found</html>")
+        block = {"type": "text", "words": [{"text": "chapter-{}".format(chapter)}]}
+        return FakeResponse(200, json.dumps({"blocks": [block]}))
+
+    monkeypatch.setattr(scribd_book, "fetch_response_async", fetch_response)
+    scribd_book.download()
+    assert fetched == [2, 3]
+    with open("Fake_Book.md") as f:
+        assert f.read() == "chapter-1\n\n<!-- chapter 2 -->\n\nchapter-2\n\n"
+    assert not os.path.exists("Fake_Book.md.manifest.json")
+
+
+def test_download_epub(tmpdir, monkeypatch):
+    monkeypatch.chdir(str(tmpdir))
+    monkeypatch.setattr(book.ScribdBook, "title", "Fake & Book")
+    monkeypatch.setattr("builtins.print", lambda *args: None)
+    scribd_book = book.ScribdBook("https://www.scribd.com/read/123456789/Fake-Book", page="", jobs=2)
+    monkeypatch.setattr(scribd_book, "_get_token", lambda: "token")
+
+    def download_image(url, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(b"jpeg")
+
+    async def fetch_response(aio_session, chapter, token):
+        if chapter > 2:
+            return FakeResponse(404, "<html>Not Found</html>")
+        blocks = [{"type": "text", "words": [{"text": "a < b"}, {"text": "chapter-{}".format(chapter)}]},
+                  {"type": "image", "src": "images/{}.jpg".format(chapter)}]
+        return FakeResponse(200, json.dumps({"blocks": blocks}))
+
+    monkeypatch.setattr(scribd_book, "_download_image", download_image)
+    monkeypatch.setattr(scribd_book, "fetch_response_async", fetch_response)
+    filename = scribd_book.download_epub()
+    assert filename == "Fake_&_Book.epub"
+    with zipfile.ZipFile(filename) as epub:
+        assert epub.namelist()[0] == "mimetype"
+        assert epub.read("mimetype") == b"application/epub+zip"
+        chapter = epub.read("OEBPS/chapter_2.xhtml").decode()
+        assert "<p>a &lt; b chapter-2</p>" in chapter
+        assert '<img src="images/2.jpg" alt="2.jpg"/>' in chapter
+        assert epub.read("OEBPS/images/1.jpg") == b"jpeg"
+        package = epub.read("OEBPS/content.opf").decode()
+        assert "<dc:title>Fake &amp; Book</dc:title>" in package
+        assert '<itemref idref="chapter-1"/>' in package and '<itemref idref="chapter-2"/>' in package
+        _check_epub_structure(epub)
+
+
+def _check_epub_structure(epub):
+    """
+    Checks what epubcheck would: well-formed documents, the metadata
+    EPUB 3 requires, and a manifest, spine and table of contents that
+    only point at files in the archive.
+    """
+    opf = "{http://www.idpf.org/2007/opf}"
+    xhtml = "{http://www.w3.org/1999/xhtml}"
+    names = set(epub.namelist())
+    for name in names:
+        if name.endswith((".xhtml", ".opf", ".xml")):
+            ElementTree.fromstring(epub.read(name))
+
+    package = ElementTree.fromstring(epub.read("OEBPS/content.opf"))
+    metadata = package.find(opf + "metadata")
+    for element in ("identifier", "title", "language"):
+        assert metadata.find("{http://purl.org/dc/elements/1.1/}" + element).text
+    modified = metadata.find(opf + "meta[@property='dcterms:modified']")
+    assert re.match(r"^\d{4}-\d\d-\d\dT\d\d:\d\d:\d\dZ$", modified.text)
+
+    items = {item.get("id"): item for item in package.find(opf + "manifest")}
+    assert all("OEBPS/" + item.get("href") in names for item in items.values())
+    assert [item.get("id") for item in items.values() if item.get("properties") == "nav"] == ["nav"]
+    spine = [itemref.get("idref") for itemref in package.find(opf + "spine")]
+    assert spine and all(idref in items for idref in spine)
+
+    navigation = ElementTree.fromstring(epub.read("OEBPS/nav.xhtml"))
+    links = [link.get("href") for link in navigation.iter(xhtml + "a")]
+    assert links == [items[idref].get("href") for idref in spine]
+
+
+class FakeAsyncSession:
+    def __init__(self, fetch_response):
+        self.fetch_response = fetch_response
+
+    async def cached_get(self, url, resource):
+        chapter = int(url.split("/chapters/")[1].split("/")[0])
+        # Later chapters come back first to exercise the reorder buffer
+        await asyncio.sleep(0.001 * (5 - min(chapter, 5)))
+        return self.fetch_response(chapter)
+
+    async def download_stream(self, url, path):
+        with open(path, "wb") as f:
+            f.write(b"jpeg")
+
+
+def test_async_download_keeps_chapter_order(tmpdir, monkeypatch):
+    monkeypatch.chdir(str(tmpdir))
+    monkeypatch.setattr(book.ScribdBook, "title", "Fake Book")
+    monkeypatch.setattr("builtins.print", lambda *args: None)
+    scribd_book = book.ScribdBook("https://www.scribd.com/read/123456789/Fake-Book", page="", jobs=4)
+
+    async def get_token(aio_session):
+        return "token"
+
+    def fetch_response(chapter):
+        if chapter > 3:
+            return FakeResponse(404, "<html>Not Found</html>")
+        blocks = [{"type": "text", "words": [{"text": "chapter-{}".format(chapter)}]},
+                  {"type": "image", "src": "images/{}.jpg".format(chapter)}]
+        return FakeResponse(200, json.dumps({"blocks": blocks}))
+
+    monkeypatch.setattr(scribd_book, "_get_token_async", get_token)
+    filename = asyncio.run(scribd_book.download_async(FakeAsyncSession(fetch_response)))
+    with open(filename) as f:
+        assert f.read() == "".join("<!-- chapter {0} -->\n\nchapter-{0}\n\n"
+                                   "![{0}.jpg](Fake_Book/{0}.jpg)\n\n".format(chapter)
+                                   for chapter in range(1, 4))
+    assert os.path.exists("Fake_Book/3.jpg")
+    assert not os.path.exists("Fake_Book.md.manifest.json")
+
+
+def test_server_error_doesnt_end_book(tmpdir, monkeypatch):
+    monkeypatch.chdir(str(tmpdir))
+    monkeypatch.setattr(book.ScribdBook, "title", "Fake Book")
+    monkeypatch.setattr("builtins.print", lambda *args: None)
+    scribd_book = book.ScribdBook("https://www.scribd.com/read/123456789/Fake-Book", page="")
+    monkeypatch.setattr(scribd_book, "_get_token", lambda: "token")
+
+    async def fetch_response(aio_session, chapter, token):
+        if chapter == 2:
+            return FakeResponse(503, "<html>Service Unavailable</html>")
+        block = {"type": "text", "words": [{"text": "chapter-{}".format(chapter)}]}
+        return FakeResponse(200, json.dumps({"blocks": [block]}))
+
+    monkeypatch.setattr(scribd_book, "fetch_response_async", fetch_response)
+    with pytest.raises(book.exceptions.ScribdFetchError):
+        scribd_book.download()
+    # Left to resume from chapter 2
+    with open("Fake_Book.md.manifest.json") as f:
+        assert json.load(f)["completed"] == 1
@@ -1,4 +1,8 @@
 from .. import document
+from ... import aio
+
+import asyncio
+import threading
 
 import pytest 
 
@@ -41,3 +45,50 @@ class TestScribdImageDocument:
 
     def test_jsonp_urls(self, scribd_image_document):
         assert len(scribd_image_document.jsonp_urls) == 182
+
+
+def test_concurrent_image_numbering(monkeypatch):
+    image_document = document.ScribdImageDocument(
+        "https://scribd.com/doc/17142797/Case-in-Point", page="<html></html>", jobs=4)
+    image_document._jsonp_urls = ["https://html.scribdassets.com/pages/{}.jsonp".format(page)
+                                  for page in range(1, 11)]
+    saved = {}
+
+    async def save_image(aio_session, url, name):
+        saved[name] = url
+        return True
+
+    monkeypatch.setattr(image_document, "_save_image", save_image)
+    images = image_document.download("Case_in_Point")
+    assert images == ["Case_in_Point_{}.jpg".format(page) for page in range(1, 11)]
+    assert saved["Case_in_Point_10.jpg"] == "https://html.scribdassets.com/images/10.jpg"
+    assert image_document._image_download_counter == 11
+
+
+def test_async_image_download_order(monkeypatch):
+    image_document = document.ScribdImageDocument(
+        "https://scribd.com/doc/17142797/Case-in-Point", page="<html></html>", jobs=4)
+    image_document._jsonp_urls = ["https://html.scribdassets.com/pages/{}.jsonp".format(page)
+                                  for page in range(1, 6)]
+
+    async def save_image(aio_session, url, name):
+        # Later pages finish first
+        await asyncio.sleep(0.001 * (6 - int(name.split("_")[-1].split(".")[0])))
+        return True
+
+    monkeypatch.setattr(image_document, "_save_image", save_image)
+    pages = []
+    threads = set()
+
+    def on_page(filename):
+        pages.append(filename)
+        threads.add(threading.current_thread())
+
+    async def download():
+        async with aio.AsyncSession() as aio_session:
+            return await image_document.download_async(aio_session, "Case_in_Point", on_page=on_page)
+
+    images = asyncio.run(download())
+    assert images == pages == ["Case_in_Point_{}.jpg".format(page) for page in range(1, 6)]
+    # Off the event loop, which ran on this thread
+    assert threading.current_thread() not in threads
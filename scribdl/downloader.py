@@ -1,5 +1,4 @@
-from bs4 import BeautifulSoup
-import requests
+import contextlib
 
 from .content.document import ScribdTextualDocument
 from .content.document import ScribdImageDocument
@@ -7,6 +6,14 @@ from .content.book import ScribdBook
 from .content.audiobook import ScribdAudioBook
 
 from .pdf_converter import ConvertToPDF
+from .pdf_converter import StreamingPDFWriter
+from .images import ImageStage
+from . import aio
+from . import internals
+from . import classify
+from . import metrics
+from . import profiling
+from .session import get_session
 
 
 class Downloader:
@@ -17,89 +24,241 @@ class Downloader:
     ----------
     url : `str`
         A string containing path to a Scribd URL
+    session : `ScribdSession`
+        Session shared by every network request made while
+        downloading. Defaults to the process-wide shared session.
+    jobs : `int`
+        Maximum number of concurrent downloads per document.
+    segments : `int`
+        Number of parallel byte ranges used for large audio files.
+    quiet : `bool`
+        Don't echo extracted text to the console.
+    dedupe : `bool`
+        Store identical pages of image documents only once.
+    max_dpi : `int`
+        Downscale pages of image documents to this resolution.
+        Implies `dedupe`.
+    jpeg_quality : `int`
+        Recompress pages of image documents as JPEGs of this quality.
+        Implies `dedupe`.
+    profile : `str`
+        Write a Chrome trace of every request, parse, write and
+        conversion step of the download to this path.
+    profile_stats : `str`
+        Also write a cProfile dump to this path. Needs `profile`.
+
+    The content type is told from the URL where possible. Otherwise
+    the page is fetched once, classified from its <body> tag and handed
+    on to the content class doing the download.
+
+    Downloads run on an asyncio event loop; `download` runs
+    `download_async` on the one the session keeps.
     """
 
-    def __init__(self, url):
+    def __init__(self, url, session=None, jobs=1, segments=1, quiet=False,
+                 dedupe=False, max_dpi=None, jpeg_quality=None, profile=None, profile_stats=None):
         self.url = url
-        is_audiobook = self.is_audiobook()
-        if is_audiobook:
-            is_book = False
-        else:
-            is_book = self.is_book()
+        self.session = get_session(session)
+        self.jobs = jobs
+        self.segments = segments
+        self.quiet = quiet
+        self.dedupe = dedupe or bool(max_dpi or jpeg_quality)
+        self.max_dpi = max_dpi
+        self.jpeg_quality = jpeg_quality
+        self.profile = profile
+        self.profile_stats = profile_stats
+        self._page = None
+        # Only the URL is looked at here; an ambiguous URL is told apart
+        # from its page when the content type is first needed.
+        self._content_type = classify.classify_url(url)
 
-        self._is_audiobook = is_audiobook
-        self._is_book = is_book
-
-    def download(self, is_image_document=None):
+    def download(self, is_image_document=None, pdf=False, epub=False):
         """
         Downloads books and documents from Scribd.
         Returns an object of `ConvertToPDF` class.
+
+        With `epub`, books are written straight to an EPUB instead
+        and its path is returned.
+
+        Whether a document is made up of images is detected
+        automatically unless `is_image_document` is passed.
+
+        With `pdf`, the content is also converted to PDF. Pages of image
+        documents are written into the PDF while the rest are still
+        downloading.
+
+        Runs `download_async` on the session's event loop.
         """
-        if self._is_audiobook:
-            content = self._download_audiobook()
-            return content
+        return aio.block_on(lambda aio_session: self.download_async(is_image_document, pdf, epub, aio_session),
+                            session=self.session)
 
-        if self._is_book:
-            content = self._download_book()
-        else:
-            if is_image_document is None:
-                raise TypeError(
-                    "The input URL points to a document. You must specify "
-                    "whether it is an image document or a textual document "
-                    "in the `image_document` parameter."
-                )
-            content = self._download_document(is_image_document)
-        return content
+    def _profiler(self):
+        if self.profile:
+            return profiling.Profiler(self.profile, self.profile_stats)
+        return contextlib.nullcontext()
 
-    def _download_book(self):
+    async def download_async(self, is_image_document=None, pdf=False, epub=False, aio_session=None):
         """
-        Downloads books off Scribd.
-        Returns an object of `ConvertToPDF` class.
+        The asyncio counterpart of `download`. Pass the same `AsyncSession`
+        to many downloads to run them all on one event loop; otherwise one
+        is opened around `session` for this download.
+
+        Scraping audiobook metadata, detecting image documents, textual
+        documents and the PDF conversion are blocking and run in the
+        session's thread pool.
         """
-        book = ScribdBook(self.url)
-        md_path = book.download()
-        pdf_path = "{}.pdf".format(book.sanitized_title)
-        return ConvertToPDF(md_path, pdf_path)
+        if aio_session is None:
+            async with aio.AsyncSession(self.session) as aio_session:
+                return await self.download_async(is_image_document, pdf, epub, aio_session)
+
+        with self._profiler():
+            # Every content type is scraped from the page, so it is
+            # fetched here rather than blocking the loop once needed
+            await self._load_page_async(aio_session)
+
+            with metrics.timer("scribdl_job_seconds", content_type=self.content_type):
+                return await self._download(is_image_document, pdf, epub, aio_session)
+
+    async def _download(self, is_image_document, pdf, epub, aio_session):
+        if self.is_audiobook():
+            audiobook = self._audiobook()
+            playlist = await aio_session.run(self._playlist, audiobook)
+            await playlist.download_async(aio_session)
+            return playlist.download_paths
+
+        if self.is_book():
+            book = self._book()
+            if epub:
+                return await book.download_epub_async(aio_session)
+            md_path = await book.download_async(aio_session)
+            content = ConvertToPDF(md_path, "{}.pdf".format(book.sanitized_title), jobs=self.jobs)
+        else:
+            if is_image_document is None:
+                is_image_document = await aio_session.run(self._detect_image_document)
+            if is_image_document:
+                if not self.dedupe:
+                    return await self._download_image_document(aio_session, None, pdf)
+                with self._image_stage() as image_stage:
+                    content = await self._download_image_document(aio_session, image_stage, pdf)
+                self._report_duplicates(image_stage)
+                if pdf:
+                    return content
+            else:
+                document = self._textual_document()
+                content_path = await aio_session.run(document.download)
+                content = ConvertToPDF(content_path, "{}.pdf".format(document.sanitized_title))
+
+        if pdf:
+            print("\nConverting to {}..".format(content.pdf_path))
+            await aio_session.run(content.to_pdf)
+        return content
 
-    def _download_document(self, image_document):
+    async def _download_image_document(self, aio_session, image_stage, pdf):
         """
-        Downloads textual and image documents off Scribd.
+        Downloads image documents off Scribd, passing every page
+        through `image_stage` if given.
         Returns an object of `ConvertToPDF` class.
         """
-        if image_document:
-            document = ScribdImageDocument(self.url)
-        else:
-            document = ScribdTextualDocument(self.url)
-
-        content_path = document.download()
+        document = self._image_document(image_stage)
         pdf_path = "{}.pdf".format(document.sanitized_title)
+        if pdf:
+            print("Converting to {} while downloading..".format(pdf_path))
+            with StreamingPDFWriter(pdf_path) as writer:
+                content_path = await document.download_async(aio_session, on_page=writer.add_image)
+        else:
+            content_path = await document.download_async(aio_session)
         return ConvertToPDF(content_path, pdf_path)
 
-    def _download_audiobook(self):
+    def _playlist(self, audiobook):
         """
-        Downloads audiobooks off Scribd.
-        Returns a list containing local audio filepaths.
+        Scrapes the playlist of an audiobook, warning when only
+        the preview is available.
         """
-        audiobook = ScribdAudioBook(self.url)
         playlist = audiobook.playlist
         if not audiobook.premium_cookies:
             print("Premium cookies not detected. Only the preview version of audiobook will be downloaded.")
-        playlist.download()
-        return playlist.download_paths
+        return playlist
+
+    def _book(self):
+        return ScribdBook(self.url,
+                          session=self.session,
+                          page=self._page,
+                          jobs=self.jobs,
+                          quiet=self.quiet)
+
+    def _textual_document(self):
+        return ScribdTextualDocument(self.url,
+                                     session=self.session,
+                                     page=self._page,
+                                     quiet=self.quiet)
+
+    def _image_document(self, image_stage):
+        return ScribdImageDocument(self.url,
+                                   session=self.session,
+                                   page=self._page,
+                                   jobs=self.jobs,
+                                   image_stage=image_stage)
+
+    def _audiobook(self):
+        return ScribdAudioBook(self.url,
+                               session=self.session,
+                               page=self._page,
+                               jobs=self.jobs,
+                               segments=self.segments)
+
+    def _image_stage(self):
+        return ImageStage(max_dpi=self.max_dpi,
+                          quality=self.jpeg_quality,
+                          jobs=self.jobs)
+
+    def _report_duplicates(self, image_stage):
+        if image_stage.duplicates:
+            print("Stored {} duplicate pages once".format(image_stage.duplicates))
+
+    def _detect_image_document(self):
+        """
+        Tells whether the document is made up of images.
+        """
+        is_image_document = classify.is_image_document(self.page, session=self.session)
+        print("Detected {} document".format("an image" if is_image_document else "a textual"))
+        return is_image_document
 
     def is_book(self):
         """
         Checks whether the passed URL points to a Scribd book
         or a Scribd document.
         """
-        response = requests.get(self.url)
-        soup = BeautifulSoup(response.text, "html.parser")
-        content_class = soup.find("body")["class"]
-        matches_with_book = content_class[0] == "autogen_class_views_layouts_book_web"
-        return matches_with_book
+        return self.content_type == classify.BOOK
 
     def is_audiobook(self):
         """
         Checks whether the passed URL points to a Scribd audiobook.
         """
-        return "/audiobook/" in self.url
+        return self.content_type == classify.AUDIOBOOK
+
+    @property
+    def content_type(self):
+        """
+        Type of the content at the URL, told from the page if
+        the URL doesn't give it away.
+        """
+        if self._content_type is None:
+            self._content_type = classify.classify_page(self.page)
+        return self._content_type
+
+    @property
+    def page(self):
+        """
+        HTML of the page at the URL, fetched on first use.
+        """
+        if self._page is None:
+            self._page = internals.fetch_page(self.url, session=self.session)
+        return self._page
+
+    async def _load_page_async(self, aio_session):
+        """
+        Fetches the page on the event loop, unless already fetched.
+        """
+        if self._page is None:
+            response = await aio_session.cached_get(self.url, "page")
+            self._page = response.text
@@ -0,0 +1,160 @@
+import mimetypes
+import os
+import time
+import zipfile
+from xml.sax.saxutils import escape
+from xml.sax.saxutils import quoteattr
+
+CONTAINER_XML = """<?xml version="1.0" encoding="UTF-8"?>
+<container version="1.0" xmlns="urn:oasis:names:tc:opendocument:xmlns:container">
+  <rootfiles>
+    <rootfile full-path="OEBPS/content.opf" media-type="application/oebps-package+xml"/>
+  </rootfiles>
+</container>
+"""
+
+XHTML_HEADER = """<?xml version="1.0" encoding="UTF-8"?>
+<!DOCTYPE html>
+<html xmlns="http://www.w3.org/1999/xhtml" xmlns:epub="http://www.idpf.org/2007/ops">
+<head><title>{title}</title></head>
+<body>
+"""
+XHTML_FOOTER = "</body>\n</html>\n"
+
+CONTENT_OPF = """<?xml version="1.0" encoding="UTF-8"?>
+<package xmlns="http://www.idpf.org/2007/opf" version="3.0" unique-identifier="book-id">
+  <metadata xmlns:dc="http://purl.org/dc/elements/1.1/">
+    <dc:identifier id="book-id">{identifier}</dc:identifier>
+    <dc:title>{title}</dc:title>
+    <dc:language>{language}</dc:language>
+    <meta property="dcterms:modified">{modified}</meta>
+  </metadata>
+  <manifest>
+    <item id="nav" href="nav.xhtml" media-type="application/xhtml+xml" properties="nav"/>
+{items}
+  </manifest>
+  <spine>
+{itemrefs}
+  </spine>
+</package>
+"""
+
+
+def chapter_title(chapter):
+    return "Chapter {}".format(chapter)
+
+
+class EpubSink:
+    """
+    Writes a book as an EPUB 3. Chapters are streamed into their own
+    XHTML file inside the zip as they are written; images are added
+    straight from the files they were downloaded to once the book is
+    closed, so they are never held in memory.
+
+    Exposes the same interface as `MarkdownBookSink`, so `ScribdBook`
+    can write to either.
+
+    Parameters
+    ----------
+    filename : `str`
+        Path of the EPUB to create.
+    title : `str`
+        Title of the book.
+    identifier : `str`
+        Unique identifier of the book.
+    language : `str`
+        Language code of the book.
+    """
+
+    def __init__(self, filename, title, identifier, language="en"):
+        self.filename = filename
+        self.title = title
+        self.identifier = identifier
+        self.language = language
+        self._chapters = []
+        self._images = {}
+        self._chapter_file = None
+        self._zip = zipfile.ZipFile(filename, "w", zipfile.ZIP_DEFLATED)
+        # The mimetype must come first and be stored uncompressed
+        self._zip.writestr(zipfile.ZipInfo("mimetype"), "application/epub+zip", zipfile.ZIP_STORED)
+        self._zip.writestr("META-INF/container.xml", CONTAINER_XML)
+
+    def start_chapter(self, chapter):
+        """
+        Ends the chapter being written and starts a new one.
+        """
+        self._end_chapter()
+        name = "chapter_{}.xhtml".format(chapter)
+        self._chapters.append((chapter, name))
+        self._chapter_file = self._zip.open("OEBPS/" + name, "w")
+        self.write(XHTML_HEADER.format(title=escape(chapter_title(chapter))))
+
+    def write(self, text):
+        self._chapter_file.write(text.encode("utf-8"))
+
+    def escape(self, text):
+        return escape(text)
+
+    def paragraph(self, parts):
+        return "<p>{}</p>\n".format(" ".join(parts))
+
+    def image(self, name, path):
+        """
+        Registers a downloaded image and returns the markup showing it.
+        """
+        href = "images/" + name
+        self._images[href] = path
+        return "<img src={} alt={}/>\n".format(quoteattr(href), quoteattr(name))
+
+    def close(self):
+        """
+        Adds the images, table of contents and package document,
+        and finishes the EPUB.
+        """
+        self._end_chapter()
+        for href, path in self._images.items():
+            self._zip.write(path, "OEBPS/" + href)
+        self._zip.writestr("OEBPS/nav.xhtml", self._navigation())
+        self._zip.writestr("OEBPS/content.opf", self._package())
+        self._zip.close()
+
+    def abort(self):
+        """
+        Closes and removes an unfinished EPUB.
+        """
+        if self._chapter_file is not None:
+            self._chapter_file.close()
+            self._chapter_file = None
+        self._zip.close()
+        os.remove(self.filename)
+
+    def _end_chapter(self):
+        if self._chapter_file is not None:
+            self.write(XHTML_FOOTER)
+            self._chapter_file.close()
+            self._chapter_file = None
+
+    def _navigation(self):
+        entries = "\n".join('<li><a href="{}">{}</a></li>'.format(name, escape(chapter_title(chapter)))
+                            for chapter, name in self._chapters)
+        return (XHTML_HEADER.format(title=escape(self.title))
+                + '<nav epub:type="toc">\n<ol>\n{}\n</ol>\n</nav>\n'.format(entries)
+                + XHTML_FOOTER)
+
+    def _package(self):
+        items = []
+        itemrefs = []
+        for chapter, name in self._chapters:
+            items.append('    <item id="chapter-{}" href="{}" media-type="application/xhtml+xml"/>'.format(
+                chapter, name))
+            itemrefs.append('    <itemref idref="chapter-{}"/>'.format(chapter))
+        for index, href in enumerate(self._images):
+            media_type = mimetypes.guess_type(href)[0] or "image/jpeg"
+            items.append('    <item id="image-{}" href={} media-type="{}"/>'.format(
+                index, quoteattr(href), media_type))
+        return CONTENT_OPF.format(identifier=escape(self.identifier),
+                                  title=escape(self.title),
+                                  language=self.language,
+                                  modified=time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                                  items="\n".join(items),
+                                  itemrefs="\n".join(itemrefs))
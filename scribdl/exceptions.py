@@ -10,3 +10,10 @@ class ScribdFetchError(Exception):
 
     def __init__(self, message):
         super().__init__(message)
+
+
+class ScribdTransientError(ScribdFetchError):
+    """
+    A fetch which failed in a way that may well succeed
+    if tried again, such as a download cut short.
+    """
@@ -0,0 +1,117 @@
+import hashlib
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+# img2pdf's default when an image doesn't record its resolution
+DEFAULT_DPI = 96
+HASH_CHUNK_SIZE = 64 * 1024
+
+
+def file_digest(path):
+    """
+    Returns the SHA-256 hex digest of a file's contents.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as in_file:
+        while True:
+            chunk = in_file.read(HASH_CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def optimize_image(path, max_dpi=None, quality=None):
+    """
+    Downscales an image to at most `max_dpi`, keeping its printed
+    size, and/or recompresses it as a JPEG of the given `quality`.
+    The original is kept when recompressing doesn't make it smaller.
+    Returns the digest of the resulting file.
+    """
+    if max_dpi or quality:
+        from PIL import Image
+
+        optimized = None
+        with Image.open(path) as image:
+            dpi = image.info.get("dpi", (DEFAULT_DPI,))[0] or DEFAULT_DPI
+            downscaled = bool(max_dpi) and dpi > max_dpi
+            if downscaled or quality:
+                image.load()
+                if downscaled:
+                    scale = max_dpi / float(dpi)
+                    size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+                    image = image.resize(size, Image.LANCZOS)
+                    dpi = max_dpi
+                if image.mode not in ("L", "RGB"):
+                    image = image.convert("RGB")
+                optimized = path + ".tmp"
+                image.save(optimized, "JPEG", quality=quality or 85, optimize=True, dpi=(dpi, dpi))
+
+        if optimized and (downscaled or os.path.getsize(optimized) < os.path.getsize(path)):
+            os.replace(optimized, path)
+        elif optimized:
+            os.remove(optimized)
+    return file_digest(path)
+
+
+class ImageStage:
+    """
+    Post-processes downloaded page images in a process pool. Pages are
+    optionally downscaled and recompressed, then hashed; a page identical
+    to one already seen is replaced with a hard link to it, so blank
+    pages and repeated covers are only stored once.
+
+    Parameters
+    ----------
+    max_dpi : `int`
+        Downscale pages with a higher resolution to this one.
+    quality : `int`
+        Recompress pages as JPEGs of this quality (1-95).
+    jobs : `int`
+        Number of worker processes.
+    """
+
+    def __init__(self, max_dpi=None, quality=None, jobs=1):
+        self.max_dpi = max_dpi
+        self.quality = quality
+        self.jobs = jobs
+        self.duplicates = 0
+        self._seen = {}
+        self._lock = threading.Lock()
+        self._executor = ProcessPoolExecutor(max_workers=max(jobs, 1))
+
+    def process(self, path):
+        """
+        Optimizes and deduplicates a downloaded image. Safe to call from
+        many threads at once. Returns the digest of the image.
+        """
+        digest = self._executor.submit(optimize_image, path, self.max_dpi, self.quality).result()
+        with self._lock:
+            original = self._seen.setdefault(digest, path)
+            if original == path:
+                return digest
+            self.duplicates += 1
+        self._link(original, path)
+        return digest
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _link(self, original, path):
+        """
+        Replaces `path` with a hard link to `original`. Left as a copy
+        where the filesystem doesn't support links.
+        """
+        link = path + ".link"
+        try:
+            os.link(original, link)
+        except OSError:
+            return
+        os.replace(link, path)
@@ -1,9 +1,23 @@
-import requests
+import os
+import re
 import sys
 import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from . import exceptions
+from . import metrics
+from . import resume
+from .session import get_session
 
 GITHUB_URL_BASE = "https://github.com/ritiek/scribd-downloader"
 
+# Files smaller than this aren't worth splitting into byte ranges
+SEGMENT_MIN_SIZE = 8 * 1024 * 1024
+CHUNK_SIZE = 64 * 1024
+# Checkpoint segmented downloads roughly every megabyte per range
+CHECKPOINT_CHUNKS = 16
+
 
 def fix_encoding(query):
     """
@@ -31,10 +45,190 @@ def sanitize_title(title):
     return title
 
 
-def download_stream(url, filepath):
+def fetch_page(url, session=None):
+    """
+    Fetches the HTML of a Scribd page.
+    """
+    session = get_session(session)
+    return session.cached_get(url, "page").text
+
+
+def download_stream(url, filepath, session=None, segments=1):
     """
     Stream stuff from the Internet to a local file.
+
+    Content goes to a ".part" file that is moved to `filepath` once
+    complete, so `filepath` only ever exists fully downloaded. A ".part"
+    file left behind by an interrupted run is resumed with Range requests.
+    With `segments` greater than 1, large files served with byte-range
+    support are fetched as that many parallel ranges instead.
+
+    A download cut short is resumed from where it got to, as retried
+    by the session's retry policy.
+    """
+    session = get_session(session)
+    partial = resume.part_path(filepath)
+    manifest = resume.Manifest(resume.manifest_path(partial))
+
+    with metrics.timer("scribdl_download_seconds", endpoint=metrics.endpoint(url)):
+        size = manifest.get("size")
+        if size is not None and os.path.exists(partial):
+            segments = manifest.get("segments", segments)
+        elif segments > 1:
+            size = probe_content_length(url, session=session)
+        else:
+            size = None
+
+        if size is not None and size >= SEGMENT_MIN_SIZE:
+            _download_segments(url, partial, size, segments, session, manifest)
+        else:
+            manifest.remove()
+            session.retry_policy.call(lambda: _download_single(url, partial, session), url)
+        os.replace(partial, filepath)
+
+
+def probe_content_length(url, session=None):
+    """
+    Returns the size of the resource if the server accepts byte-range
+    requests for it, otherwise `None`.
+    """
+    session = get_session(session)
+    # A one-byte range request works even on servers that reject HEAD
+    headers = {"Range": "bytes=0-0"}
+    with session.get(url, headers=headers, stream=True) as response:
+        if response.status_code != 206:
+            return None
+        content_range = response.headers.get("Content-Range", "")
+    match = re.match(r"bytes 0-0/(\d+)$", content_range)
+    if not match:
+        return None
+    return int(match.group(1))
+
+
+def _download_single(url, partial, session):
+    """
+    Streams the resource into `partial`, continuing after whatever
+    an earlier attempt already wrote there.
+    """
+    offset = os.path.getsize(partial) if os.path.exists(partial) else 0
+    headers = {"Range": "bytes={}-".format(offset)} if offset else {}
+    with session.get(url, headers=headers, stream=True) as response:
+        if offset and response.status_code == 416:
+            # The earlier attempt got everything but the rename
+            return
+        if response.status_code >= 400:
+            raise exceptions.ScribdFetchError(
+                "Download of {} failed with status {}".format(url, response.status_code))
+        mode = "ab" if response.status_code == 206 else "wb"
+        with open(partial, mode) as out_file:
+            shutil.copyfileobj(response.raw, out_file)
+            written = out_file.tell() - (offset if mode == "ab" else 0)
+    metrics.inc("scribdl_download_bytes_total", written, endpoint=metrics.endpoint(url))
+
+
+def _download_segments(url, partial, size, segments, session, manifest):
+    """
+    Downloads `size` bytes as `segments` parallel byte ranges written
+    straight into their offsets of a preallocated file. Progress of
+    every range is checkpointed in `manifest`.
+    """
+    segment_size = -(-size // segments)
+    ranges = [(start, min(start + segment_size, size) - 1)
+              for start in range(0, size, segment_size)]
+
+    fresh = (manifest.get("size") != size
+             or manifest.get("segments") != segments
+             or not os.path.exists(partial))
+    if fresh:
+        with open(partial, "wb") as out_file:
+            out_file.truncate(size)
+        manifest.update(size=size, segments=segments, progress={})
+    progress = manifest.get("progress", {})
+
+    with open(partial, "r+b") as out_file:
+        writer = _OffsetWriter(out_file, manifest, progress)
+        map_concurrently(lambda byte_range: session.retry_policy.call(
+                             lambda: _download_range(url, byte_range, writer, session), url),
+                         ranges,
+                         jobs=len(ranges))
+    manifest.remove()
+
+
+def _download_range(url, byte_range, writer, session):
+    """
+    Fetches a single byte range, starting from its last checkpoint,
+    and writes it at its offset.
+    """
+    start, end = byte_range
+    offset = writer.resume_offset(start)
+    if offset > end:
+        return
+    headers = {"Range": "bytes={}-{}".format(offset, end)}
+    first_offset = offset
+    with session.get(url, headers=headers, stream=True) as response:
+        if response.status_code != 206:
+            raise exceptions.ScribdFetchError(
+                "Range request for {} failed with status {}".format(url, response.status_code))
+        for chunk_number, chunk in enumerate(response.iter_content(CHUNK_SIZE), 1):
+            writer.write_at(chunk, offset)
+            offset += len(chunk)
+            if chunk_number % CHECKPOINT_CHUNKS == 0:
+                writer.checkpoint(start, offset)
+    writer.checkpoint(start, offset)
+    metrics.inc("scribdl_download_bytes_total", offset - first_offset, endpoint=metrics.endpoint(url))
+    if offset != end + 1:
+        raise exceptions.ScribdTransientError(
+            "Range {}-{} of {} ended early at byte {}".format(start, end, url, offset))
+
+
+class _OffsetWriter:
+    """
+    Writes chunks at absolute offsets of an open file from many threads
+    and records how far every range has got. Uses `os.pwrite` where
+    available, otherwise a lock around seek+write.
+    """
+
+    def __init__(self, out_file, manifest, progress):
+        self._file = out_file
+        self._manifest = manifest
+        self._progress = progress
+        self._lock = threading.Lock()
+
+    def resume_offset(self, start):
+        return self._progress.get(str(start), start)
+
+    def checkpoint(self, start, offset):
+        with self._lock:
+            self._progress[str(start)] = offset
+            self._manifest.update(progress=self._progress)
+
+    def write_at(self, data, offset):
+        if hasattr(os, "pwrite"):
+            os.pwrite(self._file.fileno(), data, offset)
+        else:
+            with self._lock:
+                self._file.seek(offset)
+                self._file.write(data)
+
+
+def map_concurrently(function, items, jobs=1):
+    """
+    Calls `function` on every item using up to `jobs` threads.
+    Results are returned in the same order as the items.
+    """
+    return list(imap_concurrently(function, items, jobs=jobs))
+
+
+def imap_concurrently(function, items, jobs=1):
+    """
+    Like `map_concurrently`, but yields every result as soon as it
+    and all the results before it are available.
     """
-    response = requests.get(url, stream=True)
-    with open(filepath, "wb") as out_file:
-        shutil.copyfileobj(response.raw, out_file)
+    items = list(items)
+    if jobs <= 1 or len(items) <= 1:
+        for item in items:
+            yield function(item)
+        return
+    with ThreadPoolExecutor(max_workers=min(jobs, len(items))) as executor:
+        for result in executor.map(function, items):
+            yield result
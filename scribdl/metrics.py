@@ -0,0 +1,188 @@
+import contextlib
+import json
+import math
+import re
+import threading
+import time
+
+from . import profiling
+
+# Upper bounds in seconds, wide enough for both a cached page and a PDF conversion
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, math.inf)
+
+# Checked in order, the first match names the endpoint of a URL
+ENDPOINTS = (
+    ("login", re.compile(r"scribd\.com/login")),
+    ("csrf_token", re.compile(r"scribd\.com/csrf_token")),
+    ("access_token", re.compile(r"/read2/\d+/access_token")),
+    ("chapter", re.compile(r"/scepub/\d+/chapters/\d+/contents\.json")),
+    ("chapter_image", re.compile(r"/scepub/\d+/chapters/\d+/")),
+    ("jsonp", re.compile(r"\.jsonp(\?|$)")),
+    ("page_image", re.compile(r"scribdassets\.com/")),
+    ("playlist", re.compile(r"findawayworld\.com/v4/audiobooks/\d+/playlists")),
+    ("license", re.compile(r"findawayworld\.com/v4/accounts/")),
+    ("track", re.compile(r"findawayworld\.com/")),
+    ("page", re.compile(r"scribd\.com/")),
+)
+
+
+def endpoint(url):
+    """
+    Names the kind of Scribd endpoint a URL points to, so
+    metrics aren't split up by book, chapter or token.
+    """
+    for name, pattern in ENDPOINTS:
+        if pattern.search(url):
+            return name
+    return "other"
+
+
+def span_name(name, labels):
+    """
+    Names the span of a timed metric, such as "request chapter"
+    for `scribdl_request_seconds{endpoint="chapter"}`.
+    """
+    name = name[len("scribdl_"):] if name.startswith("scribdl_") else name
+    name = name[:-len("_seconds")] if name.endswith("_seconds") else name
+    return " ".join([name] + [str(value) for _, value in sorted(labels.items())])
+
+
+class Registry:
+    """
+    Counters and histograms of everything scribdl does, keyed by
+    name and labels. Safe to update from many threads at once.
+
+    Parameters
+    ----------
+    buckets : `tuple`
+        Upper bounds of the histogram buckets, ending with infinity.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        # (name, labels) -> value
+        self._counters = {}
+        # (name, labels) -> [count per bucket, sum, count]
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name, value=1, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    histogram[0][index] += 1
+                    break
+            histogram[1] += value
+            histogram[2] += 1
+
+    @contextlib.contextmanager
+    def timer(self, name, **labels):
+        """
+        Observes how many seconds the block took, even if it raised,
+        and records it as a span when profiling.
+        """
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            end_time = time.perf_counter()
+            self.observe(name, end_time - start_time, **labels)
+            profiling.record(span_name(name, labels), name, start_time, end_time, labels)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def snapshot(self):
+        """
+        Returns every counter and histogram as plain data. Histogram
+        buckets are cumulative, keyed by their upper bound.
+        """
+        with self._lock:
+            counters = [{"name": name, "labels": dict(labels), "value": value}
+                        for (name, labels), value in sorted(self._counters.items())]
+            histograms = []
+            for (name, labels), (counts, total, count) in sorted(self._histograms.items()):
+                cumulative = 0
+                buckets = {}
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    buckets[_format_bound(bound)] = cumulative
+                histograms.append({"name": name, "labels": dict(labels),
+                                   "count": count, "sum": total, "buckets": buckets})
+        return {"counters": counters, "histograms": histograms}
+
+    def dump(self, path):
+        """
+        Writes a snapshot of every metric to a JSON file.
+        """
+        with open(path, "w") as out_file:
+            json.dump(self.snapshot(), out_file, indent=2)
+
+    def to_prometheus(self):
+        """
+        Renders every metric in the Prometheus text exposition format.
+        """
+        snapshot = self.snapshot()
+        lines = []
+        typed = set()
+        for counter in snapshot["counters"]:
+            if counter["name"] not in typed:
+                lines.append("# TYPE {} counter".format(counter["name"]))
+                typed.add(counter["name"])
+            lines.append("{}{} {}".format(counter["name"], _format_labels(counter["labels"]), counter["value"]))
+        for histogram in snapshot["histograms"]:
+            name = histogram["name"]
+            if name not in typed:
+                lines.append("# TYPE {} histogram".format(name))
+                typed.add(name)
+            for bound, count in histogram["buckets"].items():
+                labels = dict(histogram["labels"], le=bound)
+                lines.append("{}_bucket{} {}".format(name, _format_labels(labels), count))
+            lines.append("{}_sum{} {}".format(name, _format_labels(histogram["labels"]), histogram["sum"]))
+            lines.append("{}_count{} {}".format(name, _format_labels(histogram["labels"]), histogram["count"]))
+        return "\n".join(lines) + "\n"
+
+
+def _label_key(labels):
+    # Values are kept as strings so that keys stay sortable
+    # when a label is an int for some series and a str for others
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _format_bound(bound):
+    return "+Inf" if bound == math.inf else repr(float(bound))
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    pairs = ('{}="{}"'.format(name, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+             for name, value in sorted(labels.items()))
+    return "{" + ",".join(pairs) + "}"
+
+
+# The process-wide registry every part of scribdl reports to
+REGISTRY = Registry()
+
+
+def inc(name, value=1, **labels):
+    REGISTRY.inc(name, value, **labels)
+
+
+def observe(name, value, **labels):
+    REGISTRY.observe(name, value, **labels)
+
+
+def timer(name, **labels):
+    return REGISTRY.timer(name, **labels)
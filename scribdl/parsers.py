@@ -0,0 +1,69 @@
+import json
+import re
+
+from html.parser import HTMLParser
+
+from . import exceptions
+
+# window.page12_callback(["<div ...>...</div>"]);
+JSONP_RE = re.compile(r"^\s*window\.page(\d+)_callback\((.*)\)\s*;?\s*$", re.DOTALL)
+
+
+def parse_jsonp_page(response):
+    """
+    Decodes a Scribd '.jsonp' page. Returns the page number and the
+    HTML carried in its callback payload.
+    """
+    match = JSONP_RE.match(response)
+    if not match:
+        raise exceptions.ScribdFetchError("Unexpected .jsonp page: {}".format(response[:40]))
+    page_number, payload = match.groups()
+    fragments = json.loads(payload)
+    return int(page_number), "".join(fragments)
+
+
+class SpanTextExtractor(HTMLParser):
+    """
+    Streams through HTML collecting the text of every
+    <span class="a">, without building a document tree.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.spans = []
+        self._parts = None
+        self._depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag != "span":
+            return
+        if self._parts is not None:
+            self._depth += 1
+            return
+        classes = (dict(attrs).get("class") or "").split()
+        if "a" in classes:
+            self._parts = []
+            self._depth = 0
+
+    def handle_endtag(self, tag):
+        if tag != "span" or self._parts is None:
+            return
+        if self._depth:
+            self._depth -= 1
+            return
+        self.spans.append("".join(self._parts).replace("\n", ""))
+        self._parts = None
+
+    def handle_data(self, data):
+        if self._parts is not None:
+            self._parts.append(data)
+
+
+def extract_span_text(html):
+    """
+    Returns the text of every <span class="a"> in the HTML, in order.
+    """
+    extractor = SpanTextExtractor()
+    extractor.feed(html)
+    extractor.close()
+    return extractor.spans
@@ -1,6 +1,266 @@
-from md2pdf.core import md2pdf
-import img2pdf
 import os
+import shutil
+import struct
+import tempfile
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+from md2pdf.core import md2pdf
+
+from . import metrics
+from . import profiling
+from .images import DEFAULT_DPI
+from .images import file_digest
+from .sink import CHAPTER_MARKER_RE
+
+COPY_CHUNK_SIZE = 64 * 1024
+
+# Start-of-frame markers carrying the JPEG dimensions (all SOFn but
+# DHT, JPG and DAC which share the same range)
+JPEG_SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+JPEG_COLORSPACES = {1: "/DeviceGray", 3: "/DeviceRGB", 4: "/DeviceCMYK"}
+
+
+def _read_jpeg_info(path):
+    """
+    Reads the dimensions, number of color components and resolution
+    of a JPEG from its headers. Returns `None` for anything else.
+    """
+    with open(path, "rb") as in_file:
+        if in_file.read(2) != b"\xff\xd8":
+            return None
+        dpi = None
+        adobe = False
+        while True:
+            marker = in_file.read(2)
+            if len(marker) < 2 or marker[0] != 0xFF:
+                return None
+            code = marker[1]
+            if code == 0x01 or 0xD0 <= code <= 0xD8 or code == 0xFF:
+                continue
+            length, = struct.unpack(">H", in_file.read(2))
+            segment = in_file.read(length - 2)
+            if code == 0xE0 and segment[:5] == b"JFIF\x00" and len(segment) >= 12:
+                units = segment[7]
+                density, = struct.unpack(">H", segment[8:10])
+                if units == 1 and density > 1:
+                    dpi = density
+                elif units == 2 and density > 1:
+                    dpi = density * 2.54
+            elif code == 0xEE and segment[:5] == b"Adobe":
+                adobe = True
+            elif code in JPEG_SOF_MARKERS:
+                _, height, width, components = struct.unpack(">BHHB", segment[:6])
+                return width, height, components, dpi or DEFAULT_DPI, adobe
+
+
+def split_chapters(markdown):
+    """
+    Splits book markdown at its chapter markers. Returns a list of
+    (chapter number, markdown) pairs, in order. Text before the first
+    marker, if any, is kept with the first chapter.
+    """
+    matches = list(CHAPTER_MARKER_RE.finditer(markdown))
+    if not matches:
+        return [(None, markdown)]
+    shards = []
+    for index, match in enumerate(matches):
+        start = 0 if index == 0 else match.start()
+        end = matches[index + 1].start() if index + 1 < len(matches) else len(markdown)
+        shards.append((int(match.group(1)), markdown[start:end]))
+    return shards
+
+
+def _render_markdown(job):
+    """
+    Renders a markdown file to PDF. Runs in a worker process.
+    """
+    pdf_path, md_path, base_url = job
+    md2pdf(pdf_path, md_file_path=md_path, base_url=base_url)
+    return pdf_path
+
+
+def merge_chapter_pdfs(chapter_pdfs, pdf_path):
+    """
+    Concatenates per-chapter PDFs into one, with an outline entry
+    pointing at the first page of every chapter.
+    """
+    from pypdf import PdfWriter
+
+    writer = PdfWriter()
+    for chapter, chapter_pdf in chapter_pdfs:
+        first_page = len(writer.pages)
+        writer.append(chapter_pdf, import_outline=False)
+        if len(writer.pages) > first_page:
+            writer.add_outline_item("Chapter {}".format(chapter), first_page)
+    with open(pdf_path, "wb") as out_file:
+        writer.write(out_file)
+
+
+class StreamingPDFWriter:
+    """
+    Writes images into a PDF one page at a time. JPEG pages are copied
+    into the file in chunks without being decoded, so memory use stays
+    bounded however many pages there are, and the PDF can be assembled
+    while later pages are still downloading.
+
+    Parameters
+    ----------
+    pdf_path : `str`
+        Output path of the generated PDF.
+    """
+
+    def __init__(self, pdf_path):
+        self.pdf_path = pdf_path
+        self._file = open(pdf_path, "wb")
+        self._offsets = {}
+        # Objects 1 and 2 are reserved for the catalog and the page
+        # tree, which can only be written once every page is known.
+        self._next_object = 3
+        self._pages = []
+        # Objects drawing each distinct image, keyed by content digest,
+        # so repeated pages embed the image only once
+        self._drawings = {}
+        self._file.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+    def add_image(self, image_path):
+        """
+        Appends the image as a new page sized to its resolution.
+        Pages identical to an earlier one reuse its image.
+        """
+        digest = file_digest(image_path)
+        if digest not in self._drawings:
+            self._drawings[digest] = self._write_drawing(image_path)
+        image_object, content_object, page_width, page_height = self._drawings[digest]
+
+        page_object = self._begin_object()
+        self._write("<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {0:.4f} {1:.4f}] "
+                    "/Resources << /XObject << /Im0 {2} 0 R >> >> /Contents {3} 0 R >>\nendobj\n".format(
+                        page_width, page_height, image_object, content_object))
+        self._pages.append(page_object)
+
+    def close(self):
+        """
+        Writes the page tree, cross-reference table and trailer,
+        and closes the file.
+        """
+        kids = " ".join("{} 0 R".format(page) for page in self._pages)
+        self._begin_object(2)
+        self._write("<< /Type /Pages /Kids [{}] /Count {} >>\nendobj\n".format(kids, len(self._pages)))
+        self._begin_object(1)
+        self._write("<< /Type /Catalog /Pages 2 0 R >>\nendobj\n")
+
+        xref_offset = self._file.tell()
+        self._write("xref\n0 {}\n0000000000 65535 f \n".format(self._next_object))
+        for number in range(1, self._next_object):
+            self._write("{:010d} 00000 n \n".format(self._offsets[number]))
+        self._write("trailer\n<< /Size {} /Root 1 0 R >>\nstartxref\n{}\n%%EOF\n".format(
+            self._next_object, xref_offset))
+        self._file.close()
+
+    def abort(self):
+        """
+        Closes and removes an unfinished PDF.
+        """
+        self._file.close()
+        os.remove(self.pdf_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc_info):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def _write(self, text):
+        self._file.write(text.encode("latin-1"))
+
+    def _begin_object(self, number=None):
+        if number is None:
+            number = self._next_object
+            self._next_object += 1
+        self._offsets[number] = self._file.tell()
+        self._write("{} 0 obj\n".format(number))
+        return number
+
+    def _write_stream(self, entries, data=None, path=None, length=None):
+        """
+        Writes a stream object from bytes or by copying a file.
+        """
+        number = self._begin_object()
+        if length is None:
+            length = len(data)
+        entries = dict(entries, Length=length)
+        self._write("<< {} >>\nstream\n".format(" ".join("/{} {}".format(key, value)
+                                                       for key, value in entries.items())))
+        if path is None:
+            self._file.write(data)
+        else:
+            with open(path, "rb") as in_file:
+                while True:
+                    chunk = in_file.read(COPY_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    self._file.write(chunk)
+        self._write("\nendstream\nendobj\n")
+        return number
+
+    def _write_drawing(self, image_path):
+        """
+        Writes an image and the content stream drawing it over a
+        whole page. Returns their objects and the page size.
+        """
+        jpeg_info = _read_jpeg_info(image_path)
+        if jpeg_info:
+            width, height, components, dpi, adobe = jpeg_info
+            image_object = self._write_jpeg(image_path, width, height, components, adobe)
+        else:
+            width, height, dpi, image_object = self._write_other_image(image_path)
+
+        page_width = width * 72.0 / dpi
+        page_height = height * 72.0 / dpi
+        content = "q {0:.4f} 0 0 {1:.4f} 0 0 cm /Im0 Do Q".format(page_width, page_height).encode()
+        content_object = self._write_stream({}, content)
+        return image_object, content_object, page_width, page_height
+
+    def _write_jpeg(self, image_path, width, height, components, adobe):
+        entries = {
+            "Type": "/XObject",
+            "Subtype": "/Image",
+            "Width": width,
+            "Height": height,
+            "ColorSpace": JPEG_COLORSPACES.get(components, "/DeviceRGB"),
+            "BitsPerComponent": 8,
+            "Filter": "/DCTDecode",
+        }
+        if components == 4 and adobe:
+            # Adobe writes CMYK JPEGs inverted
+            entries["Decode"] = "[1 0 1 0 1 0 1 0]"
+        return self._write_stream(entries, path=image_path, length=os.path.getsize(image_path))
+
+    def _write_other_image(self, image_path):
+        """
+        Embeds a non-JPEG image (e.g. PNG) as raw deflated samples.
+        """
+        from PIL import Image
+
+        image = Image.open(image_path)
+        if image.mode not in ("L", "RGB"):
+            image = image.convert("RGB")
+        dpi = image.info.get("dpi", (DEFAULT_DPI,))[0] or DEFAULT_DPI
+        entries = {
+            "Type": "/XObject",
+            "Subtype": "/Image",
+            "Width": image.width,
+            "Height": image.height,
+            "ColorSpace": "/DeviceGray" if image.mode == "L" else "/DeviceRGB",
+            "BitsPerComponent": 8,
+            "Filter": "/FlateDecode",
+        }
+        image_object = self._write_stream(entries, zlib.compress(image.tobytes()))
+        return image.width, image.height, float(dpi), image_object
 
 
 class ConvertToPDF:
@@ -14,35 +274,82 @@ class ConvertToPDF:
         or a list containing paths to many images.
     output_content : `str`
         Output path of the generated PDF.
+    jobs : `int`
+        Number of processes rendering book chapters in parallel.
+        Needs the optional `pypdf` dependency to merge them.
     """
 
-    def __init__(self, input_content, output_path):
+    def __init__(self, input_content, output_path, jobs=1):
         self.input_content = input_content
         self.pdf_path = output_path
+        self.jobs = jobs
 
+    @profiling.traced("ConvertToPDF.to_pdf")
     def to_pdf(self):
         """
         Converts to PDF depending upon the type of content,
         i.e. images or markdown.
         """
         if isinstance(self.input_content, list):
-            self._images_to_pdf()
+            with metrics.timer("scribdl_conversion_seconds", kind="images"):
+                self._images_to_pdf()
         else:
-            self._markdown_to_pdf()
+            with metrics.timer("scribdl_conversion_seconds", kind="markdown"):
+                self._markdown_to_pdf()
 
     def _markdown_to_pdf(self):
         """
-        Converts markdown to PDF.
+        Converts markdown to PDF. Books are rendered a chapter at a
+        time in parallel when `jobs` allows it.
         """
+        if self.jobs > 1:
+            with open(self.input_content, "r", encoding="utf-8") as md_file:
+                chapters = split_chapters(md_file.read())
+            if len(chapters) > 1:
+                try:
+                    import pypdf  # noqa: F401
+                except ImportError:
+                    print("Install pypdf to render chapters in parallel.")
+                else:
+                    self._chapters_to_pdf(chapters)
+                    return
+
         md2pdf(self.pdf_path,
                md_file_path=self.input_content,
                base_url=os.getcwd())
 
+    def _chapters_to_pdf(self, chapters):
+        """
+        Renders every chapter to its own PDF in a process pool,
+        then merges them keeping one bookmark per chapter.
+        """
+        shard_directory = tempfile.mkdtemp(prefix="scribdl-")
+        try:
+            jobs = []
+            for chapter, markdown in chapters:
+                md_path = os.path.join(shard_directory, "{}.md".format(chapter))
+                with open(md_path, "w", encoding="utf-8") as md_file:
+                    md_file.write(markdown)
+                pdf_path = os.path.join(shard_directory, "{}.pdf".format(chapter))
+                # Image paths in the markdown are relative to the working directory
+                jobs.append((pdf_path, md_path, os.getcwd()))
+
+            with profiling.span("render chapters", chapters=len(jobs)):
+                with ProcessPoolExecutor(max_workers=min(self.jobs, len(jobs))) as executor:
+                    chapter_pdfs = list(executor.map(_render_markdown, jobs))
+
+            with profiling.span("merge chapters"):
+                merge_chapter_pdfs([(chapter, chapter_pdf) for (chapter, _), chapter_pdf
+                                    in zip(chapters, chapter_pdfs)],
+                                   self.pdf_path)
+        finally:
+            shutil.rmtree(shard_directory, ignore_errors=True)
+
     def _images_to_pdf(self):
         """
-        Converts images to PDF.
+        Converts images to PDF, one page at a time.
         """
-        with open(self.pdf_path, "wb") as f:
-            open_images = [open(img, "rb") for img in self.input_content]
-            pdf_images = img2pdf.convert(open_images)
-            f.write(pdf_images)
+        with StreamingPDFWriter(self.pdf_path) as writer:
+            for image in self.input_content:
+                with metrics.timer("scribdl_write_seconds", kind="pdf_page"):
+                    writer.add_image(image)
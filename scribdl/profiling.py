@@ -0,0 +1,162 @@
+import asyncio
+import contextlib
+import cProfile
+import functools
+import inspect
+import itertools
+import json
+import os
+import threading
+import time
+import weakref
+
+# Set while profiling, every span goes to it
+_tracer = None
+
+
+class Tracer:
+    """
+    Collects spans from every thread and writes them as a Chrome
+    trace-event file, which chrome://tracing and Perfetto show as
+    one timeline per thread. Spans of asyncio tasks get a timeline
+    per task, as tasks sharing a thread overlap without nesting.
+    """
+
+    def __init__(self):
+        self._origin = time.perf_counter()
+        self._events = []
+        # tid -> name of its timeline
+        self._tracks = {}
+        # task -> the tid of its timeline
+        self._tasks = weakref.WeakKeyDictionary()
+        self._task_ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def add(self, name, category, start, end, args=None):
+        """
+        Records a span between two `time.perf_counter` readings.
+        """
+        thread = threading.current_thread()
+        tid, track = thread.ident, thread.name
+        task = _current_task()
+        if task is not None:
+            with self._lock:
+                tid = self._tasks.get(task)
+                if tid is None:
+                    tid = self._tasks[task] = next(self._task_ids)
+            track = "{} on {}".format(task.get_name(), thread.name)
+        event = {
+            "name": name,
+            "cat": category,
+            "ph": "X",
+            "ts": (start - self._origin) * 1e6,
+            "dur": (end - start) * 1e6,
+            "pid": os.getpid(),
+            "tid": tid,
+        }
+        if args:
+            event["args"] = {key: str(value) for key, value in args.items()}
+        with self._lock:
+            self._events.append(event)
+            self._tracks[tid] = track
+
+    def write(self, path):
+        with self._lock:
+            names = [{"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": ident, "args": {"name": name}}
+                     for ident, name in self._tracks.items()]
+            events = names + sorted(self._events, key=lambda event: event["ts"])
+        with open(path, "w") as out_file:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, out_file)
+
+
+def _current_task():
+    """
+    Returns the asyncio task running on this thread, if any.
+    """
+    try:
+        return asyncio.current_task()
+    except RuntimeError:
+        return None
+
+
+def record(name, category, start, end, args=None):
+    """
+    Records a span if profiling is on.
+    """
+    tracer = _tracer
+    if tracer is not None:
+        tracer.add(name, category, start, end, args)
+
+
+@contextlib.contextmanager
+def span(name, category="scribdl", **args):
+    """
+    Records the block as a span if profiling is on.
+    """
+    if _tracer is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, category, start, time.perf_counter(), args)
+
+
+def traced(name):
+    """
+    Decorates a function or coroutine function to record every call
+    to it as a span.
+    """
+    def decorate(function):
+        if inspect.iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def async_wrapper(*args, **kwargs):
+                with span(name):
+                    return await function(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+class Profiler:
+    """
+    Profiles everything scribdl does while active, recording a span for
+    every request, parse, write and conversion on any thread.
+
+    Parameters
+    ----------
+    trace_path : `str`
+        Where the Chrome trace-event JSON is written on exit.
+    stats_path : `str`
+        Where a cProfile dump is also written, if passed. cProfile only
+        sees the thread the profiler was started on.
+    """
+
+    def __init__(self, trace_path, stats_path=None):
+        self.trace_path = trace_path
+        self.stats_path = stats_path
+        self._profile = None
+
+    def __enter__(self):
+        global _tracer
+        if _tracer is not None:
+            raise RuntimeError("Already profiling")
+        _tracer = Tracer()
+        if self.stats_path:
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        return self
+
+    def __exit__(self, *exc_info):
+        global _tracer
+        if self._profile is not None:
+            self._profile.disable()
+            self._profile.dump_stats(self.stats_path)
+        tracer, _tracer = _tracer, None
+        tracer.write(self.trace_path)
@@ -0,0 +1,89 @@
+import json
+import os
+import threading
+
+PART_SUFFIX = ".part"
+MANIFEST_SUFFIX = ".manifest.json"
+
+
+def part_path(filepath):
+    """
+    Path of the partial file a download is written to before it
+    is moved into place.
+    """
+    return filepath + PART_SUFFIX
+
+
+def manifest_path(filepath):
+    """
+    Path of the manifest tracking progress for the passed file.
+    """
+    return filepath + MANIFEST_SUFFIX
+
+
+class Manifest:
+    """
+    A small JSON checkpoint stored next to an output file. Every update
+    is written to disk atomically so an interrupted run can resume.
+
+    Parameters
+    ----------
+    path : `str`
+        Path of the manifest file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._values = {}
+        if os.path.exists(path):
+            try:
+                with open(path, "r") as in_file:
+                    self._values = json.load(in_file)
+            except ValueError:
+                # A corrupt manifest is as good as none
+                self._values = {}
+
+    def __bool__(self):
+        return bool(self._values)
+
+    def get(self, key, default=None):
+        with self._lock:
+            return self._values.get(key, default)
+
+    def update(self, **values):
+        """
+        Stores the passed values and writes the manifest to disk.
+        """
+        with self._lock:
+            self._values.update(values)
+            temp_path = self.path + ".tmp"
+            with open(temp_path, "w") as out_file:
+                json.dump(self._values, out_file)
+            os.replace(temp_path, self.path)
+
+    def remove(self):
+        """
+        Deletes the manifest once the job it tracks has completed.
+        """
+        with self._lock:
+            self._values = {}
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+
+def restore_output(filename, manifest):
+    """
+    Prepares a text output file for appending. Content written after the
+    last checkpoint in `manifest` is truncated away; without a checkpoint
+    the file is started afresh. Returns the last completed unit, or 0.
+    """
+    completed = manifest.get("completed", 0)
+    offset = manifest.get("offset", 0) if completed else 0
+    if not os.path.exists(filename) or os.path.getsize(filename) < offset:
+        completed, offset = 0, 0
+    with open(filename, "a", encoding="utf-8") as out_file:
+        out_file.truncate(offset)
+    return completed
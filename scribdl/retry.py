@@ -0,0 +1,203 @@
+import email.utils
+import random
+import threading
+import time
+
+import requests
+import urllib3
+
+from . import exceptions
+from . import metrics
+
+DEFAULT_ATTEMPTS = 5
+DEFAULT_BACKOFF = 0.5
+DEFAULT_MAX_BACKOFF = 30
+# Longer waits asked for by Scribd give up on the request instead
+DEFAULT_MAX_RETRY_AFTER = 300
+
+# Answers worth asking again for, when the request may be sent again
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+IDEMPOTENT_METHODS = ("GET", "HEAD", "OPTIONS", "PUT", "DELETE")
+# POSTs which only hand out a token, so sending them twice is harmless
+IDEMPOTENT_ENDPOINTS = ("csrf_token", "access_token")
+
+# Requests that never got an answer, or whose body was cut short
+NETWORK_ERRORS = (
+    requests.exceptions.ConnectionError,
+    requests.exceptions.Timeout,
+    requests.exceptions.ChunkedEncodingError,
+    urllib3.exceptions.HTTPError,
+    ConnectionError,
+    exceptions.ScribdTransientError,
+)
+
+
+class RetryPolicy:
+    """
+    Decides which failed requests are sent again and after how long.
+
+    Idempotent requests are retried on network errors and on the status
+    codes in `status_codes`, after an exponential backoff with full
+    jitter, or after as long as a `Retry-After` header asks for. Other
+    requests are only retried on 429, which Scribd answers without
+    acting on the request.
+
+    Parameters
+    ----------
+    attempts : `int`
+        Times a request is sent at most, the first one included.
+    backoff : `float`
+        Seconds the backoff starts from, doubled on every attempt.
+    max_backoff : `float`
+        Upper bound of the backoff in seconds.
+    max_retry_after : `float`
+        Longest `Retry-After` in seconds that is waited for.
+    status_codes : `tuple`
+        Status codes that are retried.
+    """
+
+    def __init__(self,
+                 attempts=DEFAULT_ATTEMPTS,
+                 backoff=DEFAULT_BACKOFF,
+                 max_backoff=DEFAULT_MAX_BACKOFF,
+                 max_retry_after=DEFAULT_MAX_RETRY_AFTER,
+                 status_codes=RETRY_STATUS_CODES):
+        self.attempts = attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.max_retry_after = max_retry_after
+        self.status_codes = status_codes
+
+    def is_idempotent(self, method, url):
+        return method.upper() in IDEMPOTENT_METHODS or metrics.endpoint(url) in IDEMPOTENT_ENDPOINTS
+
+    def backoff_delay(self, attempt):
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def retry_after(self, response):
+        """
+        Returns the seconds a `Retry-After` header asks to wait, if any.
+        """
+        value = response.headers.get("Retry-After")
+        if not value:
+            return None
+        try:
+            seconds = float(value)
+        except ValueError:
+            try:
+                seconds = email.utils.parsedate_to_datetime(value).timestamp() - time.time()
+            except (TypeError, ValueError):
+                return None
+        return max(seconds, 0)
+
+    def retry_delay(self, method, url, attempt, response=None):
+        """
+        Returns the seconds to wait before sending again a request whose
+        `attempt`-th try, counting from 0, failed with `response`, or with
+        a network error if `None`. Returns `None` if it isn't retried.
+        """
+        if attempt + 1 >= self.attempts:
+            return None
+        if response is None:
+            if not self.is_idempotent(method, url):
+                return None
+            return self.backoff_delay(attempt)
+
+        if response.status_code not in self.status_codes:
+            return None
+        if response.status_code != 429 and not self.is_idempotent(method, url):
+            return None
+        retry_after = self.retry_after(response)
+        if retry_after is None:
+            return self.backoff_delay(attempt)
+        if retry_after > self.max_retry_after:
+            return None
+        # Spread out the workers that were all told the same time
+        return retry_after + random.uniform(0, self.backoff)
+
+    def call(self, function, url):
+        """
+        Calls `function`, which GETs `url` and processes the response
+        as it arrives, again after a network error until it succeeds or
+        runs out of attempts. Errors the session already gave up
+        retrying aren't retried again.
+        """
+        attempt = 0
+        while True:
+            try:
+                return function()
+            except NETWORK_ERRORS as error:
+                if is_exhausted(error):
+                    raise
+                delay = self.retry_delay("GET", url, attempt)
+                if delay is None:
+                    raise
+            metrics.inc("scribdl_retries_total", reason="network")
+            time.sleep(delay)
+            attempt += 1
+
+
+def mark_exhausted(error):
+    """
+    Marks an error that was retried as many times as allowed.
+    """
+    error.scribdl_retries_exhausted = True
+    return error
+
+
+def is_exhausted(error):
+    return getattr(error, "scribdl_retries_exhausted", False)
+
+
+class RateLimiter:
+    """
+    A token bucket limiting how fast requests are sent, shared by every
+    worker of a session. When Scribd answers 429, every worker holds
+    off for as long as it asked.
+
+    Parameters
+    ----------
+    rate : `float`
+        Requests per second allowed on average. Unlimited if `None`.
+    burst : `int`
+        Requests that may be sent at once after being idle.
+        Defaults to one second's worth.
+    """
+
+    def __init__(self, rate=None, burst=None):
+        self.rate = rate
+        self.burst = burst or max(1, int(rate or 1))
+        self._tokens = self.burst
+        self._updated_at = time.monotonic()
+        self._paused_until = 0
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """
+        Takes a token. Returns the seconds the caller has
+        to wait before sending its request.
+        """
+        with self._lock:
+            now = time.monotonic()
+            wait = max(self._paused_until - now, 0)
+            if self.rate:
+                self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+                self._updated_at = now
+                self._tokens -= 1
+                if self._tokens < 0:
+                    wait = max(wait, -self._tokens / self.rate)
+        if wait:
+            metrics.observe("scribdl_throttle_seconds", wait)
+        return wait
+
+    def acquire(self):
+        wait = self.reserve()
+        if wait:
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """
+        Holds off every request for `seconds` from now.
+        """
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
@@ -0,0 +1,190 @@
+import json
+import queue
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+
+from . import batch
+from . import metrics
+from .session import get_session
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8123
+
+QUEUED = "queued"
+RUNNING = "running"
+
+# Options a job may set for itself, passed on to `batch.download_url`
+JOB_OPTIONS = ("images", "pdf", "epub", "jobs", "segments", "dedupe", "max_dpi", "jpeg_quality")
+
+JOB_PATH_RE = re.compile(r"^/jobs/([0-9a-f]+)$")
+
+
+class JobQueue:
+    """
+    Queues download jobs and runs them in a pool of worker threads
+    sharing one session, so every job reuses the same login and
+    keep-alive connections.
+
+    Parameters
+    ----------
+    workers : `int`
+        Number of jobs run at the same time.
+    session : `ScribdSession`
+        Session shared by every job.
+    job : `callable`
+        Called as `job(url, session=session, **options)` for every job
+        and returns the output paths. Defaults to `batch.download_url`.
+    options : `dict`
+        Default options of every job, which jobs may override.
+    """
+
+    def __init__(self, workers=4, session=None, job=batch.download_url, **options):
+        self.workers = workers
+        self.session = get_session(session)
+        self.job = job
+        self.options = options
+        self._records = {}
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._threads = []
+
+    def start(self):
+        for _ in range(self.workers):
+            thread = threading.Thread(target=self._work, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        """
+        Waits for running jobs to finish and stops the workers.
+        Jobs still queued are not run.
+        """
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def submit(self, url, **options):
+        """
+        Queues a download. Returns its job record.
+        """
+        unknown = set(options) - set(JOB_OPTIONS)
+        if unknown:
+            raise ValueError("Unknown job options: {}".format(", ".join(sorted(unknown))))
+        record = {
+            "id": uuid.uuid4().hex,
+            "url": url,
+            "options": options,
+            "status": QUEUED,
+            "submitted": time.time(),
+        }
+        with self._lock:
+            self._records[record["id"]] = record
+        self._queue.put(record["id"])
+        return dict(record)
+
+    def get(self, job_id):
+        """
+        Returns the record of a job, or `None` if there is no such job.
+        """
+        with self._lock:
+            record = self._records.get(job_id)
+            return dict(record) if record else None
+
+    def list(self):
+        """
+        Returns the records of every job, in submission order.
+        """
+        with self._lock:
+            return [dict(record) for record in self._records.values()]
+
+    def _work(self):
+        while True:
+            job_id = self._queue.get()
+            if job_id is None:
+                return
+            with self._lock:
+                record = self._records[job_id]
+                record["status"] = RUNNING
+                record["started"] = time.time()
+            options = dict(self.options, **record["options"])
+            result = batch.run_job(self.job, record["url"], session=self.session, **options)
+            with self._lock:
+                record.update(result)
+
+
+class JobRequestHandler(BaseHTTPRequestHandler):
+    """
+    JSON API over a `JobQueue`:
+
+    - ``POST /jobs`` with ``{"url": ..., <option>: ...}`` queues a job
+    - ``GET /jobs`` lists every job
+    - ``GET /jobs/<id>`` returns the status and results of a job
+    - ``GET /metrics`` returns the metrics of every job so far,
+      in the Prometheus text format
+    """
+
+    def do_GET(self):
+        job_queue = self.server.job_queue
+        if self.path == "/metrics":
+            self._send_text(200, metrics.REGISTRY.to_prometheus())
+            return
+        if self.path == "/jobs":
+            self._send_json(200, {"jobs": job_queue.list()})
+            return
+        match = JOB_PATH_RE.match(self.path)
+        record = job_queue.get(match.group(1)) if match else None
+        if record is None:
+            self._send_json(404, {"error": "No such job"})
+        else:
+            self._send_json(200, record)
+
+    def do_POST(self):
+        if self.path != "/jobs":
+            self._send_json(404, {"error": "Not found"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length).decode("utf-8"))
+            url = request.pop("url")
+            record = self.server.job_queue.submit(url, **request)
+        except (ValueError, KeyError, TypeError, AttributeError) as error:
+            self._send_json(400, {"error": "Invalid job: {}".format(error)})
+            return
+        self._send_json(202, record, location="/jobs/{}".format(record["id"]))
+
+    def log_message(self, *args):
+        pass
+
+    def _send_text(self, status, body):
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_json(self, status, body, location=None):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        if location:
+            self.send_header("Location", location)
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def make_server(job_queue, host=DEFAULT_HOST, port=DEFAULT_PORT):
+    """
+    Creates an HTTP server exposing `job_queue`. Serve it with
+    `serve_forever`; workers of the queue must be started separately.
+    """
+    server = ThreadingHTTPServer((host, port), JobRequestHandler)
+    server.job_queue = job_queue
+    return server
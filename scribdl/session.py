@@ -0,0 +1,203 @@
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from . import const
+from . import metrics
+from . import profiling
+from . import retry
+
+DEFAULT_TIMEOUT = (10, 60)
+
+# Scribd, its CDN and findawayworld are the only hosts we talk to, so a
+# handful of host pools each holding a few keep-alive connections is enough
+# to serve every page, chapter, image and track without new handshakes.
+DEFAULT_POOL_CONNECTIONS = 8
+DEFAULT_POOL_MAXSIZE = 16
+
+PREMIUM_COOKIE_DOMAIN = ".scribd.com"
+
+# Answers after which a logged in session logs in again and retries
+LOGIN_REFRESH_STATUS_CODES = (401, 403)
+
+
+class ScribdSession(requests.Session):
+    """
+    A pooled HTTP session shared by every network call in scribdl.
+
+    Parameters
+    ----------
+    timeout : `float`, `tuple`
+        Default timeout applied to requests which don't pass one.
+    pool_connections : `int`
+        Number of per-host connection pools to keep around.
+    pool_maxsize : `int`
+        Maximum number of keep-alive connections kept per host.
+    cookies : `dict`
+        Premium cookies to send along to Scribd. Defaults to
+        `const.premium_cookies`.
+    cache : `ResponseCache`
+        On-disk cache consulted by `cached_get`. Disabled by default.
+    retry_policy : `RetryPolicy`
+        Decides which failed requests are sent again. Defaults to a
+        `RetryPolicy` with its default settings.
+    rate_limiter : `RateLimiter`
+        Paces the requests of every thread using the session.
+        Defaults to an unlimited one, which still holds every
+        thread off after a 429.
+
+    Attributes
+    ----------
+    premium_login : `PremiumLogin`
+        Set by `authorize.set_credentials`. Keeps the premium cookies
+        valid, logging in again when Scribd rejects them.
+    async_transport : `httpx.AsyncBaseTransport`
+        Sends the requests `AsyncSession` makes through httpx, the way
+        mounted adapters send the session's own. Any adapter other than
+        the default one keeps `AsyncSession` off httpx unless this is set.
+    """
+
+    def __init__(self,
+                 timeout=DEFAULT_TIMEOUT,
+                 pool_connections=DEFAULT_POOL_CONNECTIONS,
+                 pool_maxsize=DEFAULT_POOL_MAXSIZE,
+                 cookies=None,
+                 cache=None,
+                 retry_policy=None,
+                 rate_limiter=None):
+        super().__init__()
+        self.timeout = timeout
+        self.cache = cache
+        self.retry_policy = retry_policy or retry.RetryPolicy()
+        self.rate_limiter = rate_limiter or retry.RateLimiter()
+        self.premium_login = None
+        self.async_transport = None
+        adapter = HTTPAdapter(pool_connections=pool_connections,
+                              pool_maxsize=pool_maxsize)
+        self.mount("https://", adapter)
+        self.mount("http://", adapter)
+        if cookies is None:
+            cookies = const.premium_cookies
+        self.set_premium_cookies(cookies)
+
+    def set_premium_cookies(self, cookies):
+        """
+        Stores the premium cookies so they are only sent to Scribd
+        and not to third-party hosts like findawayworld.
+        """
+        for name, value in cookies.items():
+            self.cookies.set(name, value, domain=PREMIUM_COOKIE_DOMAIN)
+
+    def cached_get(self, url, resource, **kwargs):
+        """
+        GETs a cacheable resource such as an HTML page ("page"), a book
+        chapter ("chapter") or a document page ("jsonp"), going through
+        the on-disk cache if one is set.
+        """
+        if self.cache is None:
+            return self.get(url, **kwargs)
+        return self.cache.fetch(self, url, resource, **kwargs)
+
+    def close(self):
+        """
+        Closes every connection, along with the event loop and
+        `AsyncSession` the synchronous API runs on, if started.
+        """
+        engine = getattr(self, "aio_engine", None)
+        if engine is not None:
+            self.aio_engine = None
+            engine.close()
+        super().close()
+
+    def request(self, method, url, **kwargs):
+        """
+        Sends a request, again while it fails in a way `retry_policy`
+        retries. Every try waits its turn with `rate_limiter` first.
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        attempt = 0
+        while True:
+            try:
+                response = self._logged_in_request(method, url, **kwargs)
+            except retry.NETWORK_ERRORS as error:
+                delay = self.retry_policy.retry_delay(method, url, attempt)
+                if delay is None:
+                    raise retry.mark_exhausted(error)
+                reason = "network"
+            else:
+                delay = self.retry_policy.retry_delay(method, url, attempt, response=response)
+                if delay is None:
+                    return response
+                response.close()
+                reason = "throttled" if response.status_code == 429 else "status"
+
+            metrics.inc("scribdl_retries_total", reason=reason)
+            if reason == "throttled":
+                # Everyone waits, the limit is on all of our requests
+                self.rate_limiter.pause(delay)
+            else:
+                time.sleep(delay)
+            attempt += 1
+
+    def _logged_in_request(self, method, url, **kwargs):
+        """
+        Sends a request with the premium cookies kept valid, logging
+        in again and resending once if Scribd rejects them.
+        """
+        premium_login = self.premium_login
+        if premium_login is None or not premium_login.covers(url):
+            return self._measured_request(method, url, **kwargs)
+
+        premium_login.ensure()
+        sent_cookie = self.cookies.get("_scribd_session", domain=PREMIUM_COOKIE_DOMAIN)
+        response = self._measured_request(method, url, **kwargs)
+        if (response.status_code in LOGIN_REFRESH_STATUS_CODES
+                and premium_login.refreshes(url)
+                and premium_login.refresh(sent_cookie)):
+            response.close()
+            metrics.inc("scribdl_retries_total", reason="login")
+            response = self._measured_request(method, url, **kwargs)
+        return response
+
+    def _measured_request(self, method, url, **kwargs):
+        """
+        Sends a request, counting it along with its latency and, unless
+        streamed, the size of its body under the endpoint it went to.
+        """
+        self.rate_limiter.acquire()
+        endpoint = metrics.endpoint(url)
+        start_time = time.perf_counter()
+        try:
+            response = super().request(method, url, **kwargs)
+        except Exception:
+            metrics.inc("scribdl_requests_total", endpoint=endpoint, method=method, status="error")
+            raise
+        end_time = time.perf_counter()
+        metrics.observe("scribdl_request_seconds", end_time - start_time, endpoint=endpoint)
+        # No URL, it may hold a token
+        profiling.record("request " + endpoint, "scribdl_request_seconds", start_time, end_time,
+                         {"method": method, "status": response.status_code})
+        metrics.inc("scribdl_requests_total", endpoint=endpoint, method=method, status=response.status_code)
+        if not kwargs.get("stream"):
+            metrics.inc("scribdl_response_bytes_total", len(response.content or b""), endpoint=endpoint)
+        return response
+
+
+_default_session = None
+_default_session_lock = threading.Lock()
+
+
+def get_session(session=None):
+    """
+    Returns the passed session, or the process-wide default
+    session if none was passed.
+    """
+    global _default_session
+    if session is not None:
+        return session
+    with _default_session_lock:
+        if _default_session is None:
+            _default_session = ScribdSession()
+    return _default_session
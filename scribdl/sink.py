@@ -0,0 +1,85 @@
+import re
+import sys
+
+DEFAULT_BUFFER_SIZE = 256 * 1024
+
+# Written ahead of every book chapter so the markdown can later be split
+# at chapter boundaries. Renders as nothing.
+CHAPTER_MARKER = "<!-- chapter {} -->\n\n"
+CHAPTER_MARKER_RE = re.compile(r"^<!-- chapter (\d+) -->$", re.MULTILINE)
+
+
+class TextSink:
+    """
+    Buffered output for extracted text. Keeps a single file handle open
+    for the whole job and only hits the disk (and the console) when
+    flushed, which callers do at page or chapter boundaries.
+
+    Parameters
+    ----------
+    filename : `str`
+        Path of the file text is appended to.
+    quiet : `bool`
+        Don't echo the extracted text to the console.
+    buffer_size : `int`
+        Size of the in-memory write buffer.
+    """
+
+    def __init__(self, filename, quiet=False, buffer_size=DEFAULT_BUFFER_SIZE):
+        self.filename = filename
+        self.quiet = quiet
+        self._file = open(filename, "a", encoding="utf-8", buffering=buffer_size)
+        self._echo = []
+
+    def write(self, text):
+        """
+        Appends text to the buffer.
+        """
+        self._file.write(text)
+        if not self.quiet:
+            self._echo.append(text)
+
+    def flush(self):
+        """
+        Writes buffered text to the file and echoes it to the console.
+        """
+        self._file.flush()
+        if self._echo:
+            sys.stdout.write("".join(self._echo))
+            sys.stdout.flush()
+            self._echo = []
+
+    def tell(self):
+        """
+        Size of the file once everything written so far is flushed.
+        """
+        self.flush()
+        return self._file.tell()
+
+    def close(self):
+        self.flush()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class MarkdownBookSink(TextSink):
+    """
+    A `TextSink` for books, laying chapters out as markdown.
+    """
+
+    def start_chapter(self, chapter):
+        self.write(CHAPTER_MARKER.format(chapter))
+
+    def escape(self, text):
+        return text
+
+    def paragraph(self, parts):
+        return " ".join(parts) + "\n\n"
+
+    def image(self, name, path):
+        return "![{}]({})\n\n".format(name, path)
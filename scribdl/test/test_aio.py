@@ -0,0 +1,137 @@
+from .. import aio
+from .. import authorize
+from .. import internals
+from .. import session
+from .test_internals import RangeHandler
+from .test_internals import range_server  # noqa: F401
+
+import asyncio
+import time
+
+import httpx
+import requests
+
+
+def test_imap_limited_keeps_order_and_limit():
+    running = []
+    peak = []
+
+    async def double(number):
+        running.append(number)
+        peak.append(len(running))
+        # Later items finish first
+        await asyncio.sleep(0.001 * (10 - number))
+        running.remove(number)
+        return number * 2
+
+    async def collect():
+        return [result async for result in aio.imap_limited(double, range(10), jobs=3)]
+
+    assert asyncio.run(collect()) == list(range(0, 20, 2))
+    assert max(peak) == 3
+
+
+def test_block_on_shares_one_async_session():
+    async def current(aio_session):
+        return aio_session
+
+    with session.ScribdSession() as scribd_session:
+        first = aio.block_on(current, session=scribd_session)
+        assert aio.block_on(current, session=scribd_session) is first
+
+        async def main():
+            # Blocks this loop, while the engine's loop does the work
+            return aio.block_on(current, session=scribd_session)
+
+        assert asyncio.run(main()) is first
+        engine = scribd_session.aio_engine
+    assert scribd_session.aio_engine is None and engine.loop.is_closed()
+
+
+def test_async_session_download_stream(range_server, tmpdir):  # noqa: F811
+    filepath = str(tmpdir.join("track.mp3"))
+
+    async def download():
+        async with aio.AsyncSession() as aio_session:
+            response = await aio_session.get(range_server + "/no-ranges")
+            await aio_session.download_stream(range_server + "/no-ranges", filepath)
+        return response
+
+    response = asyncio.run(download())
+    assert response.status_code == 200
+    with open(filepath, "rb") as f:
+        assert f.read() == RangeHandler.content
+
+
+def test_async_session_segmented_download(range_server, tmpdir, monkeypatch):  # noqa: F811
+    monkeypatch.setattr(internals, "SEGMENT_MIN_SIZE", 1024)
+    download_range = internals._download_range
+    ranges = []
+
+    def spy(url, byte_range, writer, session):
+        ranges.append(byte_range)
+        download_range(url, byte_range, writer, session)
+    monkeypatch.setattr(internals, "_download_range", spy)
+    filepath = str(tmpdir.join("track.mp3"))
+
+    async def download():
+        async with aio.AsyncSession() as aio_session:
+            await aio_session.download_stream(range_server + "/ranges", filepath, segments=4)
+
+    asyncio.run(download())
+    with open(filepath, "rb") as f:
+        assert f.read() == RangeHandler.content
+    assert len(ranges) == 4
+
+
+def test_async_session_refreshes_login(tmpdir, monkeypatch):
+    logins = []
+
+    def fake_login(username, password, session=None):
+        logins.append(username)
+        return {"_scribd_session": "session-{}".format(len(logins)), "_scribd_expire": str(int(time.time()) + 3600)}
+    monkeypatch.setattr(authorize, "login", fake_login)
+
+    def handler(request):
+        # The first login is rejected
+        if "_scribd_session=session-1" in request.headers.get("Cookie", ""):
+            return httpx.Response(403)
+        return httpx.Response(200, content=b"chapter")
+
+    credentials_file = tmpdir.join("credentials.txt")
+    credentials_file.write("user@mail.com\npassword\n")
+    scribd_session = session.ScribdSession(cookies={})
+    premium_login = authorize.set_credentials(str(credentials_file), session=scribd_session)
+    filepath = str(tmpdir.join("image.jpg"))
+
+    async def download():
+        async with aio.AsyncSession(scribd_session) as aio_session:
+            await aio_session._client.aclose()
+            aio_session._client = httpx.AsyncClient(cookies=scribd_session.cookies,
+                                                    transport=httpx.MockTransport(handler))
+            premium_login._logged_in_at = 0
+            response = await aio_session.get("https://www.scribd.com/read/1")
+            premium_login._use({"_scribd_session": "session-1", "_scribd_expire": str(int(time.time()) + 3600)})
+            premium_login._logged_in_at = 0
+            await aio_session.download_stream("https://www.scribd.com/image.jpg", filepath)
+        return response
+
+    assert asyncio.run(download()).text == "chapter"
+    with open(filepath, "rb") as f:
+        assert f.read() == b"chapter"
+    assert logins == ["user@mail.com"] * 3
+
+
+def test_async_transport_used_over_mounted_adapter():
+    class CustomAdapter(requests.adapters.HTTPAdapter):
+        pass
+
+    scribd_session = session.ScribdSession()
+    scribd_session.mount("https://", CustomAdapter())
+    scribd_session.async_transport = httpx.MockTransport(lambda request: httpx.Response(200, content=b"mocked"))
+
+    async def get():
+        async with aio.AsyncSession(scribd_session) as aio_session:
+            return await aio_session.get("https://www.scribd.com/")
+
+    assert asyncio.run(get()).text == "mocked"
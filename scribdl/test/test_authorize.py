@@ -0,0 +1,143 @@
+import io
+import json
+import threading
+import time
+
+import requests
+
+from .. import authorize
+from .. import session
+from .. import tokens
+
+import pytest
+
+VALID_EXPIRE = str(int(time.time()) + 3600)
+
+
+@pytest.fixture
+def logins(monkeypatch):
+    calls = []
+    def fake_login(username, password, session=None):
+        calls.append(username)
+        return {"_scribd_session": "session-{}".format(len(calls)), "_scribd_expire": VALID_EXPIRE}
+    monkeypatch.setattr(authorize, "login", fake_login)
+    return calls
+
+
+@pytest.fixture
+def credentials_file(tmpdir):
+    path = tmpdir.join("credentials.txt")
+    path.write("user@mail.com\npassword\n")
+    return str(path)
+
+
+@pytest.fixture
+def credentials_cache(tmpdir):
+    return authorize.CredentialsCache(str(tmpdir.join("cache", "credentials.json")))
+
+
+def session_cookie(scribd_session):
+    return scribd_session.cookies.get("_scribd_session", domain=session.PREMIUM_COOKIE_DOMAIN)
+
+
+def test_login_saved_and_reused(logins, credentials_file, credentials_cache):
+    first = session.ScribdSession(cookies={})
+    authorize.set_credentials(credentials_file, session=first, cache=credentials_cache)
+    second = session.ScribdSession(cookies={})
+    authorize.set_credentials(credentials_file, session=second, cache=credentials_cache)
+    assert logins == ["user@mail.com"]
+    assert session_cookie(second) == "session-1"
+    with open(credentials_cache.path) as in_file:
+        assert json.load(in_file)["user@mail.com"]["_scribd_session"] == "session-1"
+
+
+def test_expired_cookies_not_reused(logins, credentials_file, credentials_cache):
+    credentials_cache.save("user@mail.com", {"_scribd_session": "old", "_scribd_expire": "1547904862"})
+    scribd_session = session.ScribdSession(cookies={})
+    authorize.set_credentials(credentials_file, session=scribd_session, cache=credentials_cache)
+    assert logins == ["user@mail.com"]
+    assert session_cookie(scribd_session) == "session-1"
+
+
+def test_rejected_cookies_refreshed_once(logins, credentials_file, monkeypatch):
+    scribd_session = session.ScribdSession(cookies={})
+    premium_login = authorize.set_credentials(credentials_file, session=scribd_session)
+    premium_login._logged_in_at = 0
+
+    def fake_request(self, method, url, **kwargs):
+        response = requests.Response()
+        response.raw = io.BytesIO()
+        response.status_code = 403 if session_cookie(self) == "session-1" else 200
+        return response
+    monkeypatch.setattr(session.requests.Session, "request", fake_request)
+
+    statuses = []
+    threads = [threading.Thread(target=lambda: statuses.append(scribd_session.get("https://www.scribd.com/").status_code))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert statuses == [200] * 8
+    assert logins == ["user@mail.com"] * 2
+
+
+def test_recent_login_not_refreshed(logins, credentials_file, monkeypatch):
+    scribd_session = session.ScribdSession(cookies={})
+    authorize.set_credentials(credentials_file, session=scribd_session)
+
+    def fake_request(self, method, url, **kwargs):
+        response = requests.Response()
+        response.raw = io.BytesIO()
+        response.status_code = 403
+        return response
+    monkeypatch.setattr(session.requests.Session, "request", fake_request)
+
+    assert scribd_session.get("https://www.scribd.com/").status_code == 403
+    assert scribd_session.get("https://example.com/").status_code == 403
+    assert logins == ["user@mail.com"]
+
+
+def test_cached_cookies_not_refreshed(logins, credentials_file, credentials_cache, monkeypatch):
+    credentials_cache.save("user@mail.com", {"_scribd_session": "cached", "_scribd_expire": str(int(time.time()) + 3600)})
+    scribd_session = session.ScribdSession(cookies={})
+    authorize.set_credentials(credentials_file, session=scribd_session, cache=credentials_cache)
+
+    def fake_request(self, method, url, **kwargs):
+        response = requests.Response()
+        response.raw = io.BytesIO()
+        response.status_code = 403
+        return response
+    monkeypatch.setattr(session.requests.Session, "request", fake_request)
+
+    assert scribd_session.get("https://www.scribd.com/").status_code == 403
+    assert logins == []
+    assert session_cookie(scribd_session) == "cached"
+
+
+def test_token_endpoints_not_refreshed(logins, credentials_file, monkeypatch):
+    scribd_session = session.ScribdSession(cookies={})
+    premium_login = authorize.set_credentials(credentials_file, session=scribd_session)
+    premium_login._logged_in_at = 0
+
+    def fake_request(self, method, url, **kwargs):
+        response = requests.Response()
+        response.raw = io.BytesIO()
+        response.status_code = 403
+        return response
+    monkeypatch.setattr(session.requests.Session, "request", fake_request)
+
+    assert scribd_session.get("https://www.scribd.com/scepub/1/chapters/2/contents.json").status_code == 403
+    assert scribd_session.post("https://www.scribd.com/read2/1/access_token").status_code == 403
+    assert logins == ["user@mail.com"]
+
+
+def test_new_login_clears_tokens(logins, credentials_file):
+    scribd_session = session.ScribdSession(cookies={})
+    premium_login = authorize.set_credentials(credentials_file, session=scribd_session)
+    premium_login._logged_in_at = 0
+    token_manager = tokens.get_token_manager(scribd_session)
+    token_manager._tokens["csrf"] = ("token", time.time(), 60)
+
+    assert premium_login.refresh("session-1")
+    assert token_manager._tokens == {}
@@ -0,0 +1,57 @@
+from .. import batch
+import io
+import threading
+import time
+
+import pytest
+
+
+def test_read_urls():
+    in_file = io.StringIO("https://www.scribd.com/document/1/a\n\n# comment\n  https://www.scribd.com/book/2/b  \n")
+    assert list(batch.read_urls(in_file)) == ["https://www.scribd.com/document/1/a",
+                                              "https://www.scribd.com/book/2/b"]
+
+
+class TestBatchScheduler:
+    def test_concurrency_limits(self):
+        lock = threading.Lock()
+        running = {"total": 0, "max_total": 0, "max_per_host": {}}
+        per_host = {}
+
+        def job(url, session=None):
+            host = url.split("/")[2]
+            with lock:
+                running["total"] += 1
+                per_host[host] = per_host.get(host, 0) + 1
+                running["max_total"] = max(running["max_total"], running["total"])
+                running["max_per_host"][host] = max(running["max_per_host"].get(host, 0), per_host[host])
+            time.sleep(0.02)
+            with lock:
+                running["total"] -= 1
+                per_host[host] -= 1
+            return []
+
+        urls = ["https://a.example.com/{}".format(i) for i in range(6)]
+        urls += ["https://b.example.com/{}".format(i) for i in range(6)]
+        scheduler = batch.BatchScheduler(workers=3, per_host=2, job=job)
+        results = scheduler.run(urls)
+        assert len(results) == 12
+        assert running["max_total"] <= 3
+        assert max(running["max_per_host"].values()) <= 2
+
+    def test_result_records(self, tmpdir):
+        output = tmpdir.join("out.md")
+        output.write("hello")
+
+        def job(url, session=None):
+            if "broken" in url:
+                raise ValueError("no such document")
+            return [str(output)]
+
+        scheduler = batch.BatchScheduler(job=job)
+        records = {record["url"]: record for record in scheduler.run(["https://x.com/ok", "https://x.com/broken"])}
+        assert records["https://x.com/ok"]["status"] == "ok"
+        assert records["https://x.com/ok"]["bytes"] == 5
+        assert records["https://x.com/broken"]["status"] == "error"
+        assert records["https://x.com/broken"]["error"] == "ValueError: no such document"
+        assert "duration" in records["https://x.com/broken"]
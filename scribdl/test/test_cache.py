@@ -0,0 +1,68 @@
+from .. import cache
+
+import pytest
+
+
+class FakeResponse:
+    def __init__(self, status_code, content=b"", headers=None):
+        self.status_code = status_code
+        self.content = content
+        self.encoding = "utf-8"
+        self.headers = headers or {}
+
+    @property
+    def text(self):
+        return self.content.decode(self.encoding)
+
+
+class FakeSession:
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    def get(self, url, headers=None):
+        self.requests.append((url, headers))
+        return self.responses.pop(0)
+
+
+@pytest.fixture
+def response_cache(tmpdir):
+    return cache.ResponseCache(str(tmpdir.join("http.sqlite")))
+
+
+def test_cache_key_drops_token():
+    url = "https://www.scribd.com/scepub/1/chapters/2/contents.json?token=abc"
+    assert cache.cache_key(url) == "https://www.scribd.com/scepub/1/chapters/2/contents.json"
+
+
+class TestResponseCache:
+    def test_fresh_hit_skips_network(self, response_cache):
+        session = FakeSession(FakeResponse(200, b"chapter"))
+        url = "https://www.scribd.com/scepub/1/chapters/1/contents.json?token={}"
+        response_cache.fetch(session, url.format("old"), "chapter")
+        response = response_cache.fetch(session, url.format("new"), "chapter")
+        assert response.text == "chapter"
+        assert len(session.requests) == 1
+
+    def test_stale_entry_revalidated(self, response_cache):
+        response_cache.ttls["page"] = 0
+        session = FakeSession(FakeResponse(200, b"<html>", {"ETag": '"v1"'}),
+                              FakeResponse(304))
+        response_cache.fetch(session, "https://www.scribd.com/document/1/a", "page")
+        response = response_cache.fetch(session, "https://www.scribd.com/document/1/a", "page")
+        assert response.text == "<html>"
+        assert session.requests[1][1]["If-None-Match"] == '"v1"'
+
+    def test_errors_not_stored(self, response_cache):
+        session = FakeSession(FakeResponse(403, b"denied"), FakeResponse(200, b"ok"))
+        response_cache.fetch(session, "https://www.scribd.com/document/1/a", "page")
+        assert response_cache.fetch(session, "https://www.scribd.com/document/1/a", "page").text == "ok"
+
+    def test_lru_eviction(self, response_cache):
+        response_cache.max_size = 10
+        session = FakeSession(*[FakeResponse(200, b"12345") for _ in range(4)])
+        for page in range(3):
+            response_cache.fetch(session, "https://x.com/{}".format(page), "page")
+        # Page 0 was evicted to make room for page 2
+        response_cache.fetch(session, "https://x.com/0", "page")
+        assert len(session.requests) == 4
@@ -0,0 +1,48 @@
+from .. import classify
+
+import pytest
+
+
+CLASSIFY_URL_TEST_TABLE = [
+    ("https://www.scribd.com/audiobook/237606860/100-Ways", classify.AUDIOBOOK),
+    ("https://www.scribd.com/read/262694921/Acting-The-First-Six-Lessons", classify.BOOK),
+    ("https://www.scribd.com/book/262694921/Acting-The-First-Six-Lessons", classify.BOOK),
+    ("https://www.scribd.com/document/96882378/Trademark-License-Agreement", classify.DOCUMENT),
+    ("https://scribd.com/doc/17142797/Case-in-Point", classify.DOCUMENT),
+    ("https://www.scribd.com/12345/unknown", None),
+]
+
+
+@pytest.mark.parametrize("url, expected", CLASSIFY_URL_TEST_TABLE)
+def test_classify_url(url, expected):
+    assert classify.classify_url(url) == expected
+
+
+def test_classify_page():
+    book_page = '<html><head></head><body class="autogen_class_views_layouts_book_web other" id="x">'
+    document_page = "<html><body data-x='1' class='autogen_class_views_layouts_document_web'>"
+    assert classify.classify_page(book_page) == classify.BOOK
+    assert classify.classify_page(document_page) == classify.DOCUMENT
+
+
+class FakeSession:
+    def __init__(self, text):
+        self.text = text
+
+    def cached_get(self, url, resource):
+        return self
+
+
+class TestIsImageDocument:
+    def test_text_on_page(self):
+        assert not classify.is_image_document('<div><span class="a">Hello</span></div>')
+
+    def test_text_in_jsonp(self):
+        page = '<script type="text/javascript">var p = "https://html.scribdassets.com/pages/2.jsonp";</script>'
+        session = FakeSession('window.page2_callback(["<span class=\\"a\\">Hello</span>"]);')
+        assert not classify.is_image_document(page, session=session)
+
+    def test_images_in_jsonp(self):
+        page = '<script type="text/javascript">var p = "https://html.scribdassets.com/pages/2.jsonp";</script>'
+        session = FakeSession('window.page2_callback(["<img class=\\"absimg\\" src=\\"x.jpg\\"/>"]);')
+        assert classify.is_image_document(page, session=session)
@@ -26,6 +26,30 @@ class TestCommandLine:
         parsed_args = parser.parse_args(args)
         assert parsed_args.images and not parsed_args.pdf
 
+    def test_text_url(self):
+        args = []
+        args.append("-t")
+        args.append("https://example.com/")
+        parser = command_line.get_arguments()
+        parsed_args = parser.parse_args(args)
+        assert parsed_args.images is False
+
+    def test_images_detected_by_default(self):
+        args = []
+        args.append("https://example.com/")
+        parser = command_line.get_arguments()
+        parsed_args = parser.parse_args(args)
+        assert parsed_args.images is None
+
+    def test_image_text_url(self):
+        args = []
+        args.append("-i")
+        args.append("-t")
+        args.append("https://example.com/")
+        parser = command_line.get_arguments()
+        with pytest.raises(SystemExit):
+            parser.parse_args(args)
+
     def test_pdf_url(self):
         args = []
         args.append("-p")
@@ -42,3 +66,52 @@ class TestCommandLine:
         parser = command_line.get_arguments()
         parsed_args = parser.parse_args(args)
         assert parsed_args.images and parsed_args.pdf
+
+    def test_epub_url(self):
+        args = []
+        args.append("-e")
+        args.append("https://example.com/")
+        parser = command_line.get_arguments()
+        parsed_args = parser.parse_args(args)
+        assert parsed_args.epub and not parsed_args.pdf
+
+    def test_jobs_url(self):
+        args = []
+        args.append("-j")
+        args.append("8")
+        args.append("https://example.com/")
+        parser = command_line.get_arguments()
+        parsed_args = parser.parse_args(args)
+        assert parsed_args.jobs == 8
+
+    def test_default_jobs(self):
+        args = ["https://example.com/"]
+        parser = command_line.get_arguments()
+        parsed_args = parser.parse_args(args)
+        assert parsed_args.jobs == 1
+
+
+class TestBatchCommandLine:
+    def test_empty(self):
+        parser = command_line.get_batch_arguments()
+        with pytest.raises(SystemExit):
+            parser.parse_args([])
+
+    def test_stdin_workers(self):
+        parser = command_line.get_batch_arguments()
+        parsed_args = parser.parse_args(["-w", "8", "--per-host", "2", "-"])
+        assert parsed_args.input == "-"
+        assert parsed_args.workers == 8 and parsed_args.per_host == 2
+
+
+class TestServerCommandLine:
+    def test_defaults(self):
+        parser = command_line.get_server_arguments()
+        parsed_args = parser.parse_args([])
+        assert parsed_args.host == "127.0.0.1" and parsed_args.port == 8123
+        assert parsed_args.workers == 4
+
+    def test_port_workers(self):
+        parser = command_line.get_server_arguments()
+        parsed_args = parser.parse_args(["--port", "9000", "-w", "16"])
+        assert parsed_args.port == 9000 and parsed_args.workers == 16
@@ -1,4 +1,6 @@
 from ..downloader import Downloader
+from ..content.document import ScribdTextualDocument
+from .. import aio
 import os
 
 import pytest
@@ -45,3 +47,23 @@ def test_book_download(cwd_to_tmpdir, monkeypatch):
     md_book.to_pdf()
     assert os.path.getsize(md_book.pdf_path) in range(200000, 2500000)
 
+
+
+def test_page_fetched_once(cwd_to_tmpdir, monkeypatch):
+    fetched = []
+
+    class FakeResponse:
+        text = ('<html><body class="autogen_class_views_layouts_document_web">'
+                '<h1>Fake Document</h1><span class="a">Some text</span></body></html>')
+
+    async def cached_get(self, url, resource):
+        fetched.append(url)
+        return FakeResponse()
+
+    monkeypatch.setattr(aio.AsyncSession, "cached_get", cached_get)
+    monkeypatch.setattr(ScribdTextualDocument, "download", lambda self: self.filename)
+    # Neither the URL nor the page say what kind of document this is
+    text_doc_url = "https://www.scribd.com/fake/123456789/Fake-Document"
+    md_doc = Downloader(text_doc_url).download()
+    assert md_doc.input_content == "Fake_Document.md"
+    assert fetched == [text_doc_url]
@@ -0,0 +1,36 @@
+from .. import images
+
+import os
+
+from PIL import Image
+import pytest
+
+
+def save_page(path, color="white", size=(300, 400), dpi=300):
+    Image.new("RGB", size, color).save(path, quality=95, dpi=(dpi, dpi))
+    return path
+
+
+def test_downscale_keeps_printed_size(tmpdir):
+    path = save_page(str(tmpdir.join("page.jpg")))
+    images.optimize_image(path, max_dpi=150)
+    with Image.open(path) as image:
+        assert image.size == (150, 200)
+        assert round(image.info["dpi"][0]) == 150
+
+
+def test_low_resolution_page_untouched(tmpdir):
+    path = save_page(str(tmpdir.join("page.jpg")), dpi=100)
+    before = images.file_digest(path)
+    assert images.optimize_image(path, max_dpi=150) == before
+
+
+def test_stage_links_duplicate_pages(tmpdir):
+    pages = [save_page(str(tmpdir.join("page_{}.jpg".format(number))), color)
+             for number, color in enumerate(["white", "black", "white"])]
+    with images.ImageStage(jobs=2) as stage:
+        digests = [stage.process(page) for page in pages]
+    assert digests[0] == digests[2] != digests[1]
+    assert stage.duplicates == 1
+    if not os.path.samefile(pages[0], pages[2]):
+        pytest.skip("filesystem doesn't support hard links")
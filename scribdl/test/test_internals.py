@@ -1,4 +1,10 @@
 from .. import internals
+from .. import resume
+
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+import os
+import threading
 
 import pytest
 
@@ -13,3 +19,85 @@ SANITIZE_TITLE_TEST_TABLE = [
 @pytest.mark.parametrize("input_str, expected_str", SANITIZE_TITLE_TEST_TABLE)
 def test_sanitize_title(input_str, expected_str):
     assert internals.sanitize_title(input_str) == expected_str
+
+
+@pytest.mark.parametrize("jobs", [1, 4])
+def test_map_concurrently_keeps_order(jobs):
+    assert internals.map_concurrently(lambda x: x * 2, range(10), jobs=jobs) == list(range(0, 20, 2))
+
+
+def test_imap_concurrently_yields_in_order():
+    results = internals.imap_concurrently(lambda x: x * 2, range(10), jobs=4)
+    assert next(results) == 0
+    assert list(results) == list(range(2, 20, 2))
+
+
+class RangeHandler(BaseHTTPRequestHandler):
+    content = bytes(range(256)) * 4096
+
+    def do_GET(self):
+        byte_range = self.headers.get("Range")
+        if byte_range and self.path == "/ranges":
+            start, end = byte_range.replace("bytes=", "").split("-")
+            start, end = int(start), min(int(end or len(self.content)), len(self.content) - 1)
+            body = self.content[start:end + 1]
+            self.send_response(206)
+            self.send_header("Content-Range", "bytes {}-{}/{}".format(start, end, len(self.content)))
+        else:
+            body = self.content
+            self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope="module")
+def range_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), RangeHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield "http://127.0.0.1:{}".format(server.server_port)
+    server.shutdown()
+
+
+@pytest.mark.parametrize("path", ["/ranges", "/no-ranges"])
+def test_segmented_download_stream(range_server, tmpdir, monkeypatch, path):
+    monkeypatch.setattr(internals, "SEGMENT_MIN_SIZE", 1024)
+    filepath = str(tmpdir.join("track.mp3"))
+    internals.download_stream(range_server + path, filepath, segments=4)
+    with open(filepath, "rb") as f:
+        assert f.read() == RangeHandler.content
+
+
+def test_probe_content_length(range_server):
+    assert internals.probe_content_length(range_server + "/ranges") == len(RangeHandler.content)
+    assert internals.probe_content_length(range_server + "/no-ranges") is None
+
+
+def test_download_stream_resumes_part_file(range_server, tmpdir):
+    filepath = str(tmpdir.join("track.mp3"))
+    with open(filepath + ".part", "wb") as f:
+        f.write(RangeHandler.content[:1000])
+    internals.download_stream(range_server + "/ranges", filepath)
+    with open(filepath, "rb") as f:
+        assert f.read() == RangeHandler.content
+    assert not os.path.exists(filepath + ".part")
+
+
+def test_segmented_download_resumes_from_manifest(range_server, tmpdir, monkeypatch):
+    monkeypatch.setattr(internals, "SEGMENT_MIN_SIZE", 1024)
+    filepath = str(tmpdir.join("track.mp3"))
+    size = len(RangeHandler.content)
+    half = size // 2
+    with open(filepath + ".part", "wb") as f:
+        f.write(RangeHandler.content[:100])
+        f.truncate(size)
+    manifest = resume.Manifest(filepath + ".part.manifest.json")
+    manifest.update(size=size, segments=2, progress={"0": 100, str(half): half})
+    internals.download_stream(range_server + "/ranges", filepath, segments=2)
+    with open(filepath, "rb") as f:
+        assert f.read() == RangeHandler.content
+    assert not os.path.exists(filepath + ".part.manifest.json")
@@ -0,0 +1,85 @@
+import json
+
+import requests
+
+from .. import metrics
+from .. import session
+
+import pytest
+
+
+@pytest.fixture
+def registry():
+    return metrics.Registry(buckets=(0.1, 1, float("inf")))
+
+
+def test_counters_by_labels(registry):
+    registry.inc("scribdl_requests_total", endpoint="chapter")
+    registry.inc("scribdl_requests_total", endpoint="chapter")
+    registry.inc("scribdl_requests_total", 5, endpoint="page")
+    counters = registry.snapshot()["counters"]
+    assert [(counter["labels"]["endpoint"], counter["value"]) for counter in counters] == [("chapter", 2), ("page", 5)]
+
+
+def test_histogram_buckets_cumulative(registry):
+    for value in (0.05, 0.5, 0.5, 3):
+        registry.observe("scribdl_parse_seconds", value, kind="jsonp")
+    histogram, = registry.snapshot()["histograms"]
+    assert histogram["count"] == 4 and histogram["sum"] == pytest.approx(4.05)
+    assert histogram["buckets"] == {"0.1": 1, "1.0": 3, "+Inf": 4}
+
+
+def test_prometheus_format(registry):
+    registry.inc("scribdl_retries_total", reason="token")
+    registry.observe("scribdl_conversion_seconds", 0.5, kind="images")
+    text = registry.to_prometheus()
+    assert "# TYPE scribdl_retries_total counter\nscribdl_retries_total{reason=\"token\"} 1\n" in text
+    assert 'scribdl_conversion_seconds_bucket{kind="images",le="1.0"} 1\n' in text
+    assert 'scribdl_conversion_seconds_count{kind="images"} 1\n' in text
+
+
+def test_dump(registry, tmpdir):
+    registry.inc("scribdl_items_total", kind="chapter")
+    path = str(tmpdir.join("metrics.json"))
+    registry.dump(path)
+    with open(path) as in_file:
+        assert json.load(in_file)["counters"][0]["value"] == 1
+
+
+@pytest.mark.parametrize("url, endpoint", [
+    ("https://www.scribd.com/scepub/1/chapters/2/contents.json?token=abc", "chapter"),
+    ("https://www.scribd.com/scepub/1/chapters/2/images/3.jpg?token=abc", "chapter_image"),
+    ("https://html.scribdassets.com/1/pages/2-abc.jsonp", "jsonp"),
+    ("https://html.scribdassets.com/1/images/2-abc.jpg", "page_image"),
+    ("https://www.scribd.com/read2/1/access_token", "access_token"),
+    ("https://www.scribd.com/document/1/Title", "page"),
+    ("https://example.com/", "other"),
+])
+def test_endpoint(url, endpoint):
+    assert metrics.endpoint(url) == endpoint
+
+
+def test_session_requests_measured(monkeypatch):
+    monkeypatch.setattr(metrics, "REGISTRY", metrics.Registry())
+
+    def fake_request(self, method, url, **kwargs):
+        response = requests.Response()
+        response.status_code = 200
+        response._content = b"12345"
+        return response
+    monkeypatch.setattr(session.requests.Session, "request", fake_request)
+
+    session.ScribdSession().get("https://www.scribd.com/document/1/Title")
+    snapshot = metrics.REGISTRY.snapshot()
+    counters = {counter["name"]: counter for counter in snapshot["counters"]}
+    assert counters["scribdl_requests_total"]["labels"] == {"endpoint": "page", "method": "GET", "status": "200"}
+    assert counters["scribdl_response_bytes_total"]["value"] == 5
+    assert snapshot["histograms"][0]["name"] == "scribdl_request_seconds"
+
+
+def test_mixed_label_types(registry):
+    registry.inc("scribdl_requests_total", endpoint="page", status="error")
+    registry.inc("scribdl_requests_total", endpoint="page", status=200)
+    counters = registry.snapshot()["counters"]
+    assert [counter["labels"]["status"] for counter in counters] == ["200", "error"]
+    assert 'scribdl_requests_total{endpoint="page",status="200"} 1\n' in registry.to_prometheus()
@@ -0,0 +1,26 @@
+from .. import parsers
+from .. import exceptions
+import json
+
+import pytest
+
+
+def make_jsonp_page(page_number, html):
+    return "window.page{}_callback({});".format(page_number, json.dumps([html]))
+
+
+def test_parse_jsonp_page_two_digit_page_number():
+    response = make_jsonp_page(12, '<div>"quoted" \\ text</div>')
+    assert parsers.parse_jsonp_page(response) == (12, '<div>"quoted" \\ text</div>')
+
+
+def test_parse_jsonp_page_rejects_garbage():
+    with pytest.raises(exceptions.ScribdFetchError):
+        parsers.parse_jsonp_page("<html>Not Found</html>")
+
+
+def test_extract_span_text():
+    html = ('<div><span class="a">First &amp; line\n</span>'
+            '<span class="b">skipped</span>'
+            '<span class="a x">Second <span class="w">nested</span> line</span></div>')
+    assert parsers.extract_span_text(html) == ["First & line", "Second nested line"]
@@ -0,0 +1,90 @@
+from ..pdf_converter import ConvertToPDF
+from ..pdf_converter import StreamingPDFWriter
+from ..pdf_converter import merge_chapter_pdfs
+from ..pdf_converter import split_chapters
+
+import os
+import re
+
+from PIL import Image
+import pytest
+
+
+@pytest.fixture
+def images(tmpdir):
+    paths = []
+    for number, (mode, size) in enumerate([("RGB", (200, 100)), ("L", (30, 40)), ("RGBA", (16, 16))]):
+        extension = "png" if mode == "RGBA" else "jpg"
+        path = str(tmpdir.join("page_{}.{}".format(number, extension)))
+        Image.new(mode, size).save(path, dpi=(150, 150))
+        paths.append(path)
+    return paths
+
+
+def test_images_to_pdf(tmpdir, images):
+    pdf_path = str(tmpdir.join("images.pdf"))
+    ConvertToPDF(images, pdf_path).to_pdf()
+    with open(pdf_path, "rb") as pdf_file:
+        pdf = pdf_file.read()
+    assert pdf.startswith(b"%PDF-1.4") and pdf.rstrip().endswith(b"%%EOF")
+    assert b"/Count 3" in pdf
+    assert pdf.count(b"/DCTDecode") == 2 and pdf.count(b"/FlateDecode") == 1
+    # 200x100 pixels at 150 DPI
+    assert b"/MediaBox [0 0 96.0000 48.0000]" in pdf
+
+
+def test_identical_pages_share_one_image(tmpdir, images):
+    pdf_path = str(tmpdir.join("images.pdf"))
+    ConvertToPDF([images[0], images[1], images[0]], pdf_path).to_pdf()
+    with open(pdf_path, "rb") as pdf_file:
+        pdf = pdf_file.read()
+    assert b"/Count 3" in pdf
+    assert pdf.count(b"/Subtype /Image") == 2
+
+
+def test_xref_offsets_point_at_objects(tmpdir, images):
+    pdf_path = str(tmpdir.join("images.pdf"))
+    ConvertToPDF(images, pdf_path).to_pdf()
+    with open(pdf_path, "rb") as pdf_file:
+        pdf = pdf_file.read()
+    xref_offset = int(pdf.rsplit(b"startxref", 1)[1].split()[0])
+    entries = re.findall(rb"(\d{10}) 00000 n", pdf[xref_offset:])
+    for number, offset in enumerate(entries, 1):
+        assert pdf[int(offset):].startswith("{} 0 obj".format(number).encode())
+
+
+def test_failed_writer_removes_partial_pdf(tmpdir, images):
+    pdf_path = str(tmpdir.join("images.pdf"))
+    with pytest.raises(RuntimeError):
+        with StreamingPDFWriter(pdf_path) as writer:
+            writer.add_image(images[0])
+            raise RuntimeError
+    assert not os.path.exists(pdf_path)
+
+
+def test_split_chapters():
+    markdown = ("preface\n\n<!-- chapter 1 -->\n\nfirst\n\n"
+                "<!-- chapter 2 -->\n\nsecond\n\n")
+    assert split_chapters(markdown) == [
+        (1, "preface\n\n<!-- chapter 1 -->\n\nfirst\n\n"),
+        (2, "<!-- chapter 2 -->\n\nsecond\n\n"),
+    ]
+    assert split_chapters("no markers") == [(None, "no markers")]
+
+
+def test_merge_chapter_pdfs_keeps_chapter_outline(tmpdir, images):
+    pypdf = pytest.importorskip("pypdf")
+    chapter_pdfs = []
+    for chapter, pages in [(1, images[:2]), (2, images[2:])]:
+        chapter_pdf = str(tmpdir.join("{}.pdf".format(chapter)))
+        ConvertToPDF(pages, chapter_pdf).to_pdf()
+        chapter_pdfs.append((chapter, chapter_pdf))
+
+    pdf_path = str(tmpdir.join("book.pdf"))
+    merge_chapter_pdfs(chapter_pdfs, pdf_path)
+    reader = pypdf.PdfReader(pdf_path)
+    assert len(reader.pages) == 3
+    assert [(item.title, reader.get_destination_page_number(item)) for item in reader.outline] == [
+        ("Chapter 1", 0),
+        ("Chapter 2", 2),
+    ]
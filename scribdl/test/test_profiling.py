@@ -0,0 +1,95 @@
+import asyncio
+import json
+import pstats
+import threading
+
+from .. import metrics
+from .. import profiling
+
+import pytest
+
+
+def _spans(path):
+    with open(path) as trace_file:
+        events = json.load(trace_file)["traceEvents"]
+    return [event for event in events if event["ph"] == "X"]
+
+
+def test_trace_of_timers_and_spans(tmpdir):
+    trace_path = str(tmpdir.join("trace.json"))
+    with profiling.Profiler(trace_path):
+        with profiling.span("ScribdBook.download"):
+            with metrics.timer("scribdl_parse_seconds", kind="chapter"):
+                pass
+            thread = threading.Thread(target=profiling.record, args=("worker", "test", 0, 1))
+            thread.start()
+            thread.join()
+    spans = {span["name"]: span for span in _spans(trace_path)}
+    assert set(spans) == {"ScribdBook.download", "parse chapter", "worker"}
+    assert spans["parse chapter"]["args"] == {"kind": "chapter"}
+    outer, inner = spans["ScribdBook.download"], spans["parse chapter"]
+    assert outer["ts"] <= inner["ts"] and inner["ts"] + inner["dur"] <= outer["ts"] + outer["dur"]
+    assert spans["worker"]["tid"] != outer["tid"]
+
+
+def test_concurrent_tasks_get_own_timelines(tmpdir):
+    async def fetch(number):
+        with profiling.span("fetch"):
+            await asyncio.sleep(0.01)
+            with profiling.span("parse"):
+                pass
+
+    async def main():
+        await asyncio.gather(*(fetch(number) for number in range(4)))
+
+    trace_path = str(tmpdir.join("trace.json"))
+    with profiling.Profiler(trace_path):
+        asyncio.run(main())
+    timelines = {}
+    for span in _spans(trace_path):
+        timelines.setdefault(span["tid"], []).append(span)
+    assert len(timelines) == 4
+    for spans in timelines.values():
+        inner, outer = sorted(spans, key=lambda span: span["dur"])
+        assert outer["ts"] <= inner["ts"] and inner["ts"] + inner["dur"] <= outer["ts"] + outer["dur"]
+    with open(trace_path) as trace_file:
+        names = [event["args"]["name"] for event in json.load(trace_file)["traceEvents"] if event["ph"] == "M"]
+    assert all(name.startswith("Task-") and name.endswith(" on MainThread") for name in names)
+
+
+def test_nothing_recorded_when_off(tmpdir):
+    with profiling.span("idle"):
+        pass
+    trace_path = str(tmpdir.join("trace.json"))
+    with profiling.Profiler(trace_path):
+        pass
+    assert _spans(trace_path) == []
+
+
+def test_traced_keeps_result(tmpdir):
+    @profiling.traced("double")
+    def double(value):
+        return value * 2
+
+    @profiling.traced("double_async")
+    async def double_async(value):
+        return value * 2
+
+    trace_path = str(tmpdir.join("trace.json"))
+    with profiling.Profiler(trace_path):
+        assert double(2) == 4
+        assert asyncio.run(double_async(2)) == 4
+    assert [span["name"] for span in _spans(trace_path)] == ["double", "double_async"]
+
+
+def test_cprofile_dump(tmpdir):
+    stats_path = str(tmpdir.join("stats.prof"))
+    with profiling.Profiler(str(tmpdir.join("trace.json")), stats_path):
+        sorted(range(100))
+    assert pstats.Stats(stats_path).total_calls > 0
+
+
+def test_one_profiler_at_a_time(tmpdir):
+    with profiling.Profiler(str(tmpdir.join("trace.json"))):
+        with pytest.raises(RuntimeError):
+            profiling.Profiler(str(tmpdir.join("other.json"))).__enter__()
@@ -0,0 +1,35 @@
+from .. import resume
+
+import pytest
+
+
+@pytest.fixture
+def manifest(tmpdir):
+    return resume.Manifest(str(tmpdir.join("out.md.manifest.json")))
+
+
+def test_manifest_roundtrip(manifest):
+    manifest.update(completed=3, offset=120)
+    reloaded = resume.Manifest(manifest.path)
+    assert reloaded.get("completed") == 3 and reloaded.get("offset") == 120
+    reloaded.remove()
+    assert not resume.Manifest(manifest.path)
+
+
+def test_restore_output_truncates_to_checkpoint(tmpdir, manifest):
+    filename = str(tmpdir.join("out.md"))
+    with open(filename, "w") as f:
+        f.write("page-1\n\npage-2 partial")
+    manifest.update(completed=1, offset=len("page-1\n\n"))
+    assert resume.restore_output(filename, manifest) == 1
+    with open(filename) as f:
+        assert f.read() == "page-1\n\n"
+
+
+def test_restore_output_without_checkpoint_starts_afresh(tmpdir, manifest):
+    filename = str(tmpdir.join("out.md"))
+    with open(filename, "w") as f:
+        f.write("left over from an earlier run")
+    assert resume.restore_output(filename, manifest) == 0
+    with open(filename) as f:
+        assert f.read() == ""
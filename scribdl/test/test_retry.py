@@ -0,0 +1,145 @@
+from .. import internals
+from .. import retry
+from .. import session
+
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+import threading
+import time
+
+import pytest
+
+
+class FakeResponse:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+@pytest.fixture
+def policy():
+    return retry.RetryPolicy(attempts=3, backoff=1, max_backoff=2, max_retry_after=60)
+
+
+class TestRetryPolicy:
+    def test_backoff_grows_and_is_capped(self, policy):
+        assert 0 <= policy.retry_delay("GET", "https://www.scribd.com/", 0) <= 1
+        assert 0 <= policy.retry_delay("GET", "https://www.scribd.com/", 1) <= 2
+        assert policy.retry_delay("GET", "https://www.scribd.com/", 2) is None
+
+    def test_retry_after_seconds(self, policy):
+        response = FakeResponse(503, {"Retry-After": "10"})
+        assert 10 <= policy.retry_delay("GET", "https://www.scribd.com/", 0, response) <= 11
+
+    def test_retry_after_date(self, policy):
+        response = FakeResponse(429, {"Retry-After": formatdate(time.time() + 30, usegmt=True)})
+        assert 25 <= policy.retry_delay("GET", "https://www.scribd.com/", 0, response) <= 32
+
+    def test_retry_after_too_long(self, policy):
+        response = FakeResponse(429, {"Retry-After": "3600"})
+        assert policy.retry_delay("GET", "https://www.scribd.com/", 0, response) is None
+
+    def test_other_statuses_not_retried(self, policy):
+        assert policy.retry_delay("GET", "https://www.scribd.com/", 0, FakeResponse(404)) is None
+
+    def test_post_only_retried_when_throttled(self, policy):
+        login_url = "https://www.scribd.com/login"
+        assert policy.retry_delay("POST", login_url, 0, FakeResponse(503)) is None
+        assert policy.retry_delay("POST", login_url, 0) is None
+        assert policy.retry_delay("POST", login_url, 0, FakeResponse(429)) is not None
+
+    def test_token_post_idempotent(self, policy):
+        token_url = "https://www.scribd.com/read2/123/access_token"
+        assert policy.retry_delay("POST", token_url, 0, FakeResponse(503)) is not None
+
+
+class TestRateLimiter:
+    def test_token_bucket(self):
+        limiter = retry.RateLimiter(rate=10, burst=2)
+        assert limiter.reserve() == 0
+        assert limiter.reserve() == 0
+        assert limiter.reserve() == pytest.approx(0.1, abs=0.02)
+        assert limiter.reserve() == pytest.approx(0.2, abs=0.02)
+
+    def test_unlimited_until_paused(self):
+        limiter = retry.RateLimiter()
+        assert limiter.reserve() == 0
+        limiter.pause(5)
+        assert limiter.reserve() == pytest.approx(5, abs=0.1)
+
+
+class FlakyHandler(BaseHTTPRequestHandler):
+    content = bytes(range(256)) * 1024
+    hits = {}
+
+    def do_GET(self):
+        hits = self.hits[self.path] = self.hits.get(self.path, 0) + 1
+        if self.path == "/unavailable-once" and hits == 1:
+            self.send_response(503)
+            self.send_header("Retry-After", "0")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if self.path == "/reset-once":
+            byte_range = self.headers.get("Range")
+            start = int(byte_range.replace("bytes=", "").rstrip("-")) if byte_range else 0
+            body = self.content[start:]
+            self.send_response(206 if start else 200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            if hits == 1:
+                # Drops the connection halfway through the body
+                self.wfile.write(body[:len(body) // 2])
+                self.wfile.flush()
+                self.close_connection = True
+                return
+            self.wfile.write(body)
+            return
+        self.send_response(200)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def do_POST(self):
+        self.hits[self.path] = self.hits.get(self.path, 0) + 1
+        self.send_response(503)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope="module")
+def flaky_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FlakyHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield "http://127.0.0.1:{}".format(server.server_port)
+    server.shutdown()
+
+
+@pytest.fixture
+def retrying_session():
+    return session.ScribdSession(retry_policy=retry.RetryPolicy(backoff=0))
+
+
+def test_session_retries_unavailable(flaky_server, retrying_session):
+    response = retrying_session.get(flaky_server + "/unavailable-once")
+    assert response.status_code == 200 and response.text == "ok"
+    assert FlakyHandler.hits["/unavailable-once"] == 2
+
+
+def test_session_doesnt_resend_post(flaky_server, retrying_session):
+    response = retrying_session.post(flaky_server + "/post", data="data")
+    assert response.status_code == 503
+    assert FlakyHandler.hits["/post"] == 1
+
+
+def test_download_stream_survives_reset(flaky_server, retrying_session, tmpdir):
+    filepath = str(tmpdir.join("track.mp3"))
+    internals.download_stream(flaky_server + "/reset-once", filepath, session=retrying_session)
+    with open(filepath, "rb") as f:
+        assert f.read() == FlakyHandler.content
+    assert FlakyHandler.hits["/reset-once"] == 2
@@ -0,0 +1,72 @@
+from .. import server
+
+import threading
+import time
+
+import pytest
+import requests
+
+
+@pytest.fixture
+def job_server():
+    calls = []
+
+    def job(url, session=None, **options):
+        calls.append((url, options))
+        if "broken" in url:
+            raise ValueError("no such document")
+        return []
+
+    job_queue = server.JobQueue(workers=2, job=job, jobs=1)
+    job_queue.start()
+    http_server = server.make_server(job_queue, port=0)
+    thread = threading.Thread(target=http_server.serve_forever, daemon=True)
+    thread.start()
+    yield "http://127.0.0.1:{}".format(http_server.server_port), calls
+    http_server.shutdown()
+    http_server.server_close()
+    job_queue.stop()
+
+
+def wait_for(base_url, job_id):
+    for _ in range(100):
+        record = requests.get("{}/jobs/{}".format(base_url, job_id)).json()
+        if record["status"] not in (server.QUEUED, server.RUNNING):
+            return record
+        time.sleep(0.01)
+    raise AssertionError("job didn't finish")
+
+
+def test_jobs_run_with_options(job_server):
+    base_url, calls = job_server
+    response = requests.post(base_url + "/jobs", json={"url": "https://www.scribd.com/book/1/a", "pdf": True})
+    assert response.status_code == 202
+    job_id = response.json()["id"]
+    assert response.headers["Location"] == "/jobs/" + job_id
+
+    record = wait_for(base_url, job_id)
+    assert record["status"] == "ok" and record["paths"] == []
+    assert calls == [("https://www.scribd.com/book/1/a", {"jobs": 1, "pdf": True})]
+    assert [job["id"] for job in requests.get(base_url + "/jobs").json()["jobs"]] == [job_id]
+
+
+def test_failed_job(job_server):
+    base_url, _ = job_server
+    response = requests.post(base_url + "/jobs", json={"url": "https://www.scribd.com/document/2/broken"})
+    record = wait_for(base_url, response.json()["id"])
+    assert record["status"] == "error"
+    assert record["error"] == "ValueError: no such document"
+
+
+def test_invalid_requests(job_server):
+    base_url, _ = job_server
+    assert requests.post(base_url + "/jobs", json={"pdf": True}).status_code == 400
+    assert requests.post(base_url + "/jobs", json={"url": "x", "shell": "rm"}).status_code == 400
+    assert requests.get(base_url + "/jobs/0123abc").status_code == 404
+
+
+def test_metrics_endpoint(job_server):
+    base_url, _ = job_server
+    response = requests.get(base_url + "/metrics")
+    assert response.status_code == 200
+    assert response.headers["Content-Type"].startswith("text/plain")
@@ -0,0 +1,41 @@
+from .. import session
+
+import pytest
+
+
+@pytest.fixture
+def scribd_session():
+    return session.ScribdSession(timeout=5,
+                                 pool_maxsize=4,
+                                 cookies={"_scribd_session": "abc"})
+
+
+class TestScribdSession:
+    def test_pool_size(self, scribd_session):
+        adapter = scribd_session.get_adapter("https://www.scribd.com/")
+        assert adapter._pool_maxsize == 4
+
+    def test_premium_cookies_scoped_to_scribd(self, scribd_session):
+        cookie, = list(scribd_session.cookies)
+        assert cookie.name == "_scribd_session"
+        assert cookie.domain == ".scribd.com"
+
+    def test_default_timeout(self, scribd_session, monkeypatch):
+        sent = {}
+        def fake_request(self, method, url, **kwargs):
+            sent.update(kwargs)
+            response = session.requests.Response()
+            response.status_code = 200
+            response._content = b""
+            return response
+        monkeypatch.setattr(session.requests.Session, "request", fake_request)
+        scribd_session.get("https://www.scribd.com/")
+        assert sent["timeout"] == 5
+
+
+def test_get_session_shared():
+    assert session.get_session() is session.get_session()
+
+
+def test_get_session_passed(scribd_session):
+    assert session.get_session(scribd_session) is scribd_session
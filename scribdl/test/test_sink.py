@@ -0,0 +1,22 @@
+from .. import sink
+
+
+def test_buffers_until_flush(tmpdir, capsys):
+    filename = str(tmpdir.join("out.md"))
+    with sink.TextSink(filename) as text_sink:
+        text_sink.write("first\n\n")
+        text_sink.write("second\n\n")
+        assert capsys.readouterr().out == ""
+        assert text_sink.tell() == len("first\n\nsecond\n\n")
+        assert capsys.readouterr().out == "first\n\nsecond\n\n"
+    with open(filename) as f:
+        assert f.read() == "first\n\nsecond\n\n"
+
+
+def test_quiet(tmpdir, capsys):
+    filename = str(tmpdir.join("out.md"))
+    with sink.TextSink(filename, quiet=True) as text_sink:
+        text_sink.write("hidden\n\n")
+    assert capsys.readouterr().out == ""
+    with open(filename) as f:
+        assert f.read() == "hidden\n\n"
@@ -0,0 +1,78 @@
+import threading
+import time
+
+from .. import tokens
+
+
+class CountingTokenManager(tokens.TokenManager):
+    def __init__(self, **kwargs):
+        super().__init__(session=object(), **kwargs)
+        self.fetched = []
+
+    def _fetch_csrf_token(self):
+        self.fetched.append("csrf")
+        return "csrf-{}".format(len(self.fetched))
+
+    def _fetch_access_token(self, book_id):
+        self.csrf_token()
+        time.sleep(0.05)
+        self.fetched.append(book_id)
+        return "access-{}-{}".format(book_id, len(self.fetched))
+
+
+def test_concurrent_requests_share_one_fetch():
+    manager = CountingTokenManager()
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(manager.access_token(1))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == ["access-1-2"] * 8
+    assert manager.fetched == ["csrf", 1]
+
+
+def test_tokens_cached_per_book():
+    manager = CountingTokenManager()
+    assert manager.access_token(1) != manager.access_token(2)
+    manager.access_token(1)
+    assert manager.fetched == ["csrf", 1, 2]
+
+
+def test_expiring_token_refreshed_in_background():
+    manager = CountingTokenManager(access_lifetime=0.2)
+    first = manager.access_token(1)
+    time.sleep(0.16)
+    # Still valid, so handed out while a new one is fetched
+    assert manager.access_token(1) == first
+    time.sleep(0.1)
+    assert manager.access_token(1) != first
+    assert manager.fetched == ["csrf", 1, 1]
+
+
+def test_invalidate_only_drops_rejected_token():
+    manager = CountingTokenManager()
+    first = manager.access_token(1)
+    manager.invalidate(1, "some-older-token")
+    assert manager.access_token(1) == first
+    manager.invalidate(1, first)
+    assert manager.access_token(1) != first
+
+
+def test_token_manager_per_session():
+    session = type("Session", (), {})()
+    assert tokens.get_token_manager(session) is tokens.get_token_manager(session)
+
+
+def test_clear_drops_tokens_and_fetches_in_flight():
+    manager = CountingTokenManager()
+    first = manager.access_token(1)
+    thread = threading.Thread(target=manager.access_token, args=(2,))
+    thread.start()
+    time.sleep(0.02)
+    manager.clear()
+    thread.join()
+    # Neither the cached token nor the one fetched across the clear is kept
+    assert manager.access_token(1) != first
+    assert manager.access_token(2) == manager.access_token(2)
+    assert manager.fetched == ["csrf", 1, 2, "csrf", 1, 2]
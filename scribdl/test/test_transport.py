@@ -0,0 +1,93 @@
+import io
+import json
+import zipfile
+
+import pytest
+
+from .. import exceptions
+from .. import session
+from .. import transport
+
+ACCESS_TOKEN = "secret-access-token-123"
+
+
+@pytest.fixture
+def recorded(tmpdir, monkeypatch):
+    responses = {
+        "https://www.scribd.com/read2/1/access_token": [b'{"response": "' + ACCESS_TOKEN.encode() + b'"}'],
+        "https://www.scribd.com/scepub/1/chapters/1/contents.json?token=" + ACCESS_TOKEN: [b'{"blocks": []}'],
+        "https://www.scribd.com/page": [b"first", b"second"],
+    }
+
+    def fake_send(self, request, **kwargs):
+        body = responses[request.url].pop(0)
+        return transport._build_response(self, request, 200, {"Content-Type": "application/json",
+                                                              "Set-Cookie": "_scribd_session=abc"},
+                                          io.BytesIO(body))
+    monkeypatch.setattr(transport.HTTPAdapter, "send", fake_send)
+
+    path = str(tmpdir.join("recording.zip"))
+    recording_session = session.ScribdSession(cookies={"_scribd_session": "secret-session-cookie"})
+    recording = transport.record(recording_session, path)
+    token = json.loads(recording_session.post("https://www.scribd.com/read2/1/access_token", data="data").text)["response"]
+    assert token == ACCESS_TOKEN
+    recording_session.get("https://www.scribd.com/scepub/1/chapters/1/contents.json?token=" + token)
+    recording_session.get("https://www.scribd.com/page")
+    recording_session.get("https://www.scribd.com/page")
+    recording.save()
+    monkeypatch.undo()
+    return path
+
+
+def test_recording_redacted(recorded):
+    with zipfile.ZipFile(recorded) as archive:
+        contents = b"".join(archive.read(name) for name in archive.namelist())
+    assert ACCESS_TOKEN.encode() not in contents
+    assert b"secret-session-cookie" not in contents
+    assert b"Set-Cookie" not in contents
+
+
+def test_replay(recorded):
+    replay_session = session.ScribdSession()
+    transport.replay(replay_session, recorded)
+    token = json.loads(replay_session.post("https://www.scribd.com/read2/1/access_token", data="data").text)["response"]
+    assert token == transport.REDACTED
+    response = replay_session.get("https://www.scribd.com/scepub/1/chapters/1/contents.json?token=" + token)
+    assert response.json() == {"blocks": []}
+    assert response.headers["Content-Type"] == "application/json"
+    assert [replay_session.get("https://www.scribd.com/page").text for _ in range(3)] == ["first", "second", "second"]
+    with pytest.raises(exceptions.ScribdFetchError):
+        replay_session.get("https://www.scribd.com/not-recorded")
+
+
+def test_redact_across_chunks(monkeypatch):
+    monkeypatch.setattr(transport, "CHUNK_SIZE", 4)
+    out_file = io.BytesIO()
+    transport._redact(io.BytesIO(b"abc-" + ACCESS_TOKEN.encode() + b"-xyz"), out_file, [ACCESS_TOKEN])
+    assert out_file.getvalue() == b"abc-" + transport.REDACTED.encode() + b"-xyz"
+
+
+def test_streamed_bodies_recorded(tmpdir, monkeypatch):
+    track = bytes(range(256)) * 1024
+
+    def fake_send(self, request, **kwargs):
+        return transport._build_response(self, request, 200, {"Content-Type": "audio/mpeg"}, io.BytesIO(track))
+    monkeypatch.setattr(transport.HTTPAdapter, "send", fake_send)
+
+    path = str(tmpdir.join("recording.zip"))
+    recording_session = session.ScribdSession()
+    recording = transport.record(recording_session, path)
+    with recording_session.get("https://play.findawayworld.com/track.mp3", stream=True) as response:
+        assert b"".join(response.iter_content(1024)) == track
+    # Closed without being read, as when probing for byte ranges
+    recording_session.get("https://play.findawayworld.com/unread.mp3", stream=True).close()
+    recording.save()
+    monkeypatch.undo()
+
+    replay_session = session.ScribdSession()
+    transport.replay(replay_session, path)
+    for url in ("https://play.findawayworld.com/track.mp3", "https://play.findawayworld.com/unread.mp3"):
+        assert replay_session.get(url).content == track
+    with zipfile.ZipFile(path) as archive:
+        # Identical bodies are stored once
+        assert len([name for name in archive.namelist() if name.startswith("bodies/")]) == 1
@@ -0,0 +1,164 @@
+import json
+import threading
+import time
+from concurrent.futures import Future
+
+from . import metrics
+from .session import get_session
+
+CSRF_TOKEN_URL = "https://scribd.com/csrf_token"
+ACCESS_TOKEN_URL = "https://www.scribd.com/read2/{}/access_token"
+
+# Scribd doesn't say how long its tokens last, these are on the safe side
+CSRF_TOKEN_LIFETIME = 60 * 60
+ACCESS_TOKEN_LIFETIME = 15 * 60
+# Tokens are refreshed in the background once this much of
+# their lifetime is left, while the current one keeps being used
+REFRESH_MARGIN = 0.25
+
+
+class TokenManager:
+    """
+    Caches the CSRF token of a session and the access token of every book
+    read through it, along with how long they last. Tokens close to
+    expiring are refreshed in the background while the current ones keep
+    being handed out, so chapter and image fetches never wait on a
+    refresh. Safe to share between threads: concurrent requests for a
+    missing token lead to a single fetch.
+
+    Parameters
+    ----------
+    session : `ScribdSession`
+        Session tokens are fetched with, and valid for.
+    csrf_lifetime : `float`
+        Seconds a CSRF token is used for.
+    access_lifetime : `float`
+        Seconds a book access token is used for.
+    """
+
+    def __init__(self, session=None, csrf_lifetime=CSRF_TOKEN_LIFETIME, access_lifetime=ACCESS_TOKEN_LIFETIME):
+        self.session = get_session(session)
+        self.csrf_lifetime = csrf_lifetime
+        self.access_lifetime = access_lifetime
+        # key -> (token, fetched at, lifetime)
+        self._tokens = {}
+        # key -> `Future` of the fetch in flight
+        self._fetches = {}
+        # Bumped by `clear`, so fetches started before it aren't cached
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def csrf_token(self):
+        return self._get("csrf", self._fetch_csrf_token, self.csrf_lifetime)
+
+    def access_token(self, book_id):
+        """
+        Returns a token granting access to the chapters and images of a book.
+        """
+        return self._get(("access", book_id),
+                         lambda: self._fetch_access_token(book_id),
+                         self.access_lifetime)
+
+    def invalidate(self, book_id, token):
+        """
+        Drops an access token Scribd rejected, unless it has already
+        been replaced. The next `access_token` call fetches a new one.
+        """
+        key = ("access", book_id)
+        with self._lock:
+            cached = self._tokens.get(key)
+            if cached and cached[0] == token:
+                del self._tokens[key]
+
+    def clear(self):
+        """
+        Drops every token, once the session logged in as someone else
+        or again. Tokens still being fetched are handed to whoever is
+        waiting on them, but aren't cached.
+        """
+        with self._lock:
+            self._tokens.clear()
+            self._fetches.clear()
+            self._generation += 1
+
+    def _get(self, key, fetch, lifetime):
+        with self._lock:
+            cached = self._tokens.get(key)
+            if cached:
+                token, fetched_at, lifetime = cached
+                age = time.time() - fetched_at
+                if age < lifetime:
+                    if age > lifetime * (1 - REFRESH_MARGIN) and key not in self._fetches:
+                        future = self._fetches[key] = Future()
+                        thread = threading.Thread(target=self._refresh,
+                                                  args=(key, fetch, lifetime, future, self._generation),
+                                                  daemon=True)
+                        thread.start()
+                    return token
+            future = self._fetches.get(key)
+            fetching = future is not None
+            if not fetching:
+                future = self._fetches[key] = Future()
+            generation = self._generation
+        if fetching:
+            # Some other thread is fetching it already
+            return future.result()
+        # The thread registering a fetch runs it itself, so one
+        # fetch waiting on another can never starve a pool
+        return self._fetch(key, fetch, lifetime, future, generation)
+
+    def _fetch(self, key, fetch, lifetime, future, generation):
+        try:
+            token = fetch()
+        except BaseException as error:
+            with self._lock:
+                if self._fetches.get(key) is future:
+                    del self._fetches[key]
+            future.set_exception(error)
+            raise
+        with self._lock:
+            if generation == self._generation:
+                self._tokens[key] = (token, time.time(), lifetime)
+            if self._fetches.get(key) is future:
+                del self._fetches[key]
+        future.set_result(token)
+        return token
+
+    def _refresh(self, key, fetch, lifetime, future, generation):
+        """
+        Refreshes a token in the background. On failure the current
+        token is kept until it expires, with another try on next use.
+        """
+        try:
+            self._fetch(key, fetch, lifetime, future, generation)
+        except Exception:
+            pass
+
+    def _fetch_csrf_token(self):
+        with metrics.timer("scribdl_token_fetch_seconds", token="csrf"):
+            response = self.session.get(CSRF_TOKEN_URL)
+        return json.loads(response.text)["csrf_token"]
+
+    def _fetch_access_token(self, book_id):
+        csrf_token = self.csrf_token()
+        # data can take take any value but it must take some value
+        # otherwise Scribd will reject the request
+        with metrics.timer("scribdl_token_fetch_seconds", token="access"):
+            response = self.session.post(ACCESS_TOKEN_URL.format(book_id),
+                                         headers={"X-CSRF-Token": csrf_token},
+                                         data="data")
+        return json.loads(response.text)["response"]
+
+
+_token_managers_lock = threading.Lock()
+
+
+def get_token_manager(session=None):
+    """
+    Returns the token manager of a session, creating it on first use.
+    """
+    session = get_session(session)
+    with _token_managers_lock:
+        if getattr(session, "token_manager", None) is None:
+            session.token_manager = TokenManager(session)
+    return session.token_manager
@@ -0,0 +1,335 @@
+import functools
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import zipfile
+from urllib.parse import parse_qsl
+from urllib.parse import urlencode
+from urllib.parse import urlsplit
+from urllib.parse import urlunsplit
+
+import requests
+import urllib3
+from requests.adapters import BaseAdapter
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from . import exceptions
+
+REDACTED = "REDACTED"
+
+# Query parameters whose values are secrets, like the chapter "token"
+SECRET_PARAM_RE = re.compile(r"token|key|session|signature", re.IGNORECASE)
+SECRET_HEADERS = ("Cookie", "X-CSRF-Token", "Authorization")
+# The only response headers worth replaying, cookies are never kept
+KEPT_HEADERS = ("Content-Type", "Content-Range", "Accept-Ranges", "Location")
+# Shorter values would risk clobbering ordinary text when redacted
+MIN_SECRET_LENGTH = 8
+CHUNK_SIZE = 64 * 1024
+
+
+def redact_url(url):
+    """
+    Replaces the values of secret query parameters with a placeholder.
+    Returns the redacted URL and the secrets it held.
+    """
+    parts = urlsplit(url)
+    secrets = []
+    query = []
+    for name, value in parse_qsl(parts.query, keep_blank_values=True):
+        if SECRET_PARAM_RE.search(name) and value != REDACTED:
+            secrets.append(value)
+            value = REDACTED
+        query.append((name, value))
+    return urlunsplit(parts._replace(query=urlencode(query))), secrets
+
+
+def _request_key(request):
+    url, _ = redact_url(request.url)
+    key = "{} {}".format(request.method, url)
+    if request.headers.get("Range"):
+        key += " Range:{}".format(request.headers["Range"])
+    return key
+
+
+def _build_response(adapter, request, status_code, headers, body_file):
+    response = requests.Response()
+    response.status_code = status_code
+    response.headers = CaseInsensitiveDict(headers)
+    response.raw = body_file
+    response.encoding = get_encoding_from_headers(response.headers)
+    response.url = request.url
+    response.request = request
+    response.connection = adapter
+    return response
+
+
+def _redact(in_file, out_file, secrets):
+    """
+    Copies `in_file` to `out_file` a chunk at a time with every secret
+    replaced, including ones straddling two chunks. Returns the digest
+    of what was written.
+    """
+    secrets = [secret.encode("utf-8") for secret in secrets]
+    redacted = REDACTED.encode("utf-8")
+    # A secret not yet complete at the end of a chunk fits in this many bytes
+    keep = max((len(secret) for secret in secrets), default=1) - 1
+    digest = hashlib.sha256()
+    carry = b""
+    while True:
+        chunk = in_file.read(CHUNK_SIZE)
+        data = carry + chunk
+        for secret in secrets:
+            data = data.replace(secret, redacted)
+        if chunk and keep:
+            data, carry = data[:-keep], data[-keep:]
+        out_file.write(data)
+        digest.update(data)
+        if not chunk:
+            return digest.hexdigest()
+
+
+class Recording:
+    """
+    An archive of recorded responses: a zip holding an index of the
+    responses to every request and their bodies, stored once per
+    distinct content.
+
+    Tokens and cookies are redacted before anything is written: secret
+    query parameters of the recorded URLs, and every secret seen in a
+    request anywhere in the bodies, such as the access token handed out
+    by Scribd. Replays see the placeholder in their place, consistently.
+
+    Bodies are spooled to a temporary directory while recording and
+    read straight from the archive while replaying, so neither holds
+    more than the index in memory.
+
+    Parameters
+    ----------
+    path : `str`
+        Path of the archive.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        # key -> list of (status code, headers, body digest)
+        self._responses = {}
+        self._secrets = set()
+        self._cursors = {}
+        self._spool_directory = None
+        self._archive = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        self._archive = zipfile.ZipFile(self.path)
+        self._responses = json.loads(self._archive.read("index.json").decode("utf-8"))
+        return self
+
+    def close(self):
+        if self._archive is not None:
+            self._archive.close()
+            self._archive = None
+
+    def save(self):
+        """
+        Writes the archive, redacting every secret recorded so far,
+        and removes the spooled bodies.
+        """
+        with self._lock:
+            secrets = sorted((secret for secret in self._secrets if len(secret) >= MIN_SECRET_LENGTH),
+                             key=len, reverse=True)
+            recorded_responses = dict(self._responses)
+
+        # Spooled digest -> digest once redacted
+        redacted_digests = {}
+        stored = set()
+        responses = {}
+        with zipfile.ZipFile(self.path, "w", zipfile.ZIP_DEFLATED) as archive:
+            for key, recorded in recorded_responses.items():
+                responses[key] = []
+                for status_code, headers, digest in recorded:
+                    if digest not in redacted_digests:
+                        redacted_digests[digest] = self._store_redacted(archive, stored, digest, secrets)
+                    responses[key].append((status_code, headers, redacted_digests[digest]))
+            archive.writestr("index.json", json.dumps(responses, indent=1))
+        if self._spool_directory is not None:
+            shutil.rmtree(self._spool_directory, ignore_errors=True)
+            self._spool_directory = None
+
+    def _store_redacted(self, archive, stored, digest, secrets):
+        redacted_path = os.path.join(self._spool_directory, digest + ".redacted")
+        with open(os.path.join(self._spool_directory, digest), "rb") as in_file:
+            with open(redacted_path, "wb") as out_file:
+                redacted_digest = _redact(in_file, out_file, secrets)
+        if redacted_digest not in stored:
+            archive.write(redacted_path, "bodies/" + redacted_digest)
+            stored.add(redacted_digest)
+        os.remove(redacted_path)
+        return redacted_digest
+
+    def spool(self):
+        """
+        Returns a new temporary file for a body being recorded.
+        """
+        with self._lock:
+            if self._spool_directory is None:
+                self._spool_directory = tempfile.mkdtemp(prefix="scribdl-recording-")
+        return tempfile.NamedTemporaryFile(dir=self._spool_directory, delete=False)
+
+    def record(self, request, status_code, headers, spooled_path, digest):
+        """
+        Records a response whose body was spooled to `spooled_path`.
+        """
+        _, secrets = redact_url(request.url)
+        secrets += [request.headers[name] for name in SECRET_HEADERS if request.headers.get(name)]
+        secrets += [value for _, value in _cookie_pairs(request.headers.get("Cookie", ""))]
+        headers = {name: headers[name] for name in KEPT_HEADERS if name in headers}
+        # Bodies are named after their content, identical ones are kept once
+        os.replace(spooled_path, os.path.join(self._spool_directory, digest))
+        with self._lock:
+            self._secrets.update(secrets)
+            self._responses.setdefault(_request_key(request), []).append((status_code, headers, digest))
+
+    def replay(self, request):
+        """
+        Returns the status code, headers and a file holding the body
+        recorded for a request. Repeated requests get the responses in
+        the order they were recorded, and the last one once those run out.
+        """
+        key = _request_key(request)
+        with self._lock:
+            recorded = self._responses.get(key)
+            if not recorded:
+                raise exceptions.ScribdFetchError("No recorded response for {}".format(key))
+            cursor = self._cursors.get(key, 0)
+            self._cursors[key] = min(cursor + 1, len(recorded) - 1)
+        status_code, headers, digest = recorded[cursor]
+        return status_code, headers, self._archive.open("bodies/" + digest)
+
+
+def _cookie_pairs(cookie_header):
+    for pair in cookie_header.split(";"):
+        name, _, value = pair.strip().partition("=")
+        if value:
+            yield name, value
+
+
+class _RecordingReader:
+    """
+    Stands in for the raw body of a response, copying everything read
+    through it to a spooled file. The response is recorded once the
+    body has been read to the end, or closed, reading the rest first.
+    """
+
+    def __init__(self, raw, recording, request, response):
+        self._raw = raw
+        if isinstance(raw, urllib3.response.HTTPResponse):
+            # Recorded as requests hands it out, without the content encoding
+            self._read = functools.partial(raw.read, decode_content=True)
+        else:
+            self._read = raw.read
+        self._recording = recording
+        self._request = request
+        self._response = response
+        self._spooled = recording.spool()
+        self._digest = hashlib.sha256()
+
+    def read(self, size=-1):
+        if self._spooled is None:
+            return b""
+        data = self._read(size if size is not None and size >= 0 else None)
+        if data:
+            self._spooled.write(data)
+            self._digest.update(data)
+        else:
+            self._finish()
+        return data
+
+    def close(self):
+        if self._spooled is not None:
+            while self.read(CHUNK_SIZE):
+                pass
+        self._raw.close()
+
+    def release_conn(self):
+        release_conn = getattr(self._raw, "release_conn", None)
+        if release_conn is not None:
+            release_conn()
+
+    def _finish(self):
+        spooled, self._spooled = self._spooled, None
+        spooled.close()
+        self._recording.record(self._request, self._response.status_code, self._response.headers,
+                               spooled.name, self._digest.hexdigest())
+
+
+class RecordingAdapter(HTTPAdapter):
+    """
+    Sends requests over the network as usual, recording every
+    response to a `Recording` as its body is read.
+    """
+
+    def __init__(self, recording, **kwargs):
+        super().__init__(**kwargs)
+        self.recording = recording
+
+    def send(self, request, **kwargs):
+        # Adapters further down may rewrite the request while sending it
+        sent = request.copy()
+        response = super().send(request, **kwargs)
+        response.raw = _RecordingReader(response.raw, self.recording, sent, response)
+        response.url = sent.url
+        response.request = sent
+        return response
+
+
+class ReplayAdapter(BaseAdapter):
+    """
+    Answers requests from a `Recording` without any network access.
+    Requests that weren't recorded raise `ScribdFetchError`.
+    """
+
+    def __init__(self, recording):
+        super().__init__()
+        self.recording = recording
+
+    def send(self, request, **kwargs):
+        status_code, headers, body_file = self.recording.replay(request)
+        return _build_response(self, request, status_code, headers, body_file)
+
+    def close(self):
+        self.recording.close()
+
+
+def record(session, path, **kwargs):
+    """
+    Records every request made through `session` from now on, keeping
+    the session's connection pool sizes unless others are passed.
+    Returns the `Recording`, which must be saved once done.
+    """
+    existing = session.get_adapter("https://")
+    if isinstance(existing, HTTPAdapter):
+        kwargs.setdefault("pool_connections", existing._pool_connections)
+        kwargs.setdefault("pool_maxsize", existing._pool_maxsize)
+    recording = Recording(path)
+    adapter = RecordingAdapter(recording, **kwargs)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return recording
+
+
+def replay(session, path):
+    """
+    Answers every request made through `session` from the
+    recording at `path`. Returns the `Recording`.
+    """
+    recording = Recording(path).load()
+    adapter = ReplayAdapter(recording)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return recording
@@ -16,10 +16,12 @@ setup(name='scribd-downloader',
       long_description=long_description,
       author='Ritiek Malhotra',
       author_email='ritiekmalhotra123@gmail.com',
-      packages = find_packages(),
+      packages = find_packages(exclude=['benchmarks', 'benchmarks.*']),
       entry_points={
             'console_scripts': [
                   'scribdl = scribdl.command_line:_command_line',
+                  'scribdl-batch = scribdl.command_line:_batch_command_line',
+                  'scribdl-server = scribdl.command_line:_server_command_line',
             ]
       },
       url='https://www.github.com/ritiek/scribd-downloader',
@@ -30,7 +32,11 @@ setup(name='scribd-downloader',
       install_requires=[
             'requests >= 2.19.1',
             'BeautifulSoup4 >= 4.6.3',
-            'img2pdf >= 0.3.1',
+            'Pillow',
             'md2pdf >= 0.4'
-      ]
+      ],
+      extras_require={
+            'parallel-pdf': ['pypdf >= 3.0'],
+            'async': ['httpx'],
+      }
      )